@@ -1,6 +1,97 @@
+import multiprocessing as mp
+import pickle
+import random
 import numpy as np
+from MCTS import MCTS
+from CachedNNet import CachedNNet
+from utils import spawnContext
 from pytorch_classification.utils import Bar, AverageMeter
-import time
+import time, sys
+
+# the arena played by the worker processes of Arena.playGames, inherited on
+# fork or unpickled by initWorker when spawned
+_arena = None
+
+def initWorker(pickledArena=None):
+    """
+    Initializer of the worker processes of Arena.playGamesParallel. Spawned
+    workers are passed the pickled arena, forked ones inherit it.
+    """
+    global _arena
+    # forked workers inherit the random state of the parent
+    np.random.seed()
+    random.seed()
+    if pickledArena is not None:
+        _arena = pickle.loads(pickledArena)
+
+def forkUnsafe():
+    """
+    Returns:
+        reason: why forking this process could deadlock or crash the workers,
+                or None, see utils.spawnContext
+    """
+    if 'tensorflow' in sys.modules:
+        return 'TensorFlow is loaded'
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_initialized():
+        return 'CUDA is initialized'
+    return None
+
+def playArenaGame(task):
+    """
+    Plays one game of _arena in a worker process. task is (index, swapped),
+    where swapped means player2 of the arena starts the game.
+
+    Returns:
+        (index, swapped, result, moves)
+    """
+    index, swapped = task
+    arena = _arena
+    if swapped:
+        arena = Arena(_arena.player2, _arena.player1, _arena.game, _arena.display)
+    result, moves = arena.playGameWithMoves(verbose=False)
+    return index, swapped, result, moves
+
+class MCTSPlayer():
+    """
+    A player that plays the most visited action of an MCTS search with the
+    network of class nnetClass saved in folder/filename. Unlike a lambda
+    over an MCTS it can be pickled: only the game, the network class, the
+    checkpoint and args are, and the network and search tree are built in
+    the process the player is unpickled in, at its first move. With
+    args.nnetCacheSize the network is wrapped in a CachedNNet.
+    """
+
+    def __init__(self, game, nnetClass, folder, filename, args, mcts=None):
+        """
+        Input:
+            game: Game object
+            nnetClass: the NeuralNet subclass to instantiate
+            folder, filename: the checkpoint to load
+            args: the MCTS args
+            mcts: an MCTS over that network already built in this process,
+                  used instead of building one; it is not pickled
+        """
+        self.game = game
+        self.nnetClass = nnetClass
+        self.folder = folder
+        self.filename = filename
+        self.args = args
+        self.mcts = mcts
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['mcts'] = None
+        return state
+
+    def __call__(self, board):
+        if self.mcts is None:
+            nnet = self.nnetClass(self.game)
+            nnet.load_checkpoint(folder=self.folder, filename=self.filename)
+            if self.args.get('nnetCacheSize', 0) > 0:
+                nnet = CachedNNet(self.game, nnet, self.args.nnetCacheSize)
+            self.mcts = MCTS(self.game, nnet, self.args)
+        return np.argmax(self.mcts.getActionProb(board, temp=0))
 
 class Arena():
     """
@@ -33,6 +124,16 @@ class Arena():
             or
                 draw result returned from the game that is neither 1, -1, nor 0.
         """
+        return self.playGameWithMoves(verbose=verbose)[0]
+
+    def playGameWithMoves(self, verbose=True):
+        """
+        Executes one episode of a game, see playGame.
+
+        Returns:
+            result: the result of the game, as returned by playGame
+            moves: the number of moves played
+        """
         players = [self.player2, None, self.player1]
         curPlayer = 1
         board = self.game.getInitBoard()
@@ -64,18 +165,33 @@ class Arena():
             assert(self.display)
             print("Game over: Turn ", str(it), "Result ", str(self.game.getGameEnded(board, 1)))
             self.display(board)
-        return self.game.getGameEnded(board, 1)
+        return self.game.getGameEnded(board, 1), it
 
-    def playGames(self, num, verbose=False):
+    def playGames(self, num, verbose=False, numWorkers=1):
         """
         Plays num games in which player1 starts num/2 games and player2 starts
-        num/2 games.
+        num/2 games. With numWorkers > 1 the games are played in parallel, see
+        playGamesParallel. If the arena cannot be pickled, as with lambda
+        players, and forking is unsafe, see forkUnsafe, they are played in
+        this process instead.
+
+        The number of moves of every game is stored in self.moveCounts, in the
+        order the games are listed above.
 
         Returns:
             oneWon: games won by player1
             twoWon: games won by player2
             draws:  games won by nobody
         """
+        if numWorkers > 1 and not verbose:
+            pickledArena = self.pickled()
+            reason = forkUnsafe() if pickledArena is None else None
+            if reason is None:
+                return self.playGamesParallel(num, numWorkers, pickledArena)
+            print('Playing the arena games in this process, the players cannot be pickled and '
+                  'forking workers is unsafe: ' + reason)
+
+        self.moveCounts = []
         eps_time = AverageMeter()
         bar = Bar('Arena.playGames', max=num)
         end = time.time()
@@ -87,7 +203,8 @@ class Arena():
         twoWon = 0
         draws = 0
         for _ in range(num):
-            gameResult = self.playGame(verbose=verbose)
+            gameResult, moves = self.playGameWithMoves(verbose=verbose)
+            self.moveCounts.append(moves)
             if gameResult==1:
                 oneWon+=1
             elif gameResult==-1:
@@ -105,7 +222,8 @@ class Arena():
         self.player1, self.player2 = self.player2, self.player1
         
         for _ in range(num):
-            gameResult = self.playGame(verbose=verbose)
+            gameResult, moves = self.playGameWithMoves(verbose=verbose)
+            self.moveCounts.append(moves)
             if gameResult==-1:
                 oneWon+=1                
             elif gameResult==1:
@@ -123,3 +241,73 @@ class Arena():
         bar.finish()
 
         return oneWon, twoWon, draws
+
+    def pickled(self):
+        """
+        Returns:
+            the pickled arena, or None if its players (or game or display)
+            cannot be pickled
+        """
+        try:
+            return pickle.dumps(self)
+        except Exception:
+            return None
+
+    def playGamesParallel(self, num, numWorkers, pickledArena=None):
+        """
+        Plays the games of playGames in a pool of numWorkers processes, with
+        the same split: player1 starts the first num/2 games and player2 the
+        other num/2. Every worker plays with its own copy of the players.
+
+        If pickledArena, the arena as returned by pickled, is given, the
+        processes are spawned and unpickle it, so players such as MCTSPlayer
+        build their networks in the workers. Otherwise they are forked, so
+        the players need not be picklable; playGames only does this when
+        forkUnsafe() finds nothing that breaks on fork.
+
+        Returns:
+            oneWon: games won by player1
+            twoWon: games won by player2
+            draws:  games won by nobody
+        """
+        global _arena
+        eps_time = AverageMeter()
+        num = int(num/2)
+        bar = Bar('Arena.playGames', max=2*num)
+        end = time.time()
+
+        oneWon = 0
+        twoWon = 0
+        draws = 0
+        self.moveCounts = [0]*(2*num)
+        tasks = [(i, i >= num) for i in range(2*num)]
+
+        if pickledArena is None:
+            _arena = self
+            pool = mp.get_context('fork').Pool(numWorkers, initializer=initWorker)
+        else:
+            pool = spawnContext().Pool(numWorkers, initializer=initWorker, initargs=(pickledArena,))
+        try:
+            for eps, (index, swapped, gameResult, moves) in enumerate(pool.imap_unordered(playArenaGame, tasks)):
+                if swapped:
+                    gameResult = -gameResult
+                if gameResult==1:
+                    oneWon+=1
+                elif gameResult==-1:
+                    twoWon+=1
+                else:
+                    draws+=1
+                self.moveCounts[index] = moves
+                # bookkeeping + plot progress
+                eps_time.update(time.time() - end)
+                end = time.time()
+                bar.suffix  = '({eps}/{maxeps}) Eps Time: {et:.3f}s | Total: {total:} | ETA: {eta:}'.format(eps=eps+1, maxeps=2*num, et=eps_time.avg,
+                                                                                                           total=bar.elapsed_td, eta=bar.eta_td)
+                bar.next()
+        finally:
+            pool.terminate()
+            pool.join()
+            _arena = None
+        bar.finish()
+
+        return oneWon, twoWon, draws
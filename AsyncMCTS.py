@@ -0,0 +1,233 @@
+import asyncio
+import numpy as np
+from MCTS import MCTS
+from SelfPlay import positionExamples, assignValues
+
+
+class BatchingEvaluator():
+    """
+    Evaluates the leaves of many searches running on one asyncio event loop
+    with one network. Each search awaits the future returned by evaluate; the
+    boards requested while the loop runs the other ready searches are sent to
+    the network together, in one predict_batch call of up to maxBatchSize
+    boards.
+    """
+
+    def __init__(self, nnet, maxBatchSize=1):
+        """
+        Input:
+            nnet: the NeuralNet the leaves are evaluated with
+            maxBatchSize: number of boards at which a batch is sent without
+                          waiting for the other searches
+        """
+        self.nnet = nnet
+        self.maxBatchSize = maxBatchSize
+        self.boards = []
+        self.futures = []
+        self.scheduled = False
+        self.batches = 0
+        self.evaluations = 0
+
+    def evaluate(self, board):
+        """
+        Input:
+            board: a board in its canonical form
+
+        Returns:
+            future: an awaitable future of (pi, v) for board
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.boards.append(board)
+        self.futures.append(future)
+        if len(self.boards) >= self.maxBatchSize:
+            self.flush()
+        elif not self.scheduled:
+            # runs once the searches that are ready have had their turn
+            self.scheduled = True
+            loop.call_soon(self.flush)
+        return future
+
+    def flush(self):
+        """
+        Evaluates the pending boards and resolves their futures.
+        """
+        self.scheduled = False
+        boards, futures = self.boards, self.futures
+        self.boards, self.futures = [], []
+        if not boards:
+            return
+        try:
+            if len(boards) == 1:
+                # the same call as the synchronous MCTS.search
+                results = [self.nnet.predict(boards[0])]
+            else:
+                pis, vs = self.nnet.predict_batch(np.array(boards))
+                results = list(zip(pis, vs))
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.evaluations += len(boards)
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        """
+        Returns:
+            stats: a dict with the number of batches, evaluated boards and the
+                   mean batch size
+        """
+        return {'batches': self.batches, 'evaluations': self.evaluations,
+                'meanBatchSize': self.evaluations/self.batches if self.batches else 0.}
+
+
+class AsyncMCTS(MCTS):
+    """
+    An MCTS whose simulations are coroutines: a simulation that reaches a leaf
+    awaits its evaluation from a BatchingEvaluator, which the event loop
+    fills with the leaves of the other searches in the meantime. The
+    simulations of one tree run one after the other, so a search gives the
+    same results as MCTS with the same network, and many trees can share the
+    evaluator on one loop.
+
+    Searches of one tree may also run concurrently. A search that reaches a
+    leaf another search is waiting for awaits that evaluation, then goes on
+    from the expanded node, so every node is evaluated and expanded once.
+    """
+
+    def __init__(self, game, nnet, args, evaluator=None):
+        """
+        Input:
+            evaluator: the BatchingEvaluator shared with other searches, by
+                       default one of its own for nnet with batches of 1
+
+        The simulations of a tree evaluate one leaf at a time, without the
+        virtual loss of MCTS.searchBatch, so args.searchBatchSize > 1 is
+        rejected; leaves are batched across searches by the evaluator.
+        """
+        if args.get('searchBatchSize', 1) > 1:
+            raise ValueError("AsyncMCTS does not support searchBatchSize {}, batch the leaves of many searches "
+                             "with the evaluator instead".format(args.searchBatchSize))
+        MCTS.__init__(self, game, nnet, args)
+        self.evaluator = evaluator if evaluator is not None else BatchingEvaluator(nnet)
+        self.pending = {}   # the evaluation futures of the leaves being evaluated
+
+    async def getActionProb(self, canonicalBoard, temp=1):
+        """
+        This function performs numMCTSSims simulations of MCTS starting from
+        canonicalBoard, see MCTS.getActionProb.
+        """
+        for i in range(self.args.numMCTSSims):
+            await self.search(canonicalBoard)
+        return self.actionProb(canonicalBoard, temp)
+
+    async def search(self, canonicalBoard):
+        """
+        One iteration of MCTS, as MCTS.search, awaiting the evaluation of the
+        leaf.
+
+        Returns:
+            v: the negative of the value of the current canonicalBoard
+        """
+        board = canonicalBoard
+        # the path stays in this coroutine, other searches of this tree run while it awaits
+        pathNodes, pathActions = [None]*16, [0]*16
+        depth = 0
+        while True:
+            s = self.game.stringRepresentation(board)
+
+            node = self.store.lookup(s)
+            if node is None:
+                node = self.store.add(s, self.game.getGameEnded(board, 1))
+            if self.store.ended(node)!=0:
+                # terminal node
+                v = -self.store.ended(node)
+                break
+
+            if not self.store.isExpanded(node):
+                # leaf node
+                future = self.pending.get(node)
+                if future is not None:
+                    # another search is evaluating it, go on from the expanded node
+                    self.store.pin(node)
+                    try:
+                        ps, _ = await future
+                    finally:
+                        self.store.unpin(node)
+                    if not self.store.isExpanded(node):
+                        self.expand(node, board, ps)
+                    continue
+                future = self.evaluator.evaluate(board)
+                self.pending[node] = future
+                self.store.pin(node)
+                try:
+                    ps, v = await future
+                finally:
+                    self.store.unpin(node)
+                    del self.pending[node]
+                # the searches that awaited it may have expanded it already
+                if not self.store.isExpanded(node):
+                    self.expand(node, board, ps)
+                v = -np.asarray(v).item()     # wrappers return v as a length 1 array
+                break
+
+            a = self.select(node)
+            depth = self.pushPath(pathNodes, pathActions, depth, node, a)
+            next_s, next_player = self.game.getNextState(board, 1, a)
+            board = self.game.getCanonicalForm(next_s, next_player)
+
+        return self.backupPath(pathNodes, pathActions, depth, v)
+
+
+async def executeEpisodeAsync(game, mcts, args):
+    """
+    Plays one episode of self-play with an AsyncMCTS, as
+    SelfPlay.executeEpisode.
+
+    Returns:
+        trainExamples: a list of examples of the form (canonicalBoard,pi,v)
+    """
+    trainExamples = []
+    board = game.getInitBoard()
+    curPlayer = 1
+    episodeStep = 0
+
+    while True:
+        episodeStep += 1
+        canonicalBoard = game.getCanonicalForm(board,curPlayer)
+        temp = int(episodeStep < args.tempThreshold)
+
+        pi = await mcts.getActionProb(canonicalBoard, temp=temp)
+        trainExamples += positionExamples(game, canonicalBoard, curPlayer, pi, args)
+
+        action = np.random.choice(len(pi), p=pi)
+        board, curPlayer = game.getNextState(board, curPlayer, action)
+
+        r = game.getGameEnded(board, curPlayer)
+
+        if r!=0:
+            return assignValues(trainExamples, r, curPlayer)
+
+
+def executeEpisodesAsync(game, nnet, args, numEps):
+    """
+    Plays numEps episodes of self-play concurrently on one event loop, each
+    with its own AsyncMCTS tree, their leaves evaluated by one
+    BatchingEvaluator in batches of up to args.evaluatorBatchSize boards
+    (numEps by default).
+
+    Returns:
+        (trainExamples, stats): the example lists of the episodes, and the
+                                stats of the evaluator
+    """
+    evaluator = BatchingEvaluator(nnet, args.get('evaluatorBatchSize', numEps))
+
+    async def play():
+        return await asyncio.gather(*[executeEpisodeAsync(game, AsyncMCTS(game, nnet, args, evaluator), args)
+                                      for _ in range(numEps)])
+
+    return asyncio.run(play()), evaluator.stats()
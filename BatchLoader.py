@@ -0,0 +1,141 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import numpy as np
+from ReplayBuffer import ReplayExamples
+from utils import dtypes, storageBoards, checkDtype
+
+
+def exampleColumns(examples):
+    """
+    Input:
+        examples: a list of (board, pi, v) examples, or a ReplayExamples
+
+    Returns:
+        (boards, pis, vs): the examples as contiguous arrays with the storage
+                           dtypes of utils.dtypes. A ReplayExamples is
+                           returned as is, its rows are gathered from the
+                           memory-mapped shards batch by batch.
+    """
+    if isinstance(examples, ReplayExamples):
+        return examples
+    boards, pis, vs = list(zip(*examples))
+    return storageBoards(boards), np.asarray(pis, dtype=dtypes.pi), np.asarray(vs, dtype=dtypes.v)
+
+
+def randomBatches(numExamples, batchSize, numBatches=None):
+    """
+    Returns:
+        batches: numBatches arrays of batchSize example ids sampled with
+                 replacement, as many as fit in numExamples by default
+    """
+    if numBatches is None:
+        numBatches = int(numExamples/batchSize)
+    for _ in range(numBatches):
+        yield np.random.randint(numExamples, size=batchSize)
+
+
+def epochBatches(numExamples, batchSize):
+    """
+    Returns:
+        batches: the example ids of one pass over numExamples examples in
+                 random order, in batches of batchSize, the last one smaller
+    """
+    ids = np.random.permutation(numExamples)
+    for start in range(0, numExamples, batchSize):
+        yield ids[start:start+batchSize]
+
+
+def randomSymmetries(game):
+    """
+    Returns:
+        transform: an augmentation function for BatchLoader that applies one
+                   of the game's symmetries, picked at random, to every
+                   example of a batch with game.applySymmetries
+    """
+    def transform(boards, pis):
+        return game.applySymmetries(boards, pis, np.random.randint(game.getNumSymmetries(), size=len(boards)))
+    return transform
+
+
+class BatchLoader():
+    """
+    Iterates over training batches (boards, pis, vs) of arrays of
+    utils.dtypes.input, float32 by default. Every
+    batch is gathered from the example columns with one fancy-indexing
+    operation per column, no Python work per example, then augmented and
+    converted by a pool of worker threads, which prepare the next batches
+    while the current one is trained on.
+    """
+
+    def __init__(self, columns, batches, prepare=None, transform=None, numWorkers=1, prefetch=2):
+        """
+        Input:
+            columns: the examples, as returned by exampleColumns
+            batches: an iterable over arrays of example ids, such as
+                     randomBatches or epochBatches
+            prepare: a function that converts a batch of boards to the input
+                     of the network, which must return dtypes.input
+            transform: an augmentation function (boards, pis) -> (boards, pis)
+                       applied to every batch before prepare, such as
+                       randomSymmetries(game)
+            numWorkers: number of worker threads
+            prefetch: number of batches prepared ahead, the depth of the queue
+        """
+        self.columns = columns
+        self.batches = batches
+        self.prepare = prepare
+        self.transform = transform
+        self.numWorkers = numWorkers
+        self.prefetch = max(prefetch, 1)
+
+    def gather(self, ids):
+        if isinstance(self.columns, ReplayExamples):
+            groups = self.columns.groups(ids)
+        else:
+            groups = [(None, tuple(column[ids] for column in self.columns))]
+        if len(groups) == 1:
+            return self.convert(*groups[0][1])
+        # shards with boards of another kind, from older versions, are converted on their own
+        batch = None
+        for rows, columns in groups:
+            converted = self.convert(*columns)
+            if batch is None:
+                batch = tuple(np.empty((len(ids),) + c.shape[1:], dtype=dtypes.input) for c in converted)
+            for out, c in zip(batch, converted):
+                out[rows] = c
+        return batch
+
+    def convert(self, boards, pis, vs):
+        """
+        Returns:
+            (boards, pis, vs): gathered examples augmented with transform and
+                               converted with prepare, as dtypes.input
+        """
+        if self.transform is not None:
+            boardsDtype, pisDtype = boards.dtype, pis.dtype
+            boards, pis = self.transform(boards, pis)
+            checkDtype(boards, boardsDtype, 'transform')
+            checkDtype(pis, pisDtype, 'transform')
+        if self.prepare is not None:
+            boards = self.prepare(boards)
+            checkDtype(boards, dtypes.input, 'prepare')
+        # the only conversion of the examples, from the storage dtypes to the input dtype
+        return (np.ascontiguousarray(boards, dtype=dtypes.input),
+                np.ascontiguousarray(pis, dtype=dtypes.input),
+                np.ascontiguousarray(vs, dtype=dtypes.input))
+
+    def __iter__(self):
+        batches = iter(self.batches)
+        with ThreadPoolExecutor(self.numWorkers) as pool:
+            # batches are returned in order, while up to prefetch are being prepared
+            pending = deque(pool.submit(self.gather, ids) for ids in itertools.islice(batches, self.prefetch))
+            try:
+                while pending:
+                    batch = pending.popleft().result()
+                    for ids in itertools.islice(batches, 1):
+                        pending.append(pool.submit(self.gather, ids))
+                    yield batch
+            finally:
+                for future in pending:
+                    future.cancel()
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+import numpy as np
+from NeuralNet import NeuralNet
+
+
+class CachedNNet(NeuralNet):
+    """
+    Wraps a network with an LRU cache of its predictions, keyed by the model
+    version and game.stringRepresentation of the board, so positions that
+    come up again in later episodes or arena games, openings in particular,
+    are only evaluated once.
+
+    The version is bumped, and the cache emptied, whenever the weights change
+    through train or load_checkpoint.
+    """
+
+    def __init__(self, game, nnet, maxSize):
+        """
+        Input:
+            game: Game object, used to compute the keys
+            nnet: the NeuralNet to cache
+            maxSize: maximum number of cached positions
+        """
+        self.game = game
+        self.nnet = nnet
+        self.maxSize = maxSize
+        self.version = 0
+        self.cache = OrderedDict()    # (version, key) -> (pi, v), least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def train(self, examples, augment=False):
+        try:
+            self.nnet.train(examples, augment=augment)
+        finally:
+            # a failed train may have changed some weights already
+            self.invalidate()
+
+    def predict(self, board):
+        """
+        board: np array with board
+        """
+        key = (self.version, self.game.stringRepresentation(board))
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return entry
+        self.misses += 1
+        pi, v = self.nnet.predict(board)
+        self.add(key, (pi, v))
+        return pi, v
+
+    def predict_batch(self, boards):
+        """
+        boards: np array with a batch of boards
+
+        Only the boards that are not in the cache are passed on to the
+        network, in a single predict_batch call.
+        """
+        keys = [(self.version, self.game.stringRepresentation(board)) for board in boards]
+        entries = [self.cache.get(key) for key in keys]
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            pis, vs = self.nnet.predict_batch(np.asarray(boards)[missing])
+            for i, pi, v in zip(missing, pis, vs):
+                entries[i] = (pi, v)
+        for key, entry in zip(keys, entries):
+            if key in self.cache:
+                self.cache.move_to_end(key)
+            else:
+                self.add(key, entry)
+        return np.array([pi for pi, _ in entries]), np.array([np.asarray(v).item() for _, v in entries])
+
+    def add(self, key, entry):
+        self.cache[key] = entry
+        if len(self.cache) > self.maxSize:
+            self.cache.popitem(last=False)
+
+    def invalidate(self):
+        """
+        Starts a new model version, dropping every cached prediction.
+        """
+        self.version += 1
+        self.cache.clear()
+
+    def stats(self):
+        """
+        Returns:
+            stats: a dict with the model version, the number of cached
+                   positions, the hits, misses and hit rate
+        """
+        lookups = self.hits + self.misses
+        return {'version': self.version, 'size': len(self.cache), 'hits': self.hits, 'misses': self.misses,
+                'hitRate': self.hits/lookups if lookups else 0.}
+
+    def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
+        self.nnet.save_checkpoint(folder=folder, filename=filename)
+
+    def load_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
+        self.nnet.load_checkpoint(folder=folder, filename=filename)
+        self.invalidate()
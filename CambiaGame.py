@@ -1,5 +1,14 @@
+import hashlib
 import numpy as np
 from Game import Game as Game
+from utils import dtypes
+
+# a board is a 0-d array of this dtype: the card index of the 10 slots of the
+# last 4 moves, whether player 1 and player 2 know each card, and the turn count
+STATE_DTYPE = np.dtype([('cards', np.int8, (4, 10)), ('known', np.int8, (4, 10, 2)), ('turn', np.int8)])
+NO_CARD = -1            # card index of an empty slot
+SWAPPED_SLOTS = np.r_[5:10, 0:5]    # slots of the other player's view of the board
+
 class CambiaGame(Game):
     """
     This class specifies the base Game class. To define your own game, subclass
@@ -10,6 +19,16 @@ class CambiaGame(Game):
 
     See othello/OthelloGame.py for an example implementation.
     """
+    def __init__(self, checkCollisions=False):
+        """
+        Input:
+            checkCollisions: debug mode, keeps the encoding of every state
+                             passed to stringRepresentation and raises if two
+                             different states get the same key
+        """
+        self.checkCollisions = checkCollisions
+        self.encodings = {}     # stores the encoding of each key in debug mode
+
     def getInitBoard(self):
         """
         Returns:
@@ -18,34 +37,31 @@ class CambiaGame(Game):
         """
         # the last 4 moves
         # 8 possible cards, 4 for each player, plus one for each player to represent the card they draw
-        # 53 channels, one-hot representation for 52 card deck
-        # 56 channels here because we convert to 55 channels before predicting - last 2 channels holds whether card is known by player 1 and player 2
-        # use 2x2 convolutions to get history
-        newBoard = np.zeros(shape=(4, 10, 56))
+        # every slot holds a card index from a 54 card deck (52 cards and 2 jokers), or NO_CARD
+        # known holds whether the card is known by player 1 and player 2
+        # unknownize converts this to the 55 channel one-hot input of the network
+        newBoard = np.zeros((), dtype=STATE_DTYPE)
+        cards = newBoard['cards']
+        known = newBoard['known']
+        cards[:] = NO_CARD
         for i in range(4):
             # add p1 cards
             # set starting cards
-            newDraw = np.random.randint(low=0, high=54)
-            newBoard[0][i] = np.zeros(shape=(56))
-            newBoard[0][i][newDraw] = 1.
+            cards[0][i] = np.random.randint(low=0, high=54)
             if i < 2:
                 # give vision
-                newBoard[0][i][54] = 1.
+                known[0][i][0] = 1
 
             # add p2 cards
-            newDraw = np.random.randint(low=0, high=54)
-            newBoard[0][i + 5] = np.zeros(shape=(56))
-            newBoard[0][i + 5][newDraw] = 1.
+            cards[0][i + 5] = np.random.randint(low=0, high=54)
             if i < 2:
                 # give vision
-                newBoard[0][i + 5][55] = 1.
+                known[0][i + 5][1] = 1
 
         # p1 starts with draw
-        newDraw = np.random.randint(low=0, high=54)
-        newBoard[0][4] = np.zeros(shape=(56))
-        newBoard[0][4][newDraw] = 1.
+        cards[0][4] = np.random.randint(low=0, high=54)
         # give vision
-        newBoard[0][4][54] = 1.
+        known[0][4][0] = 1
 
         return newBoard
 
@@ -82,196 +98,143 @@ class CambiaGame(Game):
         else:
           # player2
             startIndex = 5
-        # delete the last move in history
-        newBoard = np.delete(board, 3, axis=0)
-        # insert a new move that's identical to previous move
-        # handle playing own card
-        a = np.copy(newBoard[0])
-        newBoard = np.insert(newBoard, 0, a, axis=0)
-        cardPlayed=0
+        # known[..][temp] is the vision of the current player
+        temp = 0
+        if player == -1:
+            temp = 1
+        newBoard = board.copy()
+        cards = newBoard['cards']
+        known = newBoard['known']
+        # delete the last move in history and insert a new move that's identical to previous move
+        cards[1:] = board['cards'][:3]
+        known[1:] = board['known'][:3]
+        cardPlayed = 0
         if action < 4:
             # play own card and swap with drawn card
-
-            # get own card
-            a = np.where(np.isin(newBoard[0][action + startIndex], [1.]))[0]
-            if a.size > 0:
-                cardToPlayIndex = a[0]
-            # get unknown status - index 51 is player1, 52 is player2
-            isCardKnown = newBoard[0][action + startIndex][54]
-            if player == -1:
-                isCardKnown = newBoard[0][action + startIndex][55]
-
-            isCardKnownOpponent = newBoard[0][action + startIndex][54]
-            if player == -1:
-                isCardKnownOpponent = newBoard[0][action + startIndex][55]
+            cardToPlayIndex = self.getSlotIndex(newBoard, action + startIndex)
+            isCardKnown = known[0][action + startIndex][temp]
 
             # our card
             # if card is known play it, otherwise get a random card to play
             # we assume a deck composed of infinite decks so we can uniformly draw
-            if isCardKnown == 1.:
+            if isCardKnown == 1:
                 cardPlayed = cardToPlayIndex
             else:
                 cardPlayed = np.random.randint(low=0, high=54)
 
-            # replace the current card with the drawn card and remove the drawn card from the board
-            # replace played card slot with the drawn card
-            newBoard[0][action + startIndex] = np.copy(newBoard[0][4 + startIndex])
-            # remove card from drawn card slot
-            newBoard[0][4 + startIndex] = np.zeros(shape=(56))
+            # replace played card slot with the drawn card and remove the drawn card from the board
+            self.moveSlot(newBoard, 4 + startIndex, action + startIndex)
             # remove opponent's vision of new card
-            temp = 0
-            if player == -1:
-                temp = 1
-            newBoard[0][action + startIndex][54 + temp] = 0.
-          
+            known[0][action + startIndex][temp] = 0
+
         if action == 4:
             # play drawn card
-            s = np.where(np.isin(newBoard[0][4 + startIndex], [1.]))[0]
-            if s.size > 0:
-                cardPlayed = s[0]
+            s = self.getSlotIndex(newBoard, 4 + startIndex)
+            if s is not None:
+                cardPlayed = s
             # set drawn card slot to nothing
-            newBoard[0][4 + startIndex] = np.zeros(shape=(56))
-
+            self.clearSlot(newBoard, 4 + startIndex)
 
-        temp = 0
-        if player == -1:
-            temp = 1
         # regardless of action, play out the effects of the played card
+        cardPlayed = int(cardPlayed)
         redKing = False
         if cardPlayed == 38 or cardPlayed == 51:
             redKing = True
         cardPlayed += 1
         cardPlayed %= 13
+        # opponent's first slot
+        s = 5
+        if player == -1:
+            s = 0
         if cardPlayed == 7 or cardPlayed == 8:
             # look at one of your own unknown cards
-            toLookAtRandom = []
-            for i in range(4):
-                if newBoard[0][i + startIndex][54 + temp] == 0.:
-                    toLookAtRandom.append(i)
-            if len(toLookAtRandom) < 1:
-                toLookAtRandom.append(np.random.randint(low=0, high=5))
-            rand = np.random.randint(low=0, high=len(toLookAtRandom))
-            newBoard[0][toLookAtRandom[rand]][54 + temp] = 1.
+            known[0][self.randomUnknown(known, startIndex, temp)][temp] = 1
         if cardPlayed == 9 or cardPlayed == 10:
             # look at one of opponent's cards that we don't know
-            toLookAtRandom = []
-            if player == 1:
-                s = 5
-            else:
-                # player2
-                s = 0
-            for i in range(4):
-                if newBoard[0][i + s][54 + temp] == 0.:
-                    toLookAtRandom.append(i)
-            if len(toLookAtRandom) < 1:
-                toLookAtRandom.append(np.random.randint(low=0, high=5))
-            rand = np.random.randint(low=0, high=len(toLookAtRandom))
-            newBoard[0][toLookAtRandom[rand]][54 + temp] = 1.
-        if cardPlayed == 11 or cardPlayed == 12:
+            known[0][self.randomUnknown(known, s, temp)][temp] = 1
+        if cardPlayed == 11 or cardPlayed == 12 or (cardPlayed == 13 and not redKing):
             # blind swap with opponent's cards - choose one of our unknown and one of opponent's unknown
-            myUnknown = 0
-            toLookAtRandom = []
-            for i in range(4):
-                if newBoard[0][i + startIndex][54 + temp] == 0.:
-                    toLookAtRandom.append(i)
-            # if there's no unknown, randomly append one
-            if len(toLookAtRandom) < 1:
-                toLookAtRandom.append(np.random.randint(low=0, high=5))
-            rand = np.random.randint(low=0, high=len(toLookAtRandom))
-            myUnknown = toLookAtRandom[rand]
-
-            oppUnknown = 5
-            toLookAtRandom = []
-            if player == 1:
-                s = 5
-            else:
-                # player2
-                s = 0
-            for i in range(4):
-                if newBoard[0][i + s][54 + temp] == 0.:
-                    toLookAtRandom.append(i)
-            if len(toLookAtRandom) < 1:
-                toLookAtRandom.append(np.random.randint(low=0, high=5))
-            rand = np.random.randint(low=0, high=len(toLookAtRandom))
-            oppUnknown = toLookAtRandom[rand]
+            # King; check if it's red, if not then we look at an opponent's card and swap
+            myUnknown = self.randomUnknown(known, startIndex, temp)
+            oppUnknown = self.randomUnknown(known, s, temp)
 
             # swap cards
-            oppCard = np.copy(newBoard[0][oppUnknown])
-            newBoard[0][oppUnknown] = np.copy(newBoard[0][myUnknown])
-            newBoard[0][myUnknown] = np.copy(oppCard)
-
-        if cardPlayed == 13:
-          # King; check if it's red, if not then we look at an opponent's card and swap
-          if not redKing:
-            # swap one of our unknown with lowest or random opponent's card
-            # blind swap with opponent's cards - choose one of our unknown and one of opponent's unknown
-            myUnknown = 0
-            toLookAtRandom = []
-            for i in range(4):
-                if newBoard[0][i + startIndex][54 + temp] == 0.:
-                    toLookAtRandom.append(i)
-            if len(toLookAtRandom) < 1:
-                toLookAtRandom.append(np.random.randint(low=0, high=5))
-            rand = np.random.randint(low=0, high=len(toLookAtRandom))
-            myUnknown = toLookAtRandom[rand]
-
-            oppUnknown = 5
-            toLookAtRandom = []
-            if player == 1:
-                s = 5
-            else:
-                # player2
-                s = 0
-            for i in range(4):
-                if newBoard[0][i + s][54 + temp] == 0.:
-                    toLookAtRandom.append(i)
-            if len(toLookAtRandom) < 1:
-                toLookAtRandom.append(np.random.randint(low=0, high=5))
-            rand = np.random.randint(low=0, high=len(toLookAtRandom))
-            oppUnknown = toLookAtRandom[rand]
-
-            # swap cards
-            oppCard = np.copy(newBoard[0][oppUnknown])
-            oppCard[54 + temp] = 1.
-            newBoard[0][oppUnknown] = np.copy(newBoard[0][myUnknown])
-            newBoard[0][myUnknown] = np.copy(oppCard)
-
+            oppCard, oppKnown = cards[0][oppUnknown], known[0][oppUnknown].copy()
+            if cardPlayed == 13:
+                oppKnown[temp] = 1
+            self.moveSlot(newBoard, myUnknown, oppUnknown)
+            cards[0][myUnknown], known[0][myUnknown] = oppCard, oppKnown
 
         # play all identical cards
-        for j in range(10):
-            # loop through and look for cards that are similar
-            for index in np.where(np.isin(newBoard[0][j], [1.]))[0]:
-                # don't play red kings or jokers
-                if index != 38 and index != 51 and index < 52:
-                    # if the card is similar to current card, play it
-                    c = index + 1
-                    c %= 13
-                    if c == cardPlayed:
-                        newBoard[0][j] = np.zeros(shape=(56))
+        # don't play red kings or jokers
+        c = cards[0].astype(int)
+        identical = (c >= 0) & (c < 52) & (c != 38) & (c != 51) & ((c + 1) % 13 == cardPlayed)
+        cards[0][identical] = NO_CARD
+        known[0][identical] = 0
 
         # then draw a card for the opponent and switch turns
         # swap startIndex and temp
-        if player == 1:
-            startIndex = 5
-        else:
-            # player2
-            startIndex = 0
+        startIndex, temp = s, 1 - temp
 
-        temp = 1
-        if player == -1:
-            temp = 0
-        
         # set opponent's draw
-        newDraw = np.random.randint(low=0, high=54)
-        newBoard[0][4 + startIndex] = np.zeros(shape=(56))
-        newBoard[0][4 + startIndex][newDraw] = 1.
+        self.clearSlot(newBoard, 4 + startIndex)
+        cards[0][4 + startIndex] = np.random.randint(low=0, high=54)
         # give vision to opponent only
-        newBoard[0][4 + startIndex][54 + temp] = 1.
+        known[0][4 + startIndex][temp] = 1
 
         # update turn count
-        newBoard[2][0][0] = newBoard[3][0][0] + 1
+        newBoard['turn'] += 1
         return newBoard, player * -1
 
+    def getSlotIndex(self, board, slot):
+        """
+        Input:
+            board: current board
+            slot: one of the 10 slots of the current move
+
+        Returns:
+            index: the first non-zero channel of the slot in the one-hot
+                   encoding: the card index, 54 or 55 for an empty slot known
+                   by player 1 or player 2, or None if the slot is blank
+        """
+        card = board['cards'][0][slot]
+        if card != NO_CARD:
+            return int(card)
+        if board['known'][0][slot][0] == 1:
+            return 54
+        if board['known'][0][slot][1] == 1:
+            return 55
+        return None
+
+    def moveSlot(self, board, src, dst):
+        """
+        Moves the card and vision of slot src of the current move to slot dst.
+        """
+        board['cards'][0][dst] = board['cards'][0][src]
+        board['known'][0][dst] = board['known'][0][src]
+        self.clearSlot(board, src)
+
+    def clearSlot(self, board, slot):
+        board['cards'][0][slot] = NO_CARD
+        board['known'][0][slot] = 0
+
+    def randomUnknown(self, known, s, temp):
+        """
+        Returns:
+            i: one of the slots s..s+3 whose card is unknown to the player with
+               vision known[..][temp], picked at random, given as an offset
+               from s (0 to 3), or a random offset from 0 to 4 if all are
+               known
+        """
+        toLookAtRandom = []
+        for i in range(4):
+            if known[0][i + s][temp] == 0:
+                toLookAtRandom.append(i)
+        # if there's no unknown, randomly append one
+        if len(toLookAtRandom) < 1:
+            toLookAtRandom.append(np.random.randint(low=0, high=5))
+        rand = np.random.randint(low=0, high=len(toLookAtRandom))
+        return toLookAtRandom[rand]
 
     def getValidMoves(self, board, player):
         """
@@ -290,11 +253,8 @@ class CambiaGame(Game):
         else:
             # player2
             startIndex = 5
-        for i in range(4):
-            if np.where(np.isin(board[0][i + startIndex], [1.]))[0].size > 0 and np.where(np.isin(board[0][i + startIndex], [1.]))[0][0] < 54:
-                outArr[i] = 1
+        outArr[:4] = board['cards'][0][startIndex:startIndex + 4] != NO_CARD
         outArr[4] = 1
-        #print(outArr)
         return outArr
 
     def getGameEnded(self, board, player):
@@ -314,7 +274,7 @@ class CambiaGame(Game):
             return 1
         if player2 <= 1:
             return -1
-        if board[2][0][0] > 52:
+        if board['turn'] > 52:
             # else, game ends after ~54 turns
             if player1 > player2:
                 return -1
@@ -336,15 +296,15 @@ class CambiaGame(Game):
 
         startIndex = 0
         for i in range(4):
-            s = np.where(np.isin(board[0][i + startIndex], [1.]))[0]
-            if s.size > 0:
-                player1 += self.getCardScore(s[0])
+            s = self.getSlotIndex(board, i + startIndex)
+            if s is not None:
+                player1 += self.getCardScore(s)
 
         startIndex = 5
         for i in range(4):
-            s = np.where(np.isin(board[0][i + startIndex], [1.]))[0]
-            if s.size > 0:
-                player2 += self.getCardScore(s[0])
+            s = self.getSlotIndex(board, i + startIndex)
+            if s is not None:
+                player2 += self.getCardScore(s)
         
         return player1, player2
 
@@ -378,56 +338,98 @@ class CambiaGame(Game):
                             board as is. When the player is black, we can invert
                             the colors and return the board.
         """
-        newArr = np.zeros(shape=(4, 10, 56))
+        newArr = board.copy()
         # swap 0-4 with 5-9
-        for i in range(4):
-            for j in range(5):
-                newArr[i][j + 5] = board[i][j]
-        for i in range(4):
-            for j in range(5):
-                newArr[i][j] = board[i][j + 5]
-
+        newArr['cards'] = board['cards'][..., SWAPPED_SLOTS]
         # swap vision columns
-        for i in range(4):
-            for j in range(10):
-                temp = newArr[i][j][54]
-                newArr[i][j][54] = newArr[i][j][55]
-                newArr[i][j][55] = temp
-        
+        newArr['known'] = board['known'][..., SWAPPED_SLOTS, ::-1]
         return newArr
 
+    def getCanonicalForms(self, boards):
+        """
+        Input:
+            boards: a stack of N boards, an array of shape (N,) and STATE_DTYPE
+
+        Returns:
+            canonicalBoards: the canonical form of every board, as returned by
+                             getCanonicalForm, which doesn't depend on the
+                             player
+        """
+        return self.getCanonicalForm(boards, 1)
+
+    def getPlayers(self, boards):
+        """
+        Input:
+            boards: a board or a stack of boards
+
+        Returns:
+            players: the player to move on every board, 1 on even turns, -1 on
+                     odd ones
+        """
+        return np.where(boards['turn'] % 2 == 0, 1, -1)
+
     def unknownize(self, board, player):
         """
         Input:
-            board: current full board
-            player: current player (1 or -1)
+            board: canonical board, or a stack of N canonical boards
+            player: current player (1 or -1), or the player of every board
         Returns:
-            unknownizedBoard: returns board with unknown spots blanked. (4x12x55) shape
+            unknownizedBoard: the (4x10x55) input of the network, or
+                              (Nx4x10x55) for a stack. This is the encoding of
+                              the original 56 channel boards, which networks
+                              were trained on: the one-hot cards and both
+                              vision channels, the turn count in channel 0 of
+                              slot 5 of rows 2 and 3 where the canonical form
+                              moves it, the vision channel of the other player
+                              dropped, and the first channel set to 1 of every
+                              slot blanked.
         """
-        index = 55
-        if player == -1:
-            index = 54
-        newBoard = np.delete(board, index, axis=2)
-        #print(newBoard)
-        #print(newBoard.shape)
-        for i in range(newBoard.shape[0]):
-            for j in range(newBoard[i].shape[0]):
-                #print(newBoard.size)
-                s = np.where(np.isin(board[i][j], [1.]))
-                known = False
-                #print(s[0])
-                for indice in range(s[0].size):
-                    #print(indice)
-                    if indice == 54:
-                        # if it's known, don't black card out
-                        known = True
-                if not known and s[0].size > 0:
-                    #print(s[0])
-                    if s[0][0] > 54:
-                        s[0][0] = 54
-                    newBoard[i][j][s[0][0]] = 0.
+        cards = board['cards']
+        known = board['known']
+        fullBoard = np.zeros(shape=board.shape + (4, 10, 56), dtype=dtypes.input)
+        hasCard = cards != NO_CARD
+        fullBoard[np.nonzero(hasCard) + (cards[hasCard],)] = 1.
+        fullBoard[..., 54:] = known
+        turn = board['turn'].astype(dtypes.input)
+        fullBoard[..., 2, 5, 0] = turn
+        fullBoard[..., 3, 5, 0] = np.maximum(turn - 1, 0)
+
+        # player 1 keeps vision channel 54, player -1 channel 55
+        player = np.asarray(player).reshape(np.shape(player) + (1, 1, 1))
+        newBoard = np.where(player == 1, fullBoard[..., :55], np.delete(fullBoard, 54, axis=-1))
+        ones = fullBoard == 1.
+        blanked = ones.any(axis=-1)
+        channel = np.minimum(ones.argmax(axis=-1), 54)
+        newBoard[np.nonzero(blanked) + (channel[blanked],)] = 0.
         return newBoard
 
+    def unknownizeBatch(self, boards, player):
+        """
+        Input:
+            boards: a stack of N boards, an array of shape (N,) and STATE_DTYPE,
+                    or a sequence of boards
+            player: current player (1 or -1), or the player of every board
+        Returns:
+            unknownizedBoards: the (Nx4x10x55) network inputs of the boards
+        """
+        boards = np.asarray(boards)
+        return self.unknownize(boards.reshape(-1), player)
+
+    def trainingInputs(self, boards):
+        """
+        Input:
+            boards: a batch of stored example boards
+        Returns:
+            inputs: the (Nx4x10x55) network inputs of the boards, unknownized
+                    for the player to move. The examples of the pickled
+                    .examples files of older versions were stored as these
+                    inputs already, they are only converted to dtypes.input.
+        """
+        boards = np.asarray(boards)
+        if boards.dtype.fields is None:
+            return boards.astype(dtypes.input)
+        return self.unknownizeBatch(boards, self.getPlayers(boards))
+
 
     def getSymmetries(self, board, pi):
         """
@@ -451,6 +453,24 @@ class CambiaGame(Game):
 
         Returns:
             boardString: a quick conversion of board to a string format.
-                         Required by MCTS for hashing.
+                         Required by MCTS for hashing. Here it is a 64-bit
+                         hash of encodeState(board).
+        """
+        encoding = self.encodeState(board)
+        key = int.from_bytes(hashlib.blake2b(encoding, digest_size=8).digest(), 'little')
+        if self.checkCollisions:
+            seen = self.encodings.setdefault(key, encoding)
+            if seen != encoding:
+                raise RuntimeError("State key collision on {:#018x}".format(key))
+        return key
+
+    def encodeState(self, board):
+        """
+        Input:
+            board: current board
+
+        Returns:
+            encoding: the bytes of board, which already is a compact canonical
+                      encoding of the state (121 bytes)
         """
-        return np.array_str(board)
+        return board.tobytes()
@@ -9,6 +9,7 @@ import sys
 sys.path.append('..')
 from utils import *
 from NeuralNet import NeuralNet
+from BatchLoader import BatchLoader, exampleColumns, epochBatches, randomSymmetries
 
 import argparse
 from resnet import get_model
@@ -16,18 +17,25 @@ from resnet import get_model
 
 class NNetWrapper(NeuralNet):
     def __init__(self, game):
+        self.game = game
         self.nnet = get_model()
         
 
-    def train(self, examples):
+    def train(self, examples, augment=False):
         """
         examples: list of examples, each example is of form (board, pi, v)
+                  with the compact CambiaGame board, converted to the network
+                  input with unknownize for the player to move, as the
+                  examples always were, or with the network input itself for
+                  examples of older versions, see CambiaGame.trainingInputs
+        augment: apply a random symmetry to every example, a no-op for Cambia
         """
-        input_boards, target_pis, target_vs = list(zip(*examples))
-        input_boards = np.asarray(input_boards)
-        target_pis = np.asarray(target_pis)
-        target_vs = np.asarray(target_vs)
-        self.nnet.fit(x = input_boards, y = [target_pis, target_vs], batch_size = 128, epochs = 1)
+        # one epoch in batches of 128, only the boards of a batch are converted to one-hot inputs
+        loader = BatchLoader(exampleColumns(examples), epochBatches(len(examples), 128),
+                             prepare=self.game.trainingInputs,
+                             transform=randomSymmetries(self.game) if augment else None, numWorkers=2, prefetch=4)
+        for input_boards, target_pis, target_vs in loader:
+            self.nnet.train_on_batch(x = input_boards, y = [target_pis, target_vs])
 
     def predict(self, board):
         """
@@ -37,7 +45,7 @@ class NNetWrapper(NeuralNet):
         start = time.time()
 
         # preparing input
-        board = board[np.newaxis, :, :]
+        board = self.game.unknownize(board, 1)[np.newaxis, :, :]
 
         # run
         pi, v = self.nnet.predict(board)
@@ -45,6 +53,13 @@ class NNetWrapper(NeuralNet):
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
         return pi[0], v[0]
 
+    def predict_batch(self, boards):
+        """
+        boards: np array with a batch of boards
+        """
+        pi, v = self.nnet.predict(self.game.unknownizeBatch(boards, 1))
+        return pi, v.reshape(-1)
+
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         filepath = os.path.join(folder, filename)
         if not os.path.exists(folder):
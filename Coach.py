@@ -1,11 +1,13 @@
 from collections import deque
-from Arena import Arena
+from Arena import Arena, MCTSPlayer
 from MCTS import MCTS
-import numpy as np
+from SelfPlay import executeEpisode, executeEpisodes, SelfPlayWorkers
+from InferenceServer import InferenceServer
+from CachedNNet import CachedNNet
+from ReplayBuffer import ReplayBuffer
 from pytorch_classification.utils import Bar, AverageMeter
 import time, os, sys
-from pickle import Pickler, Unpickler
-from random import shuffle
+from pickle import Unpickler
 
 
 class Coach():
@@ -16,50 +18,68 @@ class Coach():
     def __init__(self, game, nnet, args):
         self.game = game
         self.nnet = nnet
-        self.pnet = self.nnet.__class__(self.game)  # the competitor network
+        self.nnetClass = nnet.__class__
+        self.pnet = self.nnetClass(self.game)  # the competitor network
         self.args = args
+        if self.args.get('nnetCacheSize', 0) > 0:
+            # predictions are cached across episodes and arena games, until the weights change
+            self.nnet = CachedNNet(self.game, self.nnet, self.args.nnetCacheSize)
+            self.pnet = CachedNNet(self.game, self.pnet, self.args.nnetCacheSize)
         self.mcts = MCTS(self.game, self.nnet, self.args)
-        self.trainExamplesHistory = []    # history of examples from args.numItersForTrainExamplesHistory latest iterations
-        self.skipFirstSelfPlay = False # can be overriden in loadTrainExamples()
+        # examples from args.numItersForTrainExamplesHistory latest iterations, stored on disk
+        self.replayBuffer = ReplayBuffer(os.path.join(self.args.checkpoint, 'replay'),
+                                         self.args.get('numItersForTrainExamplesHistory', 20))
+        if not self.args.get('load_model', False):
+            # a new run, the shards of an earlier run in the same folder are not ours
+            self.replayBuffer.clear()
+        self.skipFirstSelfPlay = False # can be overriden in loadTrainExamplesA()
+        self.inferenceServer = None    # started by playEpisodes() if args.inferenceServer is set
 
     def executeEpisode(self):
         """
-        This function executes one episode of self-play, starting with player 1.
-        As the game is played, each turn is added as a training example to
-        trainExamples. The game is played till the game ends. After the game
-        ends, the outcome of the game is used to assign values to each example
-        in trainExamples.
-
-        It uses a temp=1 if episodeStep < tempThreshold, and thereafter
-        uses temp=0.
+        Plays one episode of self-play with self.mcts, see
+        SelfPlay.executeEpisode.
 
         Returns:
             trainExamples: a list of examples of the form (canonicalBoard,pi,v)
-                           pi is the MCTS informed policy vector, v is +1 if
-                           the player eventually won the game, else -1.
         """
-        trainExamples = []
-        board = self.game.getInitBoard()
-        self.curPlayer = 1
-        episodeStep = 0
-
-        while True:
-            episodeStep += 1
-            canonicalBoard = self.game.getCanonicalForm(board,self.curPlayer)
-            temp = int(episodeStep < self.args.tempThreshold)
-
-            pi = self.mcts.getActionProb(canonicalBoard, temp=temp)
-            sym = self.game.getSymmetries(canonicalBoard, pi)
-            for b,p in sym:
-                trainExamples.append([self.game.unknownize(b, self.curPlayer), self.curPlayer, p, None])
+        return executeEpisode(self.game, self.mcts, self.args)
 
-            action = np.random.choice(len(pi), p=pi)
-            board, self.curPlayer = self.game.getNextState(board, self.curPlayer, action)
-
-            r = self.game.getGameEnded(board, self.curPlayer)
+    def playEpisodes(self):
+        """
+        Plays args.numEps episodes of self-play in this process, each with a
+        fresh search tree. With args.numSelfPlayWorkers > 1 the episodes are
+        played by a pool of worker processes instead, each of which loads the
+        current network from a checkpoint. If args.inferenceServer is also
+        set, the workers send their leaves to a single InferenceServer process
+        instead, which is reloaded with the current network before every
+        self-play phase, so it picks up newly accepted models. Otherwise, with
+        args.numParallelGames > 1, that many episodes are played in lockstep
+        in this process, their leaves evaluated in shared batches.
 
-            if r!=0:
-                return [(x[0],x[2],r*((-1)**(x[1]!=self.curPlayer))) for x in trainExamples]
+        Returns:
+            a generator over the example lists of the episodes
+        """
+        if self.args.get('numSelfPlayWorkers', 1) > 1:
+            self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='selfplay.pth.tar')
+            clients = None
+            if self.args.get('inferenceServer', False):
+                if self.inferenceServer is None:
+                    self.inferenceServer = InferenceServer(self.game, self.nnetClass, self.args, self.args.numSelfPlayWorkers)
+                    self.inferenceServer.start(self.args.checkpoint, 'selfplay.pth.tar')
+                else:
+                    self.inferenceServer.reload(self.args.checkpoint, 'selfplay.pth.tar')
+                clients = self.inferenceServer.clients
+            workers = SelfPlayWorkers(self.game, self.nnetClass, self.args)
+            for examples in workers.play(self.args.numEps, self.args.checkpoint, 'selfplay.pth.tar', clients):
+                yield examples
+        elif self.args.get('numParallelGames', 1) > 1:
+            for examples in executeEpisodes(self.game, self.nnet, self.args, self.args.numEps):
+                yield examples
+        else:
+            for eps in range(self.args.numEps):
+                self.mcts = MCTS(self.game, self.nnet, self.args)   # reset search tree
+                yield self.executeEpisode()
 
     def learn(self):
         """
@@ -81,9 +101,8 @@ class Coach():
                 bar = Bar('Self Play', max=self.args.numEps)
                 end = time.time()
     
-                for eps in range(self.args.numEps):
-                    self.mcts = MCTS(self.game, self.nnet, self.args)   # reset search tree
-                    iterationTrainExamples += self.executeEpisode()
+                for eps, examples in enumerate(self.playEpisodes()):
+                    iterationTrainExamples += examples
     
                     # bookkeeping + plot progress
                     eps_time.update(time.time() - end)
@@ -92,36 +111,36 @@ class Coach():
                                                                                                                total=bar.elapsed_td, eta=bar.eta_td)
                     bar.next()
                 bar.finish()
+                if isinstance(self.nnet, CachedNNet) and self.args.get('numSelfPlayWorkers', 1) <= 1:
+                    # with workers, the episodes were evaluated by their own caches or the inference server
+                    print('Evaluation cache: {}'.format(self.nnet.stats()))
 
-                # save the iteration examples to the history 
-                self.trainExamplesHistory.append(iterationTrainExamples)
+                # save the iteration examples as a new shard of the history, the oldest shards are dropped
+                self.replayBuffer.add(iterationTrainExamples)
                 
-            if len(self.trainExamplesHistory) > self.args.numItersForTrainExamplesHistory:
-                print("len(trainExamplesHistory) =", len(self.trainExamplesHistory), " => remove the oldest trainExamples")
-                self.trainExamplesHistory.pop(0)
-            # backup history to a file
-            # NB! the examples were collected using the model from the previous iteration, so (i-1)  
-            self.saveTrainExamples(i-1)
-            self.loadTrainExamples(i-1)
-            
             # shuffle examlpes before training
-            trainExamples = []
-            for e in self.trainExamplesHistory:
-                trainExamples.extend(e)
-            shuffle(trainExamples)
+            trainExamples = self.replayBuffer.load().shuffled()
 
             # training new network, keeping a copy of the old one
             self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
             self.pnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
             pmcts = MCTS(self.game, self.pnet, self.args)
             
-            self.nnet.train(trainExamples)
+            if self.args.get('storeSymmetries', True):
+                self.nnet.train(trainExamples)
+            else:
+                # examples are canonical only, a random symmetry is applied per batch
+                self.nnet.train(trainExamples, augment=True)
             nmcts = MCTS(self.game, self.nnet, self.args)
+            numArenaWorkers = self.args.get('numArenaWorkers', 1)
+            if numArenaWorkers > 1:
+                # the arena workers load the new network from here
+                self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='new.pth.tar')
 
             print('PITTING AGAINST PREVIOUS VERSION')
-            arena = Arena(lambda x: np.argmax(pmcts.getActionProb(x, temp=0)),
-                          lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), self.game)
-            pwins, nwins, draws = arena.playGames(self.args.arenaCompare)
+            arena = Arena(MCTSPlayer(self.game, self.nnetClass, self.args.checkpoint, 'temp.pth.tar', self.args, pmcts),
+                          MCTSPlayer(self.game, self.nnetClass, self.args.checkpoint, 'new.pth.tar', self.args, nmcts), self.game)
+            pwins, nwins, draws = arena.playGames(self.args.arenaCompare, numWorkers=numArenaWorkers)
 
             print('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
             if pwins+nwins > 0 and float(nwins)/(pwins+nwins) < self.args.updateThreshold:
@@ -133,46 +152,45 @@ class Coach():
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='best.pth.tar')                
             self.nnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
 
+        if self.inferenceServer is not None:
+            self.inferenceServer.close()
+            self.inferenceServer = None
+
 
     def getCheckpointFile(self, iteration):
         return 'checkpoint_' + str(iteration) + '.pth.tar'
 
-    def saveTrainExamples(self, iteration):
-        folder = self.args.checkpoint
-        if not os.path.exists(folder):
-            os.makedirs(folder)
-        filename = os.path.join(folder, self.getCheckpointFile(iteration)+".examples")
-        with open(filename, "wb+") as f:
-            Pickler(f).dump(self.trainExamplesHistory)
-        f.closed
-
     def loadTrainExamplesA(self):
+        """
+        Loads the examples saved with the model in args.load_folder_file into
+        the replay buffer, and skips the self-play of the first iteration. The
+        examples are the replay buffer in the model's folder, or a pickled
+        .examples file written by older versions. Those hold the network
+        inputs of CambiaGame instead of its states; CambiaNet trains on them
+        as they are, see CambiaGame.trainingInputs.
+        """
         modelFile = os.path.join(self.args.load_folder_file[0], self.args.load_folder_file[1])
         examplesFile = modelFile+".examples"
-        if not os.path.isfile(examplesFile):
-            print(examplesFile)
-            r = input("File with trainExamples not found. Continue? [y|n]")
-            if r != "y":
-                sys.exit()
-        else:
+        replay = ReplayBuffer(os.path.join(self.args.load_folder_file[0], 'replay'), self.replayBuffer.maxIterations)
+        sameFolder = os.path.abspath(replay.folder) == os.path.abspath(self.replayBuffer.folder)
+        if not sameFolder:
+            # only the examples of the loaded model are kept
+            self.replayBuffer.clear()
+        if len(replay) > 0:
+            print("Replay buffer with trainExamples found. Use it.")
+            if not sameFolder:
+                for shard in replay.shards():
+                    self.replayBuffer.add(replay.loadShard(shard))
+        elif os.path.isfile(examplesFile):
             print("File with trainExamples found. Read it.")
             with open(examplesFile, "rb") as f:
-                self.trainExamplesHistory = Unpickler(f).load()
-            f.closed
-            # examples based on the model were already collected (loaded)
-            self.skipFirstSelfPlay = True
-    def loadTrainExamples(self, iteration):
-        folder = self.args.checkpoint
-        filename = os.path.join(folder, self.getCheckpointFile(iteration)+".examples")
-        if not os.path.isfile(filename):
-            print(filename)
+                for examples in Unpickler(f).load():
+                    self.replayBuffer.add(list(examples))
+        else:
+            print(examplesFile)
             r = input("File with trainExamples not found. Continue? [y|n]")
             if r != "y":
                 sys.exit()
-        else:
-            print("File with trainExamples found. Read it.")
-            with open(filename, "rb") as f:
-                self.trainExamplesHistory = Unpickler(f).load()
-            f.closed
-            # examples based on the model were already collected (loaded)
-            self.skipFirstSelfPlay = False
\ No newline at end of file
+            return
+        # examples based on the model were already collected (loaded)
+        self.skipFirstSelfPlay = True
@@ -101,6 +101,29 @@ class Game():
         """
         pass
 
+    def getNumSymmetries(self):
+        """
+        Returns:
+            numSymmetries: number of symmetries of the game known to
+                           applySymmetries, 1 (only the identity) by default
+        """
+        return 1
+
+    def applySymmetries(self, boards, pis, symmetries):
+        """
+        Input:
+            boards: a batch of boards in canonical form
+            pis: their policy vectors
+            symmetries: which symmetry to apply to every example, from 0, the
+                        identity, to getNumSymmetries()-1
+
+        Returns:
+            (boards, pis): the transformed batch. This is the vectorized
+                           counterpart of getSymmetries, used to augment
+                           training batches on the fly.
+        """
+        return boards, pis
+
     def stringRepresentation(self, board):
         """
         Input:
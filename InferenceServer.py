@@ -0,0 +1,188 @@
+from multiprocessing.connection import wait
+import os
+import time
+import traceback
+import numpy as np
+from NeuralNet import NeuralNet
+from utils import spawnContext
+
+
+def serve(game, nnetClass, folder, filename, conns, control, maxBatchSize, maxWait):
+    """
+    Main loop of the inference server process. Waits for requests from the
+    client connections conns and collects them into one batch until it holds
+    maxBatchSize boards or maxWait seconds have passed since the first request
+    of the batch arrived. The batch is evaluated with a single predict_batch
+    call and every client gets back the rows of its own request, with the
+    tag the request came with.
+
+    If predict_batch raises, the clients of the batch are sent the traceback
+    instead. Messages on control are handled between batches: ('reload', folder,
+    filename) loads a new checkpoint, None stops the server.
+    """
+    nnet = nnetClass(game)
+    nnet.load_checkpoint(folder=folder, filename=filename)
+    control.send('ready')
+
+    conns = list(conns)
+    while True:
+        requests = []   # (conn, tag, number of boards) in arrival order
+        boards = []
+        message = False
+        deadline = None
+        while len(boards) < maxBatchSize:
+            timeout = None if deadline is None else max(0., deadline - time.time())
+            ready = wait(conns + [control], timeout)
+            if not ready:
+                break
+            for conn in ready:
+                if conn is control:
+                    message = True
+                    continue
+                try:
+                    tag, request = conn.recv()
+                except EOFError:
+                    # the client process exited
+                    conns.remove(conn)
+                    continue
+                requests.append((conn, tag, len(request)))
+                boards.extend(request)
+            if message:
+                break
+            if deadline is None and boards:
+                deadline = time.time() + maxWait
+
+        if boards:
+            try:
+                pis, vs = nnet.predict_batch(np.array(boards))
+            except Exception:
+                # the clients of the batch raise it, the server keeps serving
+                error = traceback.format_exc()
+                for conn, tag, n in requests:
+                    conn.send((tag, error))
+            else:
+                start = 0
+                for conn, tag, n in requests:
+                    conn.send((tag, (pis[start:start+n], vs[start:start+n])))
+                    start += n
+
+        if message:
+            msg = control.recv()
+            if msg is None:
+                return
+            try:
+                _, folder, filename = msg
+                nnet.load_checkpoint(folder=folder, filename=filename)
+                control.send('ready')
+            except Exception:
+                control.send(traceback.format_exc())
+
+
+class RemoteNNet(NeuralNet):
+    """
+    Client side of the InferenceServer. It can be passed to MCTS in place of
+    a network; every predict or predict_batch call is sent to the server and
+    blocks until the server answers.
+
+    A client is passed to a new worker process in every self-play phase.
+    Every request is tagged with a token drawn in the process that sends it
+    and a sequence number, and replies with another tag are dropped: those
+    answer a request of a worker that was killed before reading them.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.pid = None     # the process the token was drawn in
+        self.token = None
+        self.seq = 0
+
+    def predict(self, board):
+        """
+        board: np array with board
+        """
+        pis, vs = self.predict_batch(np.asarray(board)[np.newaxis])
+        return pis[0], vs[:1]
+
+    def predict_batch(self, boards):
+        """
+        boards: np array with a batch of boards
+        """
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.token = int.from_bytes(os.urandom(8), 'little')
+        self.seq += 1
+        tag = (self.token, self.seq)
+        self.conn.send((tag, np.asarray(boards)))
+        while True:
+            replyTag, result = self.conn.recv()
+            if replyTag == tag:
+                break
+        if isinstance(result, str):
+            raise RuntimeError("Inference server failed:\n" + result)
+        return result
+
+
+class InferenceServer():
+    """
+    Runs a single copy of the network in its own process and serves leaf
+    evaluations to many MCTS clients over local pipes. Requests from all
+    clients are batched dynamically, up to args.inferenceMaxBatchSize boards or
+    args.inferenceMaxWait seconds, so that workers share one model instead of
+    each running their own at batch size 1.
+
+    The server process is spawned, see utils.spawnContext, so the game and
+    the network class are pickled to it.
+    """
+
+    def __init__(self, game, nnetClass, args, numClients):
+        """
+        Input:
+            game: Game object
+            nnetClass: the NeuralNet subclass the server instantiates
+            args: the Coach args
+            numClients: number of RemoteNNet clients to create, one per
+                        process that will send requests
+        """
+        self.game = game
+        self.nnetClass = nnetClass
+        self.args = args
+        self.ctx = spawnContext()
+        pipes = [self.ctx.Pipe() for _ in range(numClients)]
+        self.clients = [RemoteNNet(clientConn) for clientConn, _ in pipes]
+        self.serverConns = [serverConn for _, serverConn in pipes]
+        self.control, self.serverControl = self.ctx.Pipe()
+        self.process = None
+
+    def start(self, folder, filename):
+        """
+        Starts the server process with the network saved in folder/filename
+        and waits until it is loaded.
+        """
+        self.process = self.ctx.Process(target=serve,
+                                        args=(self.game, self.nnetClass, folder, filename, self.serverConns, self.serverControl,
+                                              self.args.get('inferenceMaxBatchSize', 64), self.args.get('inferenceMaxWait', 0.005)),
+                                        daemon=True)
+        self.process.start()
+        self.waitReady()
+
+    def reload(self, folder, filename):
+        """
+        Makes the server load the network saved in folder/filename. Requests
+        that arrive afterwards are evaluated with the new network.
+        """
+        self.control.send(('reload', folder, filename))
+        self.waitReady()
+
+    def waitReady(self):
+        while not self.control.poll(1):
+            if not self.process.is_alive():
+                raise RuntimeError("Inference server exited with code {}".format(self.process.exitcode))
+        msg = self.control.recv()
+        if msg != 'ready':
+            raise RuntimeError("Inference server failed:\n" + msg)
+
+    def close(self):
+        if self.process is not None and self.process.is_alive():
+            self.control.send(None)
+            self.process.join()
+        self.process = None
@@ -1,38 +1,75 @@
 import math
 import numpy as np
+from NodeStore import DictNodeStore, ArrayNodeStore
 EPS = 1e-8
 
 class MCTS():
     """
     This class handles the MCTS tree.
+
+    The tree itself lives in a node store, chosen with args.nodeStore: 'dict'
+    (the default) keeps it in dicts keyed by stringRepresentation, 'array'
+    keeps it in preallocated NumPy arrays indexed by integer node ids (see
+    NodeStore.py). args.maxNodes bounds the number of nodes, which are then
+    evicted with args.evictionPolicy, 'lru' or 'leastVisited'; the nodes on
+    the search paths being walked are pinned so they are never evicted.
     """
 
     def __init__(self, game, nnet, args):
         self.game = game
         self.nnet = nnet
         self.args = args
-        self.Qsa = {}       # stores Q values for s,a (as defined in the paper)
-        self.Nsa = {}       # stores #times edge s,a was visited
-        self.Ns = {}        # stores #times board s was visited
-        self.Ps = {}        # stores initial policy (returned by neural net)
-
-        self.Es = {}        # stores game.getGameEnded ended for board s
-        self.Vs = {}        # stores game.getValidMoves for board s
+        maxNodes = self.args.get('maxNodes')
+        evictionPolicy = self.args.get('evictionPolicy', 'lru')
+        if self.args.get('nodeStore', 'dict') == 'array':
+            self.store = ArrayNodeStore(self.game.getActionSize(), self.args.get('nodeStoreCapacity', 1024),
+                                        maxNodes, evictionPolicy)
+        else:
+            self.store = DictNodeStore(self.game.getActionSize(), maxNodes, evictionPolicy)
+        self.virtualLoss = {}   # stores the virtual loss on the edges of node during searchBatch
+        # the (node, action) edges of the path of the current search, grown when a path is longer;
+        # search runs one at a time on an instance, AsyncMCTS.search keeps its path in its own lists
+        self.pathNodes = [None]*64
+        self.pathActions = [0]*64
 
     def getActionProb(self, canonicalBoard, temp=1):
         """
         This function performs numMCTSSims simulations of MCTS starting from
         canonicalBoard.
 
+        If args.searchBatchSize is larger than 1, the simulations are run in
+        rounds of up to that many leaves each (see searchBatch).
+
         Returns:
             probs: a policy vector where the probability of the ith action is
-                   proportional to Nsa[(s,a)]**(1./temp)
+                   proportional to Nsa[(s,a)]**(1./temp), see actionProb
+        """
+        batchSize = self.args.get('searchBatchSize', 1)
+        if batchSize > 1:
+            sims = 0
+            while sims < self.args.numMCTSSims:
+                sims += self.searchBatch(canonicalBoard, min(batchSize, self.args.numMCTSSims - sims))
+        else:
+            for i in range(self.args.numMCTSSims):
+                self.search(canonicalBoard)
+        return self.actionProb(canonicalBoard, temp)
+
+    def actionProb(self, canonicalBoard, temp=1):
         """
-        for i in range(self.args.numMCTSSims):
-            self.search(canonicalBoard)
+        Computes the policy from the visit counts of the edges of
+        canonicalBoard, without running any simulation, for drivers that run
+        them themselves.
 
+        Returns:
+            probs: a policy vector where the probability of the ith action is
+                   proportional to Nsa[(s,a)]**(1./temp)
+        """
         s = self.game.stringRepresentation(canonicalBoard)
-        counts = [self.Nsa[(s,a)] if (s,a) in self.Nsa else 0 for a in range(self.game.getActionSize())]
+        node = self.store.lookup(s)
+        if node is not None and self.store.isExpanded(node):
+            counts = [int(x) for x in self.store.n(node)]
+        else:
+            counts = [0]*self.game.getActionSize()
 
         if temp==0:
             bestA = np.argmax(counts)
@@ -54,10 +91,43 @@ class MCTS():
         return probs
 
 
+    def select(self, node):
+        """
+        Picks the action with the highest upper confidence bound at an expanded
+        node. The bound is computed for all actions at once from the node's
+        prior, Q and visit count vectors; ties go to the lowest action, as in a
+        loop over the actions with a strict comparison.
+
+        Edges that simulations of the current searchBatch round are still
+        waiting on carry a virtual loss: each pending simulation counts as a
+        visit with value -1, which steers the other simulations of the round
+        to different leaves.
+
+        Returns:
+            a: the selected action
+        """
+        Ps = self.store.priors(node)
+        Qsa = self.store.q(node)
+        Nsa = self.store.n(node)
+        Ns = self.store.visits(node)
+
+        vl = self.virtualLoss.get(node)
+        if vl is not None:
+            Qsa = (Nsa*Qsa - vl)/np.maximum(Nsa + vl, 1)
+            Nsa = Nsa + vl
+            Ns = Ns + np.sum(vl)
+
+        u = np.where(Nsa > 0,
+                     Qsa + self.args.cpuct*Ps*math.sqrt(Ns)/(1+Nsa),
+                     self.args.cpuct*Ps*math.sqrt(Ns + EPS))     # Q = 0 ?
+        u[self.store.valids(node) == 0] = -np.inf
+        return int(np.argmax(u))
+
     def search(self, canonicalBoard):
         """
-        This function performs one iteration of MCTS. It is recursively called
-        till a leaf node is found. The action chosen at each node is one that
+        This function performs one iteration of MCTS. It descends the tree
+        till a leaf node is found, recording the edges it takes in pathNodes
+        and pathActions. The action chosen at each node is one that
         has the maximum upper confidence bound as in the paper.
 
         Once a leaf node is found, the neural network is called to return an
@@ -73,65 +143,192 @@ class MCTS():
         Returns:
             v: the negative of the value of the current canonicalBoard
         """
+        board = canonicalBoard
+        depth = 0
+        while True:
+            s = self.game.stringRepresentation(board)
 
-        s = self.game.stringRepresentation(canonicalBoard)
+            node = self.store.lookup(s)
+            if node is None:
+                node = self.store.add(s, self.game.getGameEnded(board, 1))
+            if self.store.ended(node)!=0:
+                # terminal node
+                v = -self.store.ended(node)
+                break
 
-        if s not in self.Es:
-            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
-        if self.Es[s]!=0:
-            # terminal node
-            return -self.Es[s]
-
-        if s not in self.Ps:
-            # leaf node
-            self.Ps[s], v = self.nnet.predict(self.game.unknownize(canonicalBoard, 1))
-            valids = self.game.getValidMoves(canonicalBoard, 1)
-            self.Ps[s] = self.Ps[s]*valids      # masking invalid moves
-            sum_Ps_s = np.sum(self.Ps[s])
-            if sum_Ps_s > 0:
-                self.Ps[s] /= sum_Ps_s    # renormalize
-            else:
-                # if all valid moves were masked make all valid moves equally probable
-                
-                # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
-                # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
-                print("All valid moves were masked, do workaround.")
-                self.Ps[s] = self.Ps[s] + valids
-                self.Ps[s] /= np.sum(self.Ps[s])
-
-            self.Vs[s] = valids
-            self.Ns[s] = 0
-            return -v
-
-        valids = self.Vs[s]
-        cur_best = -float('inf')
-        best_act = -1
-
-        # pick the action with the highest upper confidence bound
-        for a in range(self.game.getActionSize()):
-            if valids[a]:
-                if (s,a) in self.Qsa:
-                    u = self.Qsa[(s,a)] + self.args.cpuct*self.Ps[s][a]*math.sqrt(self.Ns[s])/(1+self.Nsa[(s,a)])
-                else:
-                    u = self.args.cpuct*self.Ps[s][a]*math.sqrt(self.Ns[s] + EPS)     # Q = 0 ?
-
-                if u > cur_best:
-                    cur_best = u
-                    best_act = a
-
-        a = best_act
-        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
-        next_s = self.game.getCanonicalForm(next_s, next_player)
-
-        v = self.search(next_s)
-
-        if (s,a) in self.Qsa:
-            self.Qsa[(s,a)] = (self.Nsa[(s,a)]*self.Qsa[(s,a)] + v)/(self.Nsa[(s,a)]+1)
-            self.Nsa[(s,a)] += 1
+            if not self.store.isExpanded(node):
+                # leaf node
+                ps, v = self.nnet.predict(board)
+                self.expand(node, board, ps)
+                v = -np.asarray(v).item()     # wrappers return v as a length 1 array
+                break
+
+            a = self.select(node)
+            depth = self.pushPath(self.pathNodes, self.pathActions, depth, node, a)
+            next_s, next_player = self.game.getNextState(board, 1, a)
+            board = self.game.getCanonicalForm(next_s, next_player)
+
+        return self.backupPath(self.pathNodes, self.pathActions, depth, v)
+
+    def pushPath(self, pathNodes, pathActions, depth, node, a):
+        """
+        Records the edge (node, a) at depth of the search path held in the
+        lists pathNodes and pathActions, growing them if needed, and pins node.
+
+        Returns:
+            depth: the depth of the path with the edge
+        """
+        if depth == len(pathNodes):
+            grow = max(depth, 8)
+            pathNodes += [None]*grow
+            pathActions += [0]*grow
+        pathNodes[depth] = node
+        pathActions[depth] = a
+        self.store.pin(node)
+        return depth + 1
 
+    def backupPath(self, pathNodes, pathActions, depth, v):
+        """
+        Propagates v, the negative of the value of the state at the end of the
+        first depth edges of the search path, up the path and unpins its
+        nodes.
+
+        Returns:
+            v: the negative of the value of the state at the start of the path
+        """
+        store = self.store
+        for i in range(depth - 1, -1, -1):
+            node = pathNodes[i]
+            store.update(node, pathActions[i], v)
+            store.unpin(node)
+            pathNodes[i] = None
+            v = -v
+        return v
+
+    def expand(self, node, canonicalBoard, ps):
+        """
+        Masks the policy ps returned by the neural network for a leaf node with
+        the valid moves of canonicalBoard, renormalizes it and stores it.
+        """
+        valids = self.game.getValidMoves(canonicalBoard, 1)
+        ps = ps*valids      # masking invalid moves
+        sum_Ps_s = np.sum(ps)
+        if sum_Ps_s > 0:
+            ps /= sum_Ps_s    # renormalize
         else:
-            self.Qsa[(s,a)] = v
-            self.Nsa[(s,a)] = 1
+            # if all valid moves were masked make all valid moves equally probable
+            
+            # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
+            # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
+            print("All valid moves were masked, do workaround.")
+            ps = ps + valids
+            ps /= np.sum(ps)
+
+        self.store.expand(node, ps, valids)
+
+    def searchBatch(self, canonicalBoard, k):
+        """
+        This function performs up to k iterations of MCTS at once. The
+        simulations descend the tree one after another, each one leaving a
+        virtual loss on the edges it takes, and stop at a leaf without
+        evaluating it. The leaves are then evaluated with a single batched
+        call to the neural network and their values are propagated up their
+        search paths.
+
+        Returns:
+            sims: the number of simulations run, see gatherLeaves
+        """
+        leaves, sims = self.gatherLeaves(canonicalBoard, k)
+        if leaves:
+            pis, vs = self.nnet.predict_batch(np.array([board for _, board, _ in leaves]))
+            self.expandLeaves(leaves, pis, vs)
+        return sims
+
+    def gatherLeaves(self, canonicalBoard, k):
+        """
+        Runs the selection phase of up to k simulations starting from
+        canonicalBoard. Simulations that end in a terminal state are propagated
+        right away. The round stops early at the first simulation that reaches
+        a leaf already waiting to be evaluated, as it would add nothing but a
+        second visit of that leaf; its path is undone and it is not counted.
+        This always happens at an unexpanded canonicalBoard, which is
+        evaluated alone.
+
+        Returns:
+            leaves: a list of (node, board, path) for the leaves waiting to be
+                    evaluated, where path is the search path, a list of
+                    (node, action) edges, of the simulation that ended there
+            sims: the number of simulations run, at least 1
+        """
+        leaves = []
+        pending = set()
+        sims = 0
+        while sims < k:
+            board = canonicalBoard
+            path = []
+            duplicate = False
+            while True:
+                s = self.game.stringRepresentation(board)
+                node = self.store.lookup(s)
+                if node is None:
+                    node = self.store.add(s, self.game.getGameEnded(board, 1))
+                if self.store.ended(node)!=0:
+                    # terminal node
+                    self.backup(path, self.store.ended(node))
+                    break
+                if not self.store.isExpanded(node):
+                    # leaf node
+                    duplicate = node in pending
+                    if not duplicate:
+                        pending.add(node)
+                        leaves.append((node, board, path))
+                        self.store.pin(node)
+                    break
+
+                a = self.select(node)
+                path.append((node, a))
+                self.store.pin(node)
+                if node not in self.virtualLoss:
+                    self.virtualLoss[node] = np.zeros(self.game.getActionSize())
+                self.virtualLoss[node][a] += self.args.get('virtualLoss', 1)
+
+                next_s, next_player = self.game.getNextState(board, 1, a)
+                board = self.game.getCanonicalForm(next_s, next_player)
+            if duplicate:
+                # the round is over
+                self.removeVirtualLoss(path)
+                break
+            sims += 1
+        return leaves, sims
+
+    def expandLeaves(self, leaves, pis, vs):
+        """
+        Stores the network outputs pis, vs for leaves returned by gatherLeaves
+        and propagates the values up their search paths.
+        """
+        for (node, board, path), ps, v in zip(leaves, pis, vs):
+            self.expand(node, board, ps)
+            self.backup(path, v)
+            self.store.unpin(node)
 
-        self.Ns[s] += 1
-        return -v
+    def removeVirtualLoss(self, path):
+        """
+        Removes the virtual loss left on the edges of path and unpins its
+        nodes.
+        """
+        for node, a in path:
+            vl = self.virtualLoss[node]
+            vl[a] -= self.args.get('virtualLoss', 1)
+            if not vl.any():
+                del self.virtualLoss[node]
+            self.store.unpin(node)
+
+    def backup(self, path, v):
+        """
+        Propagates the value v of the state at the end of path up the path,
+        removes the virtual loss left on its edges and unpins its nodes.
+        """
+        self.removeVirtualLoss(path)
+        for node, a in reversed(path):
+            v = -v
+            self.store.update(node, a, v)
@@ -1,3 +1,5 @@
+import numpy as np
+
 class NeuralNet():
     """
     This class specifies the base NeuralNet class. To define your own neural
@@ -11,7 +13,7 @@ class NeuralNet():
     def __init__(self, game):
         pass
 
-    def train(self, examples):
+    def train(self, examples, augment=False):
         """
         This function trains the neural network with examples obtained from
         self-play.
@@ -21,6 +23,10 @@ class NeuralNet():
                       (board, pi, v). pi is the MCTS informed policy vector for
                       the given board, and v is its value. The examples has
                       board in its canonical form.
+            augment: if True, the examples were stored without their
+                     symmetries, and a random symmetry from
+                     game.applySymmetries should be applied to every example
+                     at training time.
         """
         pass
 
@@ -36,6 +42,23 @@ class NeuralNet():
         """
         pass
 
+    def predict_batch(self, boards):
+        """
+        Input:
+            boards: a batch of boards in their canonical form, stacked along
+                    the first axis.
+
+        Returns:
+            pis: an array of shape (len(boards), game.getActionSize()) with
+                 the policy vector of every board
+            vs: an array of shape (len(boards),) with the value of every board
+
+        The default calls predict once per board. Wrappers should override it
+        with a single call to their network.
+        """
+        pis, vs = zip(*[self.predict(board) for board in boards])
+        return np.array(pis), np.array(vs).reshape(-1)
+
     def save_checkpoint(self, folder, filename):
         """
         Saves the current neural network (with its parameters) in
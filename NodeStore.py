@@ -0,0 +1,270 @@
+from collections import OrderedDict
+import numpy as np
+
+
+class NodeStore():
+    """
+    Bookkeeping shared by the node stores: an optional bound on the number of
+    nodes, pins and hit/miss counters.
+
+    When a store holds maxNodes nodes, adding a node first evicts old ones:
+    with evictionPolicy 'lru' the least recently looked up node, with
+    'leastVisited' the tenth of the nodes with the fewest visits. Pinned
+    nodes, the ones on a search path that is still being walked, are never
+    evicted; if every node is pinned the store grows past maxNodes. An
+    evicted node is simply a new leaf the next time its state is reached.
+    """
+
+    def __init__(self, maxNodes=None, evictionPolicy='lru'):
+        if evictionPolicy not in ('lru', 'leastVisited'):
+            raise ValueError("Unknown eviction policy {}".format(evictionPolicy))
+        self.maxNodes = maxNodes
+        self.evictionPolicy = evictionPolicy
+        self.recent = OrderedDict()     # all nodes, least recently used first
+        self.pinned = {}                # pin count of the pinned nodes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.recent)
+
+    def lookup(self, s):
+        """
+        Returns:
+            node: the node stored for s, or None if s was never seen or was
+                  evicted
+        """
+        node = self.find(s)
+        if node is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.recent.move_to_end(node)
+        return node
+
+    def add(self, s, ended):
+        """
+        Creates an unexpanded node for s with game.getGameEnded result ended,
+        evicting nodes first if the store is full.
+        """
+        if self.maxNodes is not None and len(self) >= self.maxNodes:
+            self.evict()
+        node = self.create(s, ended)
+        self.recent[node] = None
+        return node
+
+    def pin(self, node):
+        """
+        Protects node from eviction until it is unpinned as many times as it
+        was pinned.
+        """
+        self.pinned[node] = self.pinned.get(node, 0) + 1
+
+    def unpin(self, node):
+        if self.pinned[node] == 1:
+            del self.pinned[node]
+        else:
+            self.pinned[node] -= 1
+
+    def evict(self):
+        if self.evictionPolicy == 'lru':
+            victims = []
+            for node in self.recent:
+                if node not in self.pinned:
+                    victims.append(node)
+                    break
+        else:
+            candidates = [node for node in self.recent if node not in self.pinned]
+            if not candidates:
+                return
+            visits = np.array([self.visits(node) if self.isExpanded(node) else 0 for node in candidates])
+            k = min(max(1, self.maxNodes//10), len(candidates))
+            victims = [candidates[i] for i in np.argpartition(visits, k-1)[:k]]
+        for node in victims:
+            del self.recent[node]
+            self.remove(node)
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Returns:
+            stats: a dict with the number of nodes, the lookup hits and misses,
+                   the hit rate and the number of evicted nodes
+        """
+        lookups = self.hits + self.misses
+        return {'nodes': len(self), 'hits': self.hits, 'misses': self.misses,
+                'hitRate': self.hits/lookups if lookups else 0., 'evictions': self.evictions}
+
+
+class DictNodeStore(NodeStore):
+    """
+    Stores the MCTS tree in dicts keyed by game.stringRepresentation. A node is
+    referred to by its key, and every node holds one entry per action in its
+    Qsa/Nsa vectors.
+    """
+
+    def __init__(self, actionSize, maxNodes=None, evictionPolicy='lru'):
+        super().__init__(maxNodes, evictionPolicy)
+        self.actionSize = actionSize
+        self.Qsa = {}       # stores Q values for s,a (as defined in the paper)
+        self.Nsa = {}       # stores #times edge s,a was visited
+        self.Ns = {}        # stores #times board s was visited
+        self.Ps = {}        # stores initial policy (returned by neural net)
+
+        self.Es = {}        # stores game.getGameEnded ended for board s
+        self.Vs = {}        # stores game.getValidMoves for board s
+
+    def find(self, s):
+        return s if s in self.Es else None
+
+    def create(self, s, ended):
+        self.Es[s] = ended
+        return s
+
+    def remove(self, node):
+        del self.Es[node]
+        if node in self.Ps:
+            for table in (self.Ps, self.Vs, self.Ns, self.Qsa, self.Nsa):
+                del table[node]
+
+    def ended(self, node):
+        return self.Es[node]
+
+    def isExpanded(self, node):
+        return node in self.Ps
+
+    def expand(self, node, ps, valids):
+        """
+        Stores the masked policy ps and valid moves of a leaf node.
+        """
+        self.Ps[node] = ps
+        self.Vs[node] = valids
+        self.Ns[node] = 0
+        self.Qsa[node] = np.zeros(self.actionSize)
+        self.Nsa[node] = np.zeros(self.actionSize, dtype=np.int64)
+
+    def priors(self, node):
+        return self.Ps[node]
+
+    def valids(self, node):
+        return self.Vs[node]
+
+    def visits(self, node):
+        return self.Ns[node]
+
+    def q(self, node):
+        return self.Qsa[node]
+
+    def n(self, node):
+        return self.Nsa[node]
+
+    def update(self, node, a, v):
+        """
+        Backs up value v through edge (node, a).
+        """
+        Q = self.Qsa[node]
+        N = self.Nsa[node]
+        Q[a] = (N[a]*Q[a] + v)/(N[a]+1)
+        N[a] += 1
+        self.Ns[node] += 1
+
+
+class ArrayNodeStore(NodeStore):
+    """
+    Stores the MCTS tree in preallocated NumPy arrays of shape
+    (capacity, actionSize). Every node gets an integer id, which is its row in
+    the arrays, and the arrays double in size when they run out of rows. The
+    rows of evicted nodes are reused.
+    """
+
+    def __init__(self, actionSize, capacity=1024, maxNodes=None, evictionPolicy='lru'):
+        super().__init__(maxNodes, evictionPolicy)
+        self.actionSize = actionSize
+        self.capacity = capacity
+        self.size = 0
+        self.ids = {}       # maps game.stringRepresentation to node id
+        self.keys = {}      # maps node id to game.stringRepresentation
+        self.free = []      # ids of evicted nodes
+
+        # float64 as in DictNodeStore, so both stores select the same actions
+        self.P = np.zeros((capacity, actionSize))                       # initial policy
+        self.Q = np.zeros((capacity, actionSize))                       # Q values of the edges
+        self.N = np.zeros((capacity, actionSize), dtype=np.int32)      # visit counts of the edges
+        self.V = np.zeros((capacity, actionSize), dtype=np.int8)       # valid moves
+        self.Ns = np.zeros(capacity, dtype=np.int32)                    # visit counts of the nodes
+        self.E = np.zeros(capacity)                                     # game.getGameEnded results
+        self.expanded = np.zeros(capacity, dtype=bool)
+
+    def find(self, s):
+        return self.ids.get(s)
+
+    def create(self, s, ended):
+        if self.free:
+            node = self.free.pop()
+        else:
+            if self.size == self.capacity:
+                self.grow()
+            node = self.size
+            self.size += 1
+        self.ids[s] = node
+        self.keys[node] = s
+        self.E[node] = ended
+        return node
+
+    def remove(self, node):
+        del self.ids[self.keys.pop(node)]
+        self.Q[node] = 0
+        self.N[node] = 0
+        self.Ns[node] = 0
+        self.expanded[node] = False
+        self.free.append(node)
+
+    def grow(self):
+        """
+        Doubles the number of rows of every array.
+        """
+        for name in ['P', 'Q', 'N', 'V', 'Ns', 'E', 'expanded']:
+            old = getattr(self, name)
+            new = np.zeros((2*self.capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.capacity] = old
+            setattr(self, name, new)
+        self.capacity *= 2
+
+    def ended(self, node):
+        return self.E[node]
+
+    def isExpanded(self, node):
+        return self.expanded[node]
+
+    def expand(self, node, ps, valids):
+        """
+        Stores the masked policy ps and valid moves of a leaf node.
+        """
+        self.P[node] = ps
+        self.V[node] = valids
+        self.expanded[node] = True
+
+    def priors(self, node):
+        return self.P[node]
+
+    def valids(self, node):
+        return self.V[node]
+
+    def visits(self, node):
+        return self.Ns[node]
+
+    def q(self, node):
+        return self.Q[node]
+
+    def n(self, node):
+        return self.N[node]
+
+    def update(self, node, a, v):
+        """
+        Backs up value v through edge (node, a).
+        """
+        n = self.N[node, a]
+        self.Q[node, a] = (n*self.Q[node, a] + v)/(n+1)
+        self.N[node, a] += 1
+        self.Ns[node] += 1
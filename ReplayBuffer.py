@@ -0,0 +1,213 @@
+import os
+import re
+import numpy as np
+from utils import dtypes, storageBoards
+
+
+class ReplayExamples():
+    """
+    A read-only sequence of (board, pi, v) examples stored column by column in
+    the shards of a ReplayBuffer. The columns are memory-mapped, so examples
+    are only read from disk when they are accessed.
+    """
+
+    def __init__(self, shards, indices=None):
+        """
+        Input:
+            shards: a list of (boards, pis, vs) arrays
+            indices: the examples of the concatenated shards this sequence
+                     holds, in order, or None for all of them
+        """
+        self.shards = shards
+        self.offsets = np.cumsum([0] + [len(vs) for _, _, vs in shards])
+        self.indices = indices
+
+    def __len__(self):
+        if self.indices is not None:
+            return len(self.indices)
+        return int(self.offsets[-1])
+
+    def __getitem__(self, i):
+        if self.indices is not None:
+            i = self.indices[i]
+        elif i < 0:
+            i += len(self)
+        shard = int(np.searchsorted(self.offsets, i, side='right')) - 1
+        boards, pis, vs = self.shards[shard]
+        j = i - self.offsets[shard]
+        return boards[j], pis[j], vs[j]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def shuffled(self):
+        """
+        Returns:
+            examples: the same examples in random order
+        """
+        return ReplayExamples(self.shards, np.random.permutation(self.indices if self.indices is not None
+                                                                 else len(self)))
+
+    def columns(self, indices=None):
+        """
+        Input:
+            indices: positions of the examples to read, or None for all
+
+        Returns:
+            (boards, pis, vs): the examples as three arrays, read into memory
+        """
+        if indices is None:
+            indices = np.arange(len(self))
+        indices = np.asarray(indices)
+        if self.indices is not None:
+            indices = self.indices[indices]
+        shardOf = np.searchsorted(self.offsets, indices, side='right') - 1
+        columns = []
+        for c in range(3):
+            # shards written with other dtypes are read into the widest of them
+            dtype = np.result_type(*[shard[c].dtype for shard in self.shards])
+            out = np.empty((len(indices),) + self.shards[0][c].shape[1:], dtype=dtype)
+            for shard in np.unique(shardOf):
+                rows = shardOf == shard
+                out[rows] = self.shards[shard][c][indices[rows] - self.offsets[shard]]
+            columns.append(out)
+        return tuple(columns)
+
+    def groups(self, indices):
+        """
+        Splits the examples at positions indices by the kind of their boards.
+        Shards written by older versions may hold boards that cannot be read
+        into one array with the others, such as the network inputs of the
+        CambiaGame examples of pickled .examples files next to its states.
+
+        Returns:
+            groups: a list of (rows, (boards, pis, vs)), the positions in
+                    indices of the examples of a group and their columns, as
+                    returned by columns
+        """
+        indices = np.asarray(indices)
+        kinds = [boardKind(shard[0]) for shard in self.shards]
+        if len(set(kinds)) <= 1:
+            return [(np.arange(len(indices)), self.columns(indices))]
+        absolute = self.indices[indices] if self.indices is not None else indices
+        shardOf = np.searchsorted(self.offsets, absolute, side='right') - 1
+        groups = []
+        for kind in sorted(set(kinds), key=kinds.index):
+            shards = [i for i, k in enumerate(kinds) if k == kind]
+            rows = np.flatnonzero(np.isin(shardOf, shards))
+            if not len(rows):
+                continue
+            group = ReplayExamples([self.shards[i] for i in shards])
+            position = np.zeros(len(self.shards), dtype=int)
+            position[shards] = np.arange(len(shards))
+            local = absolute[rows] - self.offsets[shardOf[rows]] + group.offsets[position[shardOf[rows]]]
+            groups.append((rows, group.columns(local)))
+        return groups
+
+
+def boardKind(boards):
+    """
+    Returns:
+        kind: the fields and shape of the boards of a column, boards of the
+              same kind can be read into one array
+    """
+    return boards.dtype.fields is not None and tuple(boards.dtype.names), boards.shape[1:]
+
+
+class ReplayBuffer():
+    """
+    Stores the self-play examples of the latest maxIterations iterations in a
+    folder, one shard per iteration. A shard is three .npy files, the boards,
+    pis and vs of its examples, so an iteration is written once as arrays of
+    the storage dtypes of utils.dtypes, loaded with memory-mapping, and dropped by deleting its files.
+    """
+
+    def __init__(self, folder, maxIterations):
+        """
+        Input:
+            folder: folder of the shards, created if needed
+            maxIterations: number of shards to keep
+        """
+        self.folder = folder
+        self.maxIterations = maxIterations
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def shardPath(self, shard, column):
+        return os.path.join(self.folder, 'shard_{:06d}.{}.npy'.format(shard, column))
+
+    def shards(self):
+        """
+        Returns:
+            shards: the numbers of the complete shards, oldest first
+        """
+        shards = []
+        for f in os.listdir(self.folder):
+            m = re.match(r'shard_(\d+)\.vs\.npy$', f)
+            if m:
+                shards.append(int(m.group(1)))
+        return sorted(shards)
+
+    def add(self, examples):
+        """
+        Writes examples, a list of (board, pi, v) tuples or a ReplayExamples,
+        to a new shard and deletes the oldest shards beyond maxIterations.
+        """
+        shards = self.shards()
+        shard = shards[-1] + 1 if shards else 0
+        if isinstance(examples, ReplayExamples) and len(examples):
+            boards, pis, vs = examples.columns()
+        else:
+            boards, pis, vs = list(zip(*examples)) if len(examples) else ([], [], [])
+        columns = [('boards', storageBoards(boards)),
+                   ('pis', np.asarray(pis, dtype=dtypes.pi)),
+                   ('vs', np.asarray(vs, dtype=dtypes.v))]
+        # vs is written last, it marks the shard as complete
+        for column, array in columns:
+            tmp = self.shardPath(shard, column) + '.tmp'
+            with open(tmp, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp, self.shardPath(shard, column))
+        self.trim()
+
+    def trim(self):
+        """
+        Deletes the oldest shards beyond maxIterations.
+        """
+        shards = self.shards()
+        for shard in shards[:max(0, len(shards) - self.maxIterations)]:
+            # vs first, so a partly deleted shard is no longer complete
+            for column in ['vs', 'pis', 'boards']:
+                os.remove(self.shardPath(shard, column))
+
+    def clear(self):
+        """
+        Deletes every shard.
+        """
+        maxIterations, self.maxIterations = self.maxIterations, 0
+        try:
+            self.trim()
+        finally:
+            self.maxIterations = maxIterations
+
+    def load(self):
+        """
+        Returns:
+            examples: a ReplayExamples over the memory-mapped shards
+        """
+        shards = []
+        for shard in self.shards():
+            shards.extend(self.loadShard(shard).shards)
+        return ReplayExamples(shards)
+
+    def loadShard(self, shard):
+        """
+        Returns:
+            examples: a ReplayExamples over the memory-mapped shard
+        """
+        columns = tuple(np.load(self.shardPath(shard, column), mmap_mode='r') for column in ['boards', 'pis', 'vs'])
+        return ReplayExamples([columns] if len(columns[2]) else [])
+
+    def __len__(self):
+        return len(self.shards())
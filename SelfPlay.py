@@ -0,0 +1,267 @@
+import queue
+import random
+import traceback
+import numpy as np
+from MCTS import MCTS
+from CachedNNet import CachedNNet
+from utils import dtypes, storageBoards, spawnContext
+
+
+def executeEpisode(game, mcts, args):
+    """
+    This function executes one episode of self-play, starting with player 1.
+    As the game is played, each turn is added as a training example to
+    trainExamples. The game is played till the game ends. After the game
+    ends, the outcome of the game is used to assign values to each example
+    in trainExamples.
+
+    It uses a temp=1 if episodeStep < tempThreshold, and thereafter
+    uses temp=0. Unless args.storeSymmetries is False, every symmetry of
+    the board is stored as an example; otherwise only the canonical board is,
+    and the symmetries are applied at training time.
+
+    Returns:
+        trainExamples: a list of examples of the form (canonicalBoard,pi,v)
+                       pi is the MCTS informed policy vector, v is +1 if
+                       the player eventually won the game, else -1.
+    """
+    trainExamples = []
+    board = game.getInitBoard()
+    curPlayer = 1
+    episodeStep = 0
+
+    while True:
+        episodeStep += 1
+        canonicalBoard = game.getCanonicalForm(board,curPlayer)
+        temp = int(episodeStep < args.tempThreshold)
+
+        pi = mcts.getActionProb(canonicalBoard, temp=temp)
+        trainExamples += positionExamples(game, canonicalBoard, curPlayer, pi, args)
+
+        action = np.random.choice(len(pi), p=pi)
+        board, curPlayer = game.getNextState(board, curPlayer, action)
+
+        r = game.getGameEnded(board, curPlayer)
+
+        if r!=0:
+            return assignValues(trainExamples, r, curPlayer)
+
+
+def positionExamples(game, canonicalBoard, curPlayer, pi, args):
+    """
+    Returns:
+        examples: the [board, curPlayer, pi, None] examples of a position, one
+                  per symmetry unless args.storeSymmetries is False
+    """
+    if args.get('storeSymmetries', True):
+        sym = game.getSymmetries(canonicalBoard, pi)
+    else:
+        sym = [(canonicalBoard, pi)]
+    # kept in the storage dtypes, not as boards of ints and lists of floats
+    return [[storageBoards(b), curPlayer, np.asarray(p, dtype=dtypes.pi), None] for b,p in sym]
+
+
+def assignValues(trainExamples, r, curPlayer):
+    """
+    Returns:
+        trainExamples: the (board, pi, v) examples of an episode that ended
+                       with result r for curPlayer
+    """
+    return [(x[0],x[2],r*((-1)**(x[1]!=curPlayer))) for x in trainExamples]
+
+
+class Episode():
+    """
+    A self-play episode of executeEpisodes, with its own search tree.
+    """
+
+    def __init__(self, game, nnet, args):
+        self.game = game
+        self.args = args
+        self.mcts = MCTS(game, nnet, args)
+        self.board = game.getInitBoard()
+        self.curPlayer = 1
+        self.episodeStep = 0
+        self.trainExamples = []
+
+    def canonicalBoard(self):
+        return self.game.getCanonicalForm(self.board, self.curPlayer)
+
+    def play(self, canonicalBoard):
+        """
+        Plays a move from the visit counts of the search at canonicalBoard, as
+        executeEpisode does.
+
+        Returns:
+            trainExamples: the examples of the episode if it ended, else None
+        """
+        self.episodeStep += 1
+        temp = int(self.episodeStep < self.args.tempThreshold)
+        pi = self.mcts.actionProb(canonicalBoard, temp=temp)
+        self.trainExamples += positionExamples(self.game, canonicalBoard, self.curPlayer, pi, self.args)
+
+        action = np.random.choice(len(pi), p=pi)
+        self.board, self.curPlayer = self.game.getNextState(self.board, self.curPlayer, action)
+
+        r = self.game.getGameEnded(self.board, self.curPlayer)
+        if r!=0:
+            return assignValues(self.trainExamples, r, self.curPlayer)
+        return None
+
+
+def executeEpisodes(game, nnet, args, numEps):
+    """
+    Plays numEps episodes of self-play in this process, args.numParallelGames
+    of them at a time in lockstep, each with its own search tree. At every
+    simulation step the leaves of all the trees, up to args.searchBatchSize
+    per tree, are evaluated with a single nnet.predict_batch call, so the network
+    sees batches even for a single process. An episode that ends is replaced
+    by a fresh one until numEps episodes have been started.
+
+    Returns:
+        a generator over the example lists of the episodes, in the order in
+        which the episodes end
+    """
+    batchSize = args.get('searchBatchSize', 1)
+    episodes = [Episode(game, nnet, args) for _ in range(min(args.get('numParallelGames', 1), numEps))]
+    started = len(episodes)
+    while episodes:
+        canonicalBoards = [e.canonicalBoard() for e in episodes]
+        sims = [0]*len(episodes)    # a round may run fewer than batchSize simulations of a tree
+        while min(sims) < args.numMCTSSims:
+            leaves = []
+            for i, (e, board) in enumerate(zip(episodes, canonicalBoards)):
+                if sims[i] < args.numMCTSSims:
+                    episodeLeaves, n = e.mcts.gatherLeaves(board, min(batchSize, args.numMCTSSims - sims[i]))
+                    sims[i] += n
+                else:
+                    episodeLeaves = []
+                leaves.append(episodeLeaves)
+            boards = [board for episodeLeaves in leaves for _, board, _ in episodeLeaves]
+            if boards:
+                pis, vs = nnet.predict_batch(np.array(boards))
+                start = 0
+                for e, episodeLeaves in zip(episodes, leaves):
+                    end = start + len(episodeLeaves)
+                    e.mcts.expandLeaves(episodeLeaves, pis[start:end], vs[start:end])
+                    start = end
+
+        running = []
+        for e, board in zip(episodes, canonicalBoards):
+            examples = e.play(board)
+            if examples is None:
+                running.append(e)
+                continue
+            yield examples
+            if started < numEps:
+                running.append(Episode(game, nnet, args))
+                started += 1
+        episodes = running
+
+
+def selfPlayWorker(game, nnetClass, folder, filename, args, tasks, results, nnet=None):
+    """
+    Entry point of a self-play worker process. Loads the network saved in
+    folder/filename, unless a network such as an InferenceServer client is
+    passed in nnet, and plays one episode, with a fresh search tree, for every
+    task until it receives None. The examples of each episode are put on
+    results as soon as the episode ends. With args.nnetCacheSize the episodes
+    of a worker share a CachedNNet.
+    """
+    try:
+        # not the random state of the parent, whatever the start method
+        np.random.seed()
+        random.seed()
+        if nnet is None:
+            nnet = nnetClass(game)
+            nnet.load_checkpoint(folder=folder, filename=filename)
+        if args.get('nnetCacheSize', 0) > 0:
+            nnet = CachedNNet(game, nnet, args.nnetCacheSize)
+        while tasks.get() is not None:
+            mcts = MCTS(game, nnet, args)   # reset search tree
+            results.put(executeEpisode(game, mcts, args))
+    except Exception:
+        results.put(traceback.format_exc())
+        raise
+
+
+class SelfPlayWorkers():
+    """
+    Plays self-play episodes in args.numSelfPlayWorkers processes. Every
+    worker loads its own copy of the network from a checkpoint, or evaluates
+    its leaves through an InferenceServer client, and plays episodes
+    independently of the others.
+
+    The workers are spawned, see utils.spawnContext, so the game, the
+    network class and args are pickled to them.
+    """
+
+    def __init__(self, game, nnetClass, args):
+        """
+        Input:
+            game: Game object
+            nnetClass: the NeuralNet subclass to instantiate in every worker
+            args: the Coach args
+        """
+        self.game = game
+        self.nnetClass = nnetClass
+        self.args = args
+
+    def play(self, numEps, folder, filename, clients=None):
+        """
+        Plays numEps episodes with the network saved in folder/filename. If
+        clients, a list of InferenceServer clients, is given, worker i uses
+        clients[i] instead of loading the network.
+
+        Returns:
+            a generator over the example lists of the episodes, in the order
+            in which the episodes end
+        """
+        ctx = spawnContext()
+        tasks = ctx.Queue()
+        results = ctx.Queue()
+        numWorkers = min(self.args.numSelfPlayWorkers, numEps)
+        for _ in range(numEps):
+            tasks.put(True)
+        for _ in range(numWorkers):
+            tasks.put(None)
+
+        workers = [ctx.Process(target=selfPlayWorker,
+                               args=(self.game, self.nnetClass, folder, filename, self.args, tasks, results,
+                                     clients[i] if clients is not None else None),
+                               daemon=True)
+                   for i in range(numWorkers)]
+        for w in workers:
+            w.start()
+        done = False
+        try:
+            for _ in range(numEps):
+                examples = self.nextResult(results, workers)
+                if isinstance(examples, str):
+                    raise RuntimeError("Self-play worker failed:\n" + examples)
+                yield examples
+            done = True
+        finally:
+            for w in workers:
+                if not done:
+                    w.terminate()
+                w.join()
+
+    def nextResult(self, results, workers):
+        """
+        Waits for the next result of the workers, checking every second that
+        they are still running, so a worker killed without putting a result
+        (by the OOM killer, or a crash in native code) is not waited for
+        forever.
+        """
+        while True:
+            # checked before waiting, what the workers put before exiting is then on the queue
+            alive = any(w.is_alive() for w in workers)
+            try:
+                return results.get(timeout=1)
+            except queue.Empty:
+                for w in workers:
+                    if w.exitcode not in (None, 0):
+                        raise RuntimeError("Self-play worker exited with code {}".format(w.exitcode))
+                if not alive:
+                    raise RuntimeError("Self-play workers exited before playing every episode")
@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class ZobristBoard(np.ndarray):
+    """
+    A numpy board that carries its Zobrist key, and the key of the board with
+    the colors of the pieces swapped, so they don't have to be recomputed.
+    Games can also record the flat index of the last stone played in
+    lastMove, to check only the lines through it for a win.
+
+    Any new array derived from a ZobristBoard (a copy, a view, the result of
+    arithmetic) starts without keys and last move, since its pieces may
+    differ; Zobrist.key then computes the keys from scratch.
+    """
+
+    def __array_finalize__(self, obj):
+        self.key = None
+        self.negKey = None
+        self.lastMove = None
+
+
+class Zobrist():
+    """
+    Zobrist hashing of boards whose cells hold 1, -1 or 0 (empty); other values
+    are hashed by their sign. The key of a board is the xor of a random 64-bit
+    number for the piece on every non-empty cell, so placing, removing or
+    flipping a piece updates it in O(1), and the key of the board with the
+    colors swapped, -board, is kept alongside to make getCanonicalForm O(1)
+    too.
+    """
+
+    def __init__(self, shape, seed=0):
+        """
+        Input:
+            shape: shape of the boards
+            seed: seed of the random numbers, so keys are the same in every
+                  process
+        """
+        size = int(np.prod(shape))
+        rng = np.random.RandomState(seed)
+        # numbers for pieces -1, 0 (always 0, empty cells don't change the key) and 1 on every cell
+        self.table = rng.randint(0, 2**64, size=(size, 3), dtype=np.uint64)
+        self.table[:, 1] = 0
+        self.cells = np.arange(size)
+
+    def attach(self, board):
+        """
+        Returns:
+            board: board as a ZobristBoard, with its keys computed
+        """
+        board = np.asarray(board).view(ZobristBoard)
+        board.key, board.negKey = self.compute(board)
+        return board
+
+    def compute(self, board):
+        """
+        Returns:
+            (key, negKey): the keys of board and -board, computed from scratch
+        """
+        pieces = np.sign(np.asarray(board).ravel()).astype(np.intp) + 1
+        key = np.bitwise_xor.reduce(self.table[self.cells, pieces])
+        negKey = np.bitwise_xor.reduce(self.table[self.cells, 2 - pieces])
+        return int(key), int(negKey)
+
+    def keys(self, board):
+        """
+        Returns:
+            (key, negKey): the keys of board and -board, cached on board if it
+                           is a ZobristBoard
+        """
+        if isinstance(board, ZobristBoard):
+            if board.key is None:
+                board.key, board.negKey = self.compute(board)
+            return board.key, board.negKey
+        return self.compute(board)
+
+    def key(self, board):
+        return self.keys(board)[0]
+
+    def update(self, board, nextBoard, cells):
+        """
+        Input:
+            board: a board
+            nextBoard: board with only the flat indices cells changed
+            cells: flat indices of the changed cells
+
+        Returns:
+            nextBoard: nextBoard as a ZobristBoard, with its keys updated from
+                       the keys of board
+        """
+        key, negKey = self.keys(board)
+        cells = np.asarray(cells, dtype=np.intp)
+        old = np.sign(np.asarray(board).ravel()[cells]).astype(np.intp) + 1
+        new = np.sign(np.asarray(nextBoard).ravel()[cells]).astype(np.intp) + 1
+        key ^= int(np.bitwise_xor.reduce(self.table[cells, old] ^ self.table[cells, new]))
+        negKey ^= int(np.bitwise_xor.reduce(self.table[cells, 2 - old] ^ self.table[cells, 2 - new]))
+        nextBoard = np.asarray(nextBoard).view(ZobristBoard)
+        nextBoard.key, nextBoard.negKey = key, negKey
+        return nextBoard
+
+    def place(self, board, cell, piece):
+        """
+        Input:
+            board: a board
+            cell: flat index of the cell to set
+            piece: 1, -1 or 0 (empty)
+
+        Returns:
+            nextBoard: a copy of board with piece on cell, as a ZobristBoard
+                       with its keys updated from the keys of board. Apart
+                       from copying the array, this is O(1), without the numpy
+                       calls of update.
+        """
+        key, negKey = self.keys(board)
+        nextBoard = np.array(board).view(ZobristBoard)
+        flat = nextBoard.reshape(-1)
+        old = int(np.sign(flat[cell])) + 1
+        new = int(np.sign(piece)) + 1
+        flat[cell] = piece
+        table = self.table
+        nextBoard.key = key ^ int(table[cell, old]) ^ int(table[cell, new])
+        nextBoard.negKey = negKey ^ int(table[cell, 2 - old]) ^ int(table[cell, 2 - new])
+        return nextBoard
+
+    def canonicalForm(self, board, player):
+        """
+        Returns:
+            canonicalBoard: player*board, as a ZobristBoard with its keys
+                            swapped from the keys of board when player is -1,
+                            and the last move of board
+        """
+        key, negKey = self.keys(board)
+        canonicalBoard = (player*np.asarray(board)).view(ZobristBoard)
+        canonicalBoard.lastMove = getattr(board, 'lastMove', None)
+        if player == 1:
+            canonicalBoard.key, canonicalBoard.negKey = key, negKey
+        else:
+            canonicalBoard.key, canonicalBoard.negKey = negKey, key
+        return canonicalBoard
@@ -0,0 +1,174 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+from MCTS import MCTS
+from NeuralNet import NeuralNet
+from SelfPlay import executeEpisode, executeEpisodes
+from utils import *
+
+"""
+use this script to measure the speed of the games, the search and self-play,
+with a network that returns uniform policies so only our own code is timed.
+The results are printed as JSON, or written to --output, to track regressions:
+
+python bench.py --games othello connect4 --output bench.json
+"""
+
+
+def makeGame(name):
+    if name == 'othello':
+        from othello.OthelloGame import OthelloGame
+        return OthelloGame(8)
+    if name == 'gobang':
+        from gobang.GobangGame import GobangGame
+        return GobangGame(15, 5)
+    if name == 'connect4':
+        from connect4.Connect4Game import Connect4Game
+        return Connect4Game()
+    if name == 'tictactoe':
+        from tictactoe.TicTacToeGame import TicTacToeGame
+        return TicTacToeGame(3)
+    if name == 'cambia':
+        from CambiaGame import CambiaGame
+        return CambiaGame()
+    raise ValueError('unknown game ' + name)
+
+GAMES = ['othello', 'gobang', 'connect4', 'tictactoe', 'cambia']
+
+
+class UniformNet(NeuralNet):
+    """
+    Stub network: a uniform policy over all actions and a value of 0.
+    """
+    def __init__(self, game):
+        self.actionSize = game.getActionSize()
+
+    def predict(self, board):
+        return np.full(self.actionSize, 1./self.actionSize, dtype=np.float32), 0.
+
+    def predict_batch(self, boards):
+        return np.full((len(boards), self.actionSize), 1./self.actionSize, dtype=np.float32), np.zeros(len(boards))
+
+
+def randomPositions(game, numPositions, seed=0):
+    """
+    Returns:
+        positions: numPositions (board, player, action) tuples from random
+                   games, action being a valid move of player on board
+    """
+    rng = np.random.RandomState(seed)
+    positions = []
+    while len(positions) < numPositions:
+        board = game.getInitBoard()
+        player = 1
+        while game.getGameEnded(board, player) == 0 and len(positions) < numPositions:
+            action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)))
+            positions.append((board, player, action))
+            board, player = game.getNextState(board, player, action)
+    return positions
+
+
+def rate(fn, items, minTime):
+    """
+    Calls fn on the items, over and over, for at least minTime seconds.
+
+    Returns:
+        rate: calls per second
+    """
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            fn(*item)
+        calls += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= minTime:
+            return calls/elapsed
+
+
+def benchGame(game, args):
+    """
+    Returns:
+        results: a dict with the calls per second of the game functions, the
+                 MCTS simulations per second and the self-play examples per
+                 second
+    """
+    results = {}
+    positions = randomPositions(game, args.positions)
+    results['getValidMoves'] = rate(game.getValidMoves, [(b, p) for b, p, _ in positions], args.minTime)
+    results['getNextState'] = rate(game.getNextState, positions, args.minTime)
+    results['getGameEnded'] = rate(game.getGameEnded, [(b, p) for b, p, _ in positions], args.minTime)
+    canonicalBoards = [(game.getCanonicalForm(b, p),) for b, p, _ in positions]
+    results['stringRepresentation'] = rate(game.stringRepresentation, canonicalBoards, args.minTime)
+
+    nnet = UniformNet(game)
+    searches = 0
+    start = time.perf_counter()
+    while searches == 0 or time.perf_counter() - start < args.minTime:
+        mcts = MCTS(game, nnet, args)
+        mcts.getActionProb(game.getCanonicalForm(game.getInitBoard(), 1), temp=1)
+        searches += 1
+    results['mctsSimsPerSec'] = searches*args.numMCTSSims/(time.perf_counter() - start)
+
+    examples = 0
+    start = time.perf_counter()
+    if args.numParallelGames > 1:
+        for episodeExamples in executeEpisodes(game, nnet, args, args.episodes):
+            examples += len(episodeExamples)
+    else:
+        for _ in range(args.episodes):
+            mcts = MCTS(game, nnet, args)
+            examples += len(executeEpisode(game, mcts, args))
+    results['selfPlayExamplesPerSec'] = examples/(time.perf_counter() - start)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the games, MCTS and self-play.')
+    parser.add_argument('--games', nargs='+', choices=GAMES, default=GAMES)
+    parser.add_argument('--positions', type=int, default=500, help='random positions the game functions are timed on')
+    parser.add_argument('--minTime', type=float, default=0.5, help='seconds each measurement runs for at least')
+    parser.add_argument('--numMCTSSims', type=int, default=50)
+    parser.add_argument('--episodes', type=int, default=2, help='self-play episodes')
+    parser.add_argument('--searchBatchSize', type=int, default=1)
+    parser.add_argument('--numParallelGames', type=int, default=1, help='self-play episodes played in lockstep')
+    parser.add_argument('--nodeStore', default='dict', choices=['dict', 'array'])
+    parser.add_argument('--output', help='file the JSON results are written to, instead of stdout')
+    parsed = parser.parse_args(argv)
+
+    args = dotdict({
+        'numMCTSSims': parsed.numMCTSSims,
+        'cpuct': 1,
+        'tempThreshold': 15,
+        'searchBatchSize': parsed.searchBatchSize,
+        'numParallelGames': parsed.numParallelGames,
+        'nodeStore': parsed.nodeStore,
+        'positions': parsed.positions,
+        'minTime': parsed.minTime,
+        'episodes': parsed.episodes,
+    })
+    report = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'args': dict(args),
+        'results': {},
+    }
+    for name in parsed.games:
+        print('benchmarking ' + name, file=sys.stderr)
+        np.random.seed(0)
+        report['results'][name] = benchGame(makeGame(name), args)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if parsed.output:
+        with open(parsed.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
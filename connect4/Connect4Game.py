@@ -3,6 +3,7 @@ import numpy as np
 
 sys.path.append('..')
 from Game import Game
+from Zobrist import Zobrist
 from .Connect4Logic import Board
 
 
@@ -14,9 +15,10 @@ class Connect4Game(Game):
     def __init__(self, height=None, width=None, win_length=None, np_pieces=None):
         Game.__init__(self)
         self._base_board = Board(height, width, win_length, np_pieces)
+        self._zobrist = Zobrist((self._base_board.height, self._base_board.width))
 
     def getInitBoard(self):
-        return self._base_board.np_pieces
+        return self._zobrist.attach(self._base_board.np_pieces)
 
     def getBoardSize(self):
         return (self._base_board.height, self._base_board.width)
@@ -28,7 +30,11 @@ class Connect4Game(Game):
         """Returns a copy of the board with updated move, original board is unmodified."""
         b = self._base_board.with_np_pieces(np_pieces=np.copy(board))
         b.add_stone(action, player)
-        return b.np_pieces, -player
+        # the stone lands on the lowest empty cell of the column
+        row = np.count_nonzero(board[:, action] == 0) - 1
+        nextBoard = self._zobrist.update(board, b.np_pieces, [row*b.width + action % b.width])
+        nextBoard.lastMove = row*b.width + action % b.width
+        return nextBoard, -player
 
     def getValidMoves(self, board, player):
         "Any zero value in top row in a valid move"
@@ -36,7 +42,12 @@ class Connect4Game(Game):
 
     def getGameEnded(self, board, player):
         b = self._base_board.with_np_pieces(np_pieces=board)
-        winstate = b.get_win_state()
+        lastMove = getattr(board, 'lastMove', None)
+        if lastMove is not None:
+            # a new win can only be on a line through the dropped stone
+            winstate = b.get_win_state_at(*divmod(lastMove, b.width))
+        else:
+            winstate = b.get_win_state()
         if winstate.is_ended:
             if winstate.winner is None:
                 # draw has very little value.
@@ -53,14 +64,27 @@ class Connect4Game(Game):
 
     def getCanonicalForm(self, board, player):
         # Flip player from 1 to -1
-        return board * player
+        return self._zobrist.canonicalForm(board, player)
 
     def getSymmetries(self, board, pi):
         """Board is left/right board symmetric"""
         return [(board, pi), (board[:, ::-1], pi)]
 
+    def getNumSymmetries(self):
+        return 2
+
+    def applySymmetries(self, boards, pis, symmetries):
+        """Mirrors the examples with symmetry 1, vectorized over the batch."""
+        boards = np.array(boards)
+        pis = np.array(pis)
+        rows = np.asarray(symmetries) == 1
+        boards[rows] = boards[rows, :, ::-1]
+        pis[rows] = pis[rows, ::-1]
+        return boards, pis
+
     def stringRepresentation(self, board):
-        return str(self._base_board.with_np_pieces(np_pieces=board))
+        """64-bit Zobrist key of the board."""
+        return self._zobrist.key(board)
 
 
 def display(board):
@@ -38,14 +38,29 @@ class Board():
         return self.np_pieces[0] == 0
 
     def get_win_state(self):
-        for player in [-1, 1]:
-            player_pieces = self.np_pieces == -player
-            # Check rows & columns for win
-            if (self._is_straight_winner(player_pieces) or
-                self._is_straight_winner(player_pieces.transpose()) or
-                self._is_diagonal_winner(player_pieces)):
-                return WinState(True, -player)
-
+        for player in [1, -1]:
+            # Check columns, rows & diagonals for win, all at once
+            if self._is_bitboard_winner(self._bitboard(self.np_pieces == player)):
+                return WinState(True, player)
+        return self._no_win_state()
+
+    def get_win_state_at(self, row, column):
+        """Win state when only the lines through the stone at (row, column), the
+        last one dropped, can be new wins."""
+        player = self.np_pieces[row][column]
+        if player != 0:
+            for dr, dc in [(1, 0), (0, 1), (1, 1), (1, -1)]:
+                count = 1
+                for sign in (1, -1):
+                    r, c = row + sign * dr, column + sign * dc
+                    while 0 <= r < self.height and 0 <= c < self.width and self.np_pieces[r][c] == player:
+                        count += 1
+                        r, c = r + sign * dr, c + sign * dc
+                if count >= self.win_length:
+                    return WinState(True, player)
+        return self._no_win_state()
+
+    def _no_win_state(self):
         # draw has very little value.
         if not self.get_valid_moves().any():
             return WinState(True, None)
@@ -59,23 +74,26 @@ class Board():
             np_pieces = self.np_pieces
         return Board(self.height, self.width, self.win_length, np_pieces)
 
-    def _is_diagonal_winner(self, player_pieces):
-        """Checks if player_pieces contains a diagonal win."""
-        win_length = self.win_length
-        for i in range(len(player_pieces) - win_length + 1):
-            for j in range(len(player_pieces[0]) - win_length + 1):
-                if all(player_pieces[i + x][j + x] for x in range(win_length)):
-                    return True
-            for j in range(win_length - 1, len(player_pieces[0])):
-                if all(player_pieces[i + x][j - x] for x in range(win_length)):
-                    return True
+    def _bitboard(self, player_pieces):
+        """Packs player_pieces into an int, bit column * (height + 1) + row for
+        the row counted from the bottom. The extra, always empty, bit on top of
+        every column keeps lines from wrapping from one column to the next."""
+        padded = np.zeros((self.width, self.height + 1), dtype=bool)
+        padded[:, :self.height] = player_pieces[::-1].T
+        return int.from_bytes(np.packbits(padded.ravel(), bitorder='little').tobytes(), 'little')
+
+    def _is_bitboard_winner(self, bitboard):
+        """Checks if bitboard contains win_length stones in a line: a bit stays set
+        after and-ing the shifts by 1 .. win_length - 1 steps in a direction only
+        if it starts such a line."""
+        # vertical, diagonal down, horizontal and diagonal up steps
+        for step in [1, self.height, self.height + 1, self.height + 2]:
+            line = bitboard
+            for i in range(1, self.win_length):
+                line &= bitboard >> (i * step)
+            if line:
+                return True
         return False
 
-    def _is_straight_winner(self, player_pieces):
-        """Checks if player_pieces contains a vertical or horizontal win."""
-        run_lengths = [player_pieces[:, i:i + self.win_length].sum(axis=1)
-                       for i in range(len(player_pieces) - self.win_length + 2)]
-        return max([x.max() for x in run_lengths]) >= self.win_length
-
     def __str__(self):
         return str(self.np_pieces)
@@ -9,6 +9,7 @@ sys.path.append('../../')
 from utils import *
 from pytorch_classification.utils import Bar, AverageMeter
 from NeuralNet import NeuralNet
+from BatchLoader import BatchLoader, exampleColumns, randomBatches, randomSymmetries
 
 import tensorflow as tf
 from .Connect4NNet import Connect4NNet as onnet
@@ -19,6 +20,8 @@ args = dotdict({
     'epochs': 10,
     'batch_size': 64,
     'num_channels': 512,
+    'loader_workers': 2,        # threads preparing training batches
+    'prefetch': 4,              # training batches prepared ahead
 })
 
 
@@ -26,6 +29,7 @@ args = dotdict({
 
 class NNetWrapper(NeuralNet):
     def __init__(self, game):
+        self.game = game
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
@@ -36,10 +40,12 @@ class NNetWrapper(NeuralNet):
             temp_sess.run(tf.global_variables_initializer())
         self.sess.run(tf.variables_initializer(self.nnet.graph.get_collection('variables')))
 
-    def train(self, examples):
+    def train(self, examples, augment=False):
         """
         examples: list of examples, each example is of form (board, pi, v)
+        augment: apply a random board symmetry to every example of a batch
         """
+        columns = exampleColumns(examples)
 
         for epoch in range(args.epochs):
             print('EPOCH ::: ' + str(epoch + 1))
@@ -53,10 +59,11 @@ class NNetWrapper(NeuralNet):
             batch_idx = 0
 
             # self.sess.run(tf.local_variables_initializer())
-            while batch_idx < int(len(examples) / args.batch_size):
-                sample_ids = np.random.randint(len(examples), size=args.batch_size)
-                boards, pis, vs = list(zip(*[examples[i] for i in sample_ids]))
-
+            # batches are prepared by worker threads while the previous one is trained on
+            loader = BatchLoader(columns, randomBatches(len(examples), args.batch_size),
+                                 transform=randomSymmetries(self.game) if augment else None,
+                                 numWorkers=args.loader_workers, prefetch=args.prefetch)
+            for boards, pis, vs in loader:
                 # predict and compute gradient and do SGD step
                 input_dict = {self.nnet.input_boards: boards, self.nnet.target_pis: pis, self.nnet.target_vs: vs, self.nnet.dropout: args.dropout, self.nnet.isTraining: True}
 
@@ -105,6 +112,13 @@ class NNetWrapper(NeuralNet):
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
         return prob[0], v[0]
 
+    def predict_batch(self, boards):
+        """
+        boards: np array with a batch of boards
+        """
+        prob, v = self.sess.run([self.nnet.prob, self.nnet.v], feed_dict={self.nnet.input_boards: boards, self.nnet.dropout: 0, self.nnet.isTraining: False})
+        return prob, v.reshape(-1)
+
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         filepath = os.path.join(folder, filename)
         if not os.path.exists(folder):
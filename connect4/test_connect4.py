@@ -37,7 +37,7 @@ def test_simple_moves():
          [ 0.  0.  0.  0.  0.  0.  0.]
          [ 0.  0.  0.  0.  1.  0.  0.]
          [ 1.  0.  0. -1.  1. -1. -1.]]""")
-    assert expected == game.stringRepresentation(board)
+    assert expected == str(board)
 
 
 def test_overfull_column():
@@ -82,7 +82,7 @@ def test_symmetries():
          [-1.  0.  0.  0.  0.  0.  0.]
          [-1.  0.  0.  0.  0.  0.  0.]
          [ 1.  1.  0.  0.  0.  0.  1.]]""")
-    assert expected_board1 == game.stringRepresentation(board1)
+    assert expected_board1 == str(board1)
 
     expected_board2 = textwrap.dedent("""\
         [[ 0.  0.  0.  0.  0.  0.  0.]
@@ -91,7 +91,7 @@ def test_symmetries():
          [ 0.  0.  0.  0.  0.  0. -1.]
          [ 0.  0.  0.  0.  0.  0. -1.]
          [ 1.  0.  0.  0.  0.  1.  1.]]""")
-    assert expected_board2 == game.stringRepresentation(board2)
+    assert expected_board2 == str(board2)
 
 
 def test_game_ended():
@@ -165,3 +165,58 @@ def test_immutable_move():
 
     assert original_board_string == game.stringRepresentation(board)
     assert original_board_string != game.stringRepresentation(new_np_pieces)
+
+
+def test_incremental_key():
+    """Tests the Zobrist key kept by getNextState and getCanonicalForm matches a fresh one."""
+    board, player, game = init_board_from_moves([])
+    for move in [3, 3, 4, 2, 2, 0, 6, 5, 5, 5]:
+        board, player = game.getNextState(board, player, move)
+        canonical = game.getCanonicalForm(board, player)
+        assert game.stringRepresentation(board) == game.stringRepresentation(np.array(board))
+        assert game.stringRepresentation(canonical) == game.stringRepresentation(np.array(canonical))
+        assert game.stringRepresentation(canonical) != game.stringRepresentation(-canonical)
+
+
+def test_apply_symmetries():
+    board, player, game = init_board_from_moves([0, 0, 1, 0, 6])
+    pi = np.arange(game.getActionSize(), dtype=np.float32)
+    boards, pis = game.applySymmetries(np.array([board, board]), np.array([pi, pi]), np.array([0, 1]))
+    assert (boards[0] == board).all() and (pis[0] == pi).all()
+    assert (boards[1] == board[:, ::-1]).all() and (pis[1] == pi[::-1]).all()
+
+
+def reference_winner(np_pieces, win_length=4):
+    """Winner found by checking every line of win_length cells, player 1 first, or 0."""
+    height, width = np_pieces.shape
+    for player in [1, -1]:
+        for r in range(height):
+            for c in range(width):
+                for dr, dc in [(1, 0), (0, 1), (1, 1), (1, -1)]:
+                    cells = [(r + i * dr, c + i * dc) for i in range(win_length)]
+                    if all(0 <= y < height and 0 <= x < width and np_pieces[y][x] == player for y, x in cells):
+                        return player
+    return 0
+
+
+def test_win_checks_match_reference():
+    """Tests the bitboard and the last stone win checks against a check of every line."""
+    rng = np.random.RandomState(0)
+    for height, width in [(6, 7), (4, 5), (5, 7), (7, 6)]:
+        game = Connect4Game(height=height, width=width)
+        for _ in range(20):
+            board, player = game.getInitBoard(), 1
+            while True:
+                winner = reference_winner(board)
+                full = game.getGameEnded(np.array(board), player)
+                incremental = game.getGameEnded(board, player)
+                assert full == incremental
+                if winner:
+                    assert full == winner * player
+                    break
+                if full:
+                    assert full == 1e-4 and not game.getValidMoves(board, player).any()
+                    break
+                assert full == 0
+                action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)))
+                board, player = game.getNextState(board, player, action)
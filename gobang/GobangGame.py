@@ -2,19 +2,25 @@ from __future__ import print_function
 import sys
 sys.path.append('..')
 from Game import Game
+from Zobrist import Zobrist
+from utils import dihedralSymmetries
 from .GobangLogic import Board
 import numpy as np
 
+# down, right and the two diagonals
+DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1)]
+
 
 class GobangGame(Game):
     def __init__(self, n=15, nir=5):
         self.n = n
         self.n_in_row = nir
+        self.zobrist = Zobrist((n, n))
 
     def getInitBoard(self):
         # return initial board (numpy board)
         b = Board(self.n)
-        return np.array(b.pieces)
+        return self.zobrist.attach(np.array(b.pieces))
 
     def getBoardSize(self):
         # (a,b) tuple
@@ -29,11 +35,10 @@ class GobangGame(Game):
         # action must be a valid move
         if action == self.n * self.n:
             return (board, -player)
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        move = (int(action / self.n), action % self.n)
-        b.execute_move(move, player)
-        return (b.pieces, -player)
+        assert board[action // self.n][action % self.n] == 0
+        nextBoard = self.zobrist.place(board, action, player)
+        nextBoard.lastMove = action
+        return (nextBoard, -player)
 
     # modified
     def getValidMoves(self, board, player):
@@ -51,33 +56,68 @@ class GobangGame(Game):
 
     # modified
     def getGameEnded(self, board, player):
-        # return 0 if not ended, 1 if player 1 won, -1 if player 1 lost
-        # player = 1
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        n = self.n_in_row
-
-        for w in range(self.n):
-            for h in range(self.n):
-                if (w in range(self.n - n + 1) and board[w][h] != 0 and
-                        len(set(board[i][h] for i in range(w, w + n))) == 1):
-                    return board[w][h]
-                if (h in range(self.n - n + 1) and board[w][h] != 0 and
-                        len(set(board[w][j] for j in range(h, h + n))) == 1):
-                    return board[w][h]
-                if (w in range(self.n - n + 1) and h in range(self.n - n + 1) and board[w][h] != 0 and
-                        len(set(board[w + k][h + k] for k in range(n))) == 1):
-                    return board[w][h]
-                if (w in range(self.n - n + 1) and h in range(n - 1, self.n) and board[w][h] != 0 and
-                        len(set(board[w + l][h - l] for l in range(n))) == 1):
-                    return board[w][h]
-        if b.has_legal_moves():
+        # return 0 if not ended, the color of the winner (1 or -1) if there is
+        # n_in_row stones of one color in a line, 1e-4 for a draw
+        lastMove = getattr(board, 'lastMove', None)
+        if lastMove is not None:
+            # a win can only be on a line through the last stone, the game would have ended before
+            winner = self.winnerThrough(board, lastMove)
+        else:
+            winner = self.winner(board)
+        if winner != 0:
+            return winner
+        if (np.asarray(board) == 0).any():
             return 0
         return 1e-4
 
+    def winnerThrough(self, board, action):
+        """
+        Returns:
+            winner: the color of the stone at action if it is part of a line
+                    of n_in_row stones, else 0
+        """
+        x, y = divmod(int(action), self.n)
+        color = board[x][y]
+        if color == 0:
+            return 0
+        for dx, dy in DIRECTIONS:
+            count = 1
+            for sign in (1, -1):
+                i, j = x + sign*dx, y + sign*dy
+                while 0 <= i < self.n and 0 <= j < self.n and board[i][j] == color:
+                    count += 1
+                    i, j = i + sign*dx, j + sign*dy
+            if count >= self.n_in_row:
+                return color
+        return 0
+
+    def winner(self, board):
+        """
+        Returns:
+            winner: the color with a line of n_in_row stones, player 1
+                    checked first, or 0. Each line direction is checked for the
+                    whole board at once by and-ing n_in_row shifted slices.
+        """
+        board = np.asarray(board)
+        k = self.n_in_row
+        for color in (1, -1):
+            stones = board == color
+            for dx, dy in DIRECTIONS:
+                rows = self.n - (k - 1)*dx
+                cols = self.n - (k - 1)*abs(dy)
+                if rows <= 0 or cols <= 0:
+                    continue
+                start = (k - 1) if dy < 0 else 0
+                run = np.ones((rows, cols), dtype=bool)
+                for i in range(k):
+                    run &= stones[i*dx:i*dx + rows, start + i*dy:start + i*dy + cols]
+                if run.any():
+                    return color
+        return 0
+
     def getCanonicalForm(self, board, player):
         # return state if player==1, else return -state if player==-1
-        return player * board
+        return self.zobrist.canonicalForm(board, player)
 
     # modified
     def getSymmetries(self, board, pi):
@@ -96,9 +136,16 @@ class GobangGame(Game):
                 l += [(newB, list(newPi.ravel()) + [pi[-1]])]
         return l
 
+    def getNumSymmetries(self):
+        return 8
+
+    def applySymmetries(self, boards, pis, symmetries):
+        # rotations and mirrors, vectorized over the batch
+        return dihedralSymmetries(boards, pis, symmetries)
+
     def stringRepresentation(self, board):
-        # 8x8 numpy array (canonical board)
-        return board.tostring()
+        # 64-bit Zobrist key of the 8x8 numpy array (canonical board)
+        return self.zobrist.key(board)
 
 
 def display(board):
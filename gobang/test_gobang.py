@@ -0,0 +1,138 @@
+"""
+To run tests:
+pytest-3 gobang
+"""
+
+import numpy as np
+
+from .GobangGame import GobangGame
+
+
+def reference_winners(board, n_in_row):
+    """The colors with a line of n_in_row stones, found cell by cell."""
+    n = len(board)
+    winners = set()
+    for x in range(n):
+        for y in range(n):
+            color = board[x][y]
+            if color == 0:
+                continue
+            for dx, dy in [(1, 0), (0, 1), (1, 1), (1, -1)]:
+                cells = [(x + k*dx, y + k*dy) for k in range(n_in_row)]
+                if all(0 <= i < n and 0 <= j < n and board[i][j] == color for i, j in cells):
+                    winners.add(int(color))
+    return winners
+
+
+def reference_game_ended(board, n_in_row):
+    winners = reference_winners(board, n_in_row)
+    assert len(winners) <= 1
+    if winners:
+        return winners.pop()
+    if (np.asarray(board) == 0).any():
+        return 0
+    return 1e-4
+
+
+def play(game, moves):
+    """Returns the board after the (action, player) moves, with the last one as lastMove."""
+    board = game.getInitBoard()
+    for action, player in moves:
+        board, _ = game.getNextState(board, player, action)
+    return board
+
+
+def check_board(game, board):
+    """Checks every way of asking board for its result against the reference."""
+    expected = reference_game_ended(np.array(board), game.n_in_row)
+    # the key kept by getNextState is the one of the pieces on the board
+    assert game.stringRepresentation(board) == game.stringRepresentation(np.array(board))
+    assert game.getGameEnded(board, 1) == expected
+    # a plain array, the whole board is scanned
+    assert game.getGameEnded(np.array(board), 1) == expected
+    # the canonical form of the other player has the colors negated
+    canonical = game.getCanonicalForm(board, -1)
+    assert canonical.lastMove == board.lastMove
+    assert game.getGameEnded(canonical, 1) == (-expected if expected in (1, -1) else expected)
+    assert game.getGameEnded(np.array(canonical), 1) == game.getGameEnded(canonical, 1)
+
+
+def test_random_games():
+    """Tests both win checks against the reference on every position of random games."""
+    rng = np.random.RandomState(0)
+    for n, nir in [(5, 4), (7, 5), (9, 6), (6, 3)]:
+        game = GobangGame(n, nir)
+        ends = set()
+        for _ in range(30):
+            board, player = game.getInitBoard(), 1
+            while True:
+                action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)[:-1]))
+                board, player = game.getNextState(board, player, action)
+                check_board(game, board)
+                r = game.getGameEnded(board, player)
+                if r != 0:
+                    ends.add(r)
+                    break
+        assert {1, -1} <= ends
+
+
+def test_lines():
+    """Tests wins in every direction, along the edges, in the corners, completed at either end or in the middle."""
+    for n, nir in [(9, 5), (11, 6)]:
+        game = GobangGame(n, nir)
+        lines = []
+        for x0, y0, dx, dy in [(0, 0, 0, 1), (n - 1, n - nir, 0, 1), (0, n - 1, 1, 0), (n - nir, 0, 1, 0),
+                               (0, 0, 1, 1), (n - nir, n - nir, 1, 1), (0, n - 1, 1, -1), (n - nir, nir - 1, 1, -1),
+                               (2, 1, 1, 1), (1, n - 3, 1, -1), (3, 2, 0, 1), (1, 4, 1, 0)]:
+            lines.append([(x0 + k*dx)*n + y0 + k*dy for k in range(nir)])
+        for line in lines:
+            for color in [1, -1]:
+                for last in [0, nir//2, nir - 1]:
+                    order = line[:last] + line[last + 1:] + [line[last]]
+                    moves = [(a, color) for a in order]
+                    board = play(game, moves[:-1])
+                    assert game.getGameEnded(board, 1) == 0
+                    board = play(game, moves)
+                    assert game.getGameEnded(board, 1) == color
+                    assert game.getGameEnded(board, -1) == color
+                    check_board(game, board)
+
+                # one stone short, or broken by the other color
+                assert game.getGameEnded(play(game, [(a, color) for a in line[1:]]), 1) == 0
+                broken = [(a, color) for a in line]
+                broken[nir//2] = (line[nir//2], -color)
+                board = play(game, broken)
+                assert game.getGameEnded(board, 1) == 0
+                check_board(game, board)
+
+
+def test_longer_line_and_draw():
+    """Tests a line longer than n_in_row wins, and a full board without a line is a draw."""
+    game = GobangGame(9, 6)
+    row = [4*9 + y for y in range(7)]
+    board = play(game, [(a, 1) for a in row[:3] + row[4:] + [row[3]]])
+    assert game.getGameEnded(board, 1) == 1
+    check_board(game, board)
+
+    game = GobangGame(4, 3)
+    # columns of two stones of each color in turn, no three in a row in any direction
+    colors = [[1, 1, -1, -1], [-1, -1, 1, 1], [1, 1, -1, -1], [-1, -1, 1, 1]]
+    colors = np.array(colors).T
+    board = play(game, [(x*4 + y, colors[x][y]) for x in range(4) for y in range(4)])
+    assert game.getGameEnded(board, 1) == 1e-4
+    check_board(game, board)
+
+
+def test_random_boards():
+    """Tests the whole board scan on dense random boards, where both colors may have lines."""
+    rng = np.random.RandomState(1)
+    for n, nir in [(5, 3), (8, 4), (9, 6)]:
+        game = GobangGame(n, nir)
+        for _ in range(200):
+            board = rng.choice([-1, 0, 1], size=(n, n), p=[0.4, 0.2, 0.4])
+            winners = reference_winners(board, nir)
+            winner = game.winner(board)
+            if winners:
+                assert winner in winners and (winner == 1 or 1 not in winners)
+            else:
+                assert winner == 0
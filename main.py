@@ -6,12 +6,24 @@ from utils import *
 args = dotdict({
     'numIters': 1000,
     'numEps': 100,
+    'numSelfPlayWorkers': 1,    # >1 plays the episodes in that many processes
+    'numParallelGames': 1,      # >1 plays that many episodes in lockstep, with batched leaf evaluations
+    'inferenceServer': False,   # share one network process between the self-play workers
+    'inferenceMaxBatchSize': 64,
+    'inferenceMaxWait': 0.005,  # seconds
     'tempThreshold': 15,
     'updateThreshold': 0.55,
     'maxlenOfQueue': 10000,
+    'storeSymmetries': True,    # False stores canonical examples only and augments per training batch
     'numMCTSSims': 25,
     'arenaCompare': 40,
+    'numArenaWorkers': 1,       # >1 plays the arena games in that many processes
     'cpuct': 1,
+    'nodeStore': 'dict',        # 'dict' or 'array', see NodeStore.py
+    'searchBatchSize': 1,       # leaves evaluated per network call, >1 uses virtual loss
+    'maxNodes': None,           # bound on the nodes of a search tree, None for no bound
+    'evictionPolicy': 'lru',    # 'lru' or 'leastVisited', used when the tree is full
+    'nnetCacheSize': 0,         # predictions cached across episodes and arena games, 0 disables
 
     'checkpoint': './temp/',
     'load_model': True,
@@ -0,0 +1,92 @@
+'''
+Bitboard move generation for Othello.
+
+A position is stored as two integers, one for the pieces of the player to
+move and one for the pieces of the opponent. Square (x,y) of the numpy board,
+i.e. board[x][y], is bit x*n+y, so the bit index of a square is also its
+action number. For boards up to 8x8 both integers fit in 64 bits.
+
+Moves and flips are generated with shifts and masks over all squares at
+once instead of walking the board square by square.
+'''
+import numpy as np
+
+
+class Bitboard():
+
+    # list of all 8 directions on the board, as (x,y) offsets
+    __directions = [(1,1),(1,0),(1,-1),(0,-1),(-1,-1),(-1,0),(-1,1),(0,1)]
+
+    def __init__(self, n):
+        self.n = n
+        self.nbytes = (n*n + 7)//8
+        self.full = (1 << (n*n)) - 1
+
+        # squares of the first and last column
+        firstColumn = sum(1 << (x*n) for x in range(n))
+        lastColumn = firstColumn << (n-1)
+
+        # (shift, mask) for every direction: a positive shift moves the bits
+        # up, a negative one down, and the mask drops the bits that moved off
+        # the board or wrapped around to the other side of it
+        self.shifts = []
+        for dx, dy in self.__directions:
+            mask = self.full
+            if dy == 1:
+                mask &= ~firstColumn
+            elif dy == -1:
+                mask &= ~lastColumn
+            self.shifts.append((dx*n + dy, mask))
+
+    def fromArray(self, board, color):
+        """Converts a numpy board to (own, opponent) bitboards for color."""
+        return self._pack(board == color), self._pack(board == -color)
+
+    def toArray(self, own, opponent, color, dtype):
+        """Converts (own, opponent) bitboards for color to a numpy board."""
+        board = self.toMask(own).astype(dtype) - self.toMask(opponent).astype(dtype)
+        return (board*color).reshape(self.n, self.n)
+
+    def toMask(self, bits):
+        """Returns a binary vector of length n*n with the bits of bits."""
+        return np.unpackbits(np.frombuffer(bits.to_bytes(self.nbytes, 'little'), dtype=np.uint8),
+                             bitorder='little')[:self.n*self.n]
+
+    def _pack(self, squares):
+        return int.from_bytes(np.packbits(squares.ravel(), bitorder='little').tobytes(), 'little')
+
+    def legalMoves(self, own, opponent):
+        """Returns the bitboard of the legal moves of the player with pieces own."""
+        empty = ~(own | opponent) & self.full
+        moves = 0
+        for shift, mask in self.shifts:
+            # grow runs of opponent pieces next to own pieces, at most n-2 long
+            if shift > 0:
+                x = (own << shift) & mask & opponent
+                for _ in range(self.n - 3):
+                    x |= (x << shift) & mask & opponent
+                moves |= (x << shift) & mask & empty
+            else:
+                x = (own >> -shift) & mask & opponent
+                for _ in range(self.n - 3):
+                    x |= (x >> -shift) & mask & opponent
+                moves |= (x >> -shift) & mask & empty
+        return moves
+
+    def flips(self, own, opponent, move):
+        """Returns the bitboard of the opponent pieces flipped by playing the bit move."""
+        flips = 0
+        for shift, mask in self.shifts:
+            f = 0
+            x = ((move << shift) if shift > 0 else (move >> -shift)) & mask
+            while x & opponent:
+                f |= x
+                x = ((x << shift) if shift > 0 else (x >> -shift)) & mask
+            if x & own:
+                flips |= f
+        return flips
+
+    @staticmethod
+    def count(bits):
+        """Returns the number of pieces in bits."""
+        return bin(bits).count('1')
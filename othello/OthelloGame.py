@@ -2,18 +2,24 @@ from __future__ import print_function
 import sys
 sys.path.append('..')
 from Game import Game
+from Zobrist import Zobrist
+from utils import dihedralSymmetries
 from .OthelloLogic import Board
+from .OthelloBitboard import Bitboard
 import numpy as np
 
 
 class OthelloGame(Game):
     def __init__(self, n):
         self.n = n
+        # move generation runs on bitboards, boards are numpy arrays outside of it
+        self.bitboard = Bitboard(n)
+        self.zobrist = Zobrist((n, n))
 
     def getInitBoard(self):
         # return initial board (numpy board)
         b = Board(self.n)
-        return np.array(b.pieces)
+        return self.zobrist.attach(np.array(b.pieces))
 
     def getBoardSize(self):
         # (a,b) tuple
@@ -28,41 +34,42 @@ class OthelloGame(Game):
         # action must be a valid move
         if action == self.n*self.n:
             return (board, -player)
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        move = (int(action/self.n), action%self.n)
-        b.execute_move(move, player)
-        return (b.pieces, -player)
+        own, opponent = self.bitboard.fromArray(board, player)
+        move = 1 << int(action)
+        flips = self.bitboard.flips(own, opponent, move)
+        assert flips
+        own |= move | flips
+        opponent &= ~flips
+        nextBoard = self.bitboard.toArray(own, opponent, player, board.dtype)
+        nextBoard = self.zobrist.update(board, nextBoard, np.flatnonzero(self.bitboard.toMask(move | flips)))
+        return (nextBoard, -player)
 
     def getValidMoves(self, board, player):
         # return a fixed size binary vector
-        valids = [0]*self.getActionSize()
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        legalMoves =  b.get_legal_moves(player)
-        if len(legalMoves)==0:
+        valids = np.zeros(self.getActionSize(), dtype=int)
+        own, opponent = self.bitboard.fromArray(board, player)
+        legalMoves = self.bitboard.legalMoves(own, opponent)
+        if legalMoves==0:
             valids[-1]=1
-            return np.array(valids)
-        for x, y in legalMoves:
-            valids[self.n*x+y]=1
-        return np.array(valids)
+            return valids
+        valids[:-1] = self.bitboard.toMask(legalMoves)
+        return valids
 
     def getGameEnded(self, board, player):
         # return 0 if not ended, 1 if player 1 won, -1 if player 1 lost
         # player = 1
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        if b.has_legal_moves(player):
+        own, opponent = self.bitboard.fromArray(board, player)
+        if self.bitboard.legalMoves(own, opponent):
             return 0
-        if b.has_legal_moves(-player):
+        if self.bitboard.legalMoves(opponent, own):
             return 0
-        if b.countDiff(player) > 0:
+        if self.bitboard.count(own) - self.bitboard.count(opponent) > 0:
             return 1
         return -1
 
     def getCanonicalForm(self, board, player):
         # return state if player==1, else return -state if player==-1
-        return player*board
+        return self.zobrist.canonicalForm(board, player)
 
     def getSymmetries(self, board, pi):
         # mirror, rotational
@@ -80,14 +87,20 @@ class OthelloGame(Game):
                 l += [(newB, list(newPi.ravel()) + [pi[-1]])]
         return l
 
+    def getNumSymmetries(self):
+        return 8
+
+    def applySymmetries(self, boards, pis, symmetries):
+        # rotations and mirrors, vectorized over the batch
+        return dihedralSymmetries(boards, pis, symmetries)
+
     def stringRepresentation(self, board):
-        # 8x8 numpy array (canonical board)
-        return board.tostring()
+        # 64-bit Zobrist key of the 8x8 numpy array (canonical board)
+        return self.zobrist.key(board)
 
     def getScore(self, board, player):
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        return b.countDiff(player)
+        own, opponent = self.bitboard.fromArray(board, player)
+        return self.bitboard.count(own) - self.bitboard.count(opponent)
 
 def display(board):
     n = board.shape[0]
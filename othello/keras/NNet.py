@@ -9,6 +9,7 @@ import sys
 sys.path.append('..')
 from utils import *
 from NeuralNet import NeuralNet
+from BatchLoader import BatchLoader, exampleColumns, epochBatches, randomSymmetries
 
 import argparse
 from .OthelloNNet import OthelloNNet as onnet
@@ -20,23 +21,30 @@ args = dotdict({
     'batch_size': 64,
     'cuda': False,
     'num_channels': 512,
+    'loader_workers': 2,        # threads preparing training batches
+    'prefetch': 4,              # training batches prepared ahead
 })
 
 class NNetWrapper(NeuralNet):
     def __init__(self, game):
+        self.game = game
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
 
-    def train(self, examples):
+    def train(self, examples, augment=False):
         """
         examples: list of examples, each example is of form (board, pi, v)
+        augment: apply a random board symmetry to every example of a batch
         """
-        input_boards, target_pis, target_vs = list(zip(*examples))
-        input_boards = np.asarray(input_boards)
-        target_pis = np.asarray(target_pis)
-        target_vs = np.asarray(target_vs)
-        self.nnet.model.fit(x = input_boards, y = [target_pis, target_vs], batch_size = args.batch_size, epochs = args.epochs)
+        columns = exampleColumns(examples)
+        for epoch in range(args.epochs):
+            print('EPOCH ::: ' + str(epoch+1))
+            loader = BatchLoader(columns, epochBatches(len(examples), args.batch_size),
+                                 transform=randomSymmetries(self.game) if augment else None,
+                                 numWorkers=args.loader_workers, prefetch=args.prefetch)
+            for input_boards, target_pis, target_vs in loader:
+                self.nnet.model.train_on_batch(x = input_boards, y = [target_pis, target_vs])
 
     def predict(self, board):
         """
@@ -54,6 +62,13 @@ class NNetWrapper(NeuralNet):
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
         return pi[0], v[0]
 
+    def predict_batch(self, boards):
+        """
+        boards: np array with a batch of boards
+        """
+        pi, v = self.nnet.model.predict(np.asarray(boards))
+        return pi, v.reshape(-1)
+
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         filepath = os.path.join(folder, filename)
         if not os.path.exists(folder):
@@ -10,6 +10,7 @@ sys.path.append('../../')
 from utils import *
 from pytorch_classification.utils import Bar, AverageMeter
 from NeuralNet import NeuralNet
+from BatchLoader import BatchLoader, exampleColumns, randomBatches, randomSymmetries
 
 import argparse
 import torch
@@ -28,10 +29,13 @@ args = dotdict({
     'batch_size': 64,
     'cuda': torch.cuda.is_available(),
     'num_channels': 512,
+    'loader_workers': 2,        # threads preparing training batches
+    'prefetch': 4,              # training batches prepared ahead
 })
 
 class NNetWrapper(NeuralNet):
     def __init__(self, game):
+        self.game = game
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
         self.action_size = game.getActionSize()
@@ -39,11 +43,13 @@ class NNetWrapper(NeuralNet):
         if args.cuda:
             self.nnet.cuda()
 
-    def train(self, examples):
+    def train(self, examples, augment=False):
         """
         examples: list of examples, each example is of form (board, pi, v)
+        augment: apply a random board symmetry to every example of a batch
         """
         optimizer = optim.Adam(self.nnet.parameters())
+        columns = exampleColumns(examples)
 
         for epoch in range(args.epochs):
             print('EPOCH ::: ' + str(epoch+1))
@@ -57,12 +63,14 @@ class NNetWrapper(NeuralNet):
             bar = Bar('Training Net', max=int(len(examples)/args.batch_size))
             batch_idx = 0
 
-            while batch_idx < int(len(examples)/args.batch_size):
-                sample_ids = np.random.randint(len(examples), size=args.batch_size)
-                boards, pis, vs = list(zip(*[examples[i] for i in sample_ids]))
-                boards = torch.FloatTensor(np.array(boards).astype(np.float64))
-                target_pis = torch.FloatTensor(np.array(pis))
-                target_vs = torch.FloatTensor(np.array(vs).astype(np.float64))
+            # float32 batches gathered by index, prepared by worker threads while the previous one is trained on
+            loader = BatchLoader(columns, randomBatches(len(examples), args.batch_size),
+                                 transform=randomSymmetries(self.game) if augment else None,
+                                 numWorkers=args.loader_workers, prefetch=args.prefetch)
+            for boards, pis, vs in loader:
+                boards = torch.from_numpy(boards)
+                target_pis = torch.from_numpy(pis)
+                target_vs = torch.from_numpy(vs)
 
                 # predict
                 if args.cuda:
@@ -115,7 +123,7 @@ class NNetWrapper(NeuralNet):
         start = time.time()
 
         # preparing input
-        board = torch.FloatTensor(board.astype(np.float64))
+        board = torch.from_numpy(np.ascontiguousarray(board, dtype=dtypes.input))
         if args.cuda: board = board.contiguous().cuda()
         board = Variable(board, volatile=True)
         board = board.view(1, self.board_x, self.board_y)
@@ -126,6 +134,20 @@ class NNetWrapper(NeuralNet):
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
         return torch.exp(pi).data.cpu().numpy()[0], v.data.cpu().numpy()[0]
 
+    def predict_batch(self, boards):
+        """
+        boards: np array with a batch of boards
+        """
+        boards = torch.from_numpy(np.ascontiguousarray(boards, dtype=dtypes.input))
+        if args.cuda: boards = boards.contiguous().cuda()
+        boards = Variable(boards, volatile=True)
+        boards = boards.view(-1, self.board_x, self.board_y)
+
+        self.nnet.eval()
+        pi, v = self.nnet(boards)
+
+        return torch.exp(pi).data.cpu().numpy(), v.data.cpu().numpy().reshape(-1)
+
     def loss_pi(self, targets, outputs):
         return -torch.sum(targets*outputs)/targets.size()[0]
 
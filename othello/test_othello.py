@@ -0,0 +1,83 @@
+"""
+To run tests:
+pytest-3 othello
+"""
+
+import numpy as np
+
+from .OthelloGame import OthelloGame
+from .OthelloLogic import Board
+
+
+def reference_valid_moves(board, player):
+    """Valid moves computed with the square by square OthelloLogic.Board."""
+    n = len(board)
+    b = Board(n)
+    b.pieces = np.copy(board)
+    valids = np.zeros(n*n + 1, dtype=int)
+    legalMoves = b.get_legal_moves(player)
+    if len(legalMoves) == 0:
+        valids[-1] = 1
+    for x, y in legalMoves:
+        valids[n*x + y] = 1
+    return valids
+
+
+def reference_next_state(board, player, action):
+    n = len(board)
+    if action == n*n:
+        return board
+    b = Board(n)
+    b.pieces = np.copy(board)
+    b.execute_move((int(action/n), action % n), player)
+    return b.pieces
+
+
+def test_bitboard_matches_reference():
+    """Plays random games and compares every step with OthelloLogic.Board."""
+    rng = np.random.RandomState(0)
+    for n in [4, 6, 8]:
+        game = OthelloGame(n)
+        for _ in range(10):
+            board, player = game.getInitBoard(), 1
+            while game.getGameEnded(board, player) == 0:
+                valids = game.getValidMoves(board, player)
+                assert (valids == reference_valid_moves(board, player)).all()
+
+                action = rng.choice(np.flatnonzero(valids))
+                next_board, next_player = game.getNextState(board, player, action)
+                assert (next_board == reference_next_state(board, player, action)).all()
+                assert next_board.dtype == board.dtype
+                assert next_player == -player
+                assert game.stringRepresentation(next_board) == game.stringRepresentation(np.array(next_board))
+                canonical = game.getCanonicalForm(next_board, next_player)
+                assert game.stringRepresentation(canonical) == game.stringRepresentation(np.array(canonical))
+                board, player = next_board, next_player
+
+            b = Board(n)
+            b.pieces = np.copy(board)
+            assert not b.has_legal_moves(player) and not b.has_legal_moves(-player)
+            assert game.getScore(board, player) == b.countDiff(player)
+            assert game.getGameEnded(board, player) == (1 if b.countDiff(player) > 0 else -1)
+
+
+def test_initial_moves():
+    game = OthelloGame(6)
+    valids = game.getValidMoves(game.getInitBoard(), 1)
+    assert sorted(np.flatnonzero(valids)) == [8, 13, 22, 27]
+
+
+def test_apply_symmetries_matches_get_symmetries():
+    game = OthelloGame(6)
+    board = game.getInitBoard()
+    board, _ = game.getNextState(board, 1, int(np.flatnonzero(game.getValidMoves(board, 1))[0]))
+    pi = np.random.rand(game.getActionSize())
+    canonical = game.getCanonicalForm(board, -1)
+    symmetries = game.getSymmetries(canonical, list(pi))
+    n = game.getNumSymmetries()
+    boards, pis = game.applySymmetries(np.array([canonical]*n), np.array([pi]*n), np.arange(n))
+    # getSymmetries lists 1 to 4 quarter turns, each mirrored then not
+    for s in range(n):
+        expected_board, expected_pi = symmetries[2*((s - 1) % 4) + (s < 4)]
+        assert (boards[s] == expected_board).all()
+        assert np.allclose(pis[s], expected_pi)
@@ -22,7 +22,7 @@ hp = HumanOthelloPlayer(g).play
 # nnet players
 n1 = NNet(g)
 n1.load_checkpoint('./pretrained_models/othello/pytorch/','6x100x25_best.pth.tar')
-args1 = dotdict({'numMCTSSims': 50, 'cpuct':1.0})
+args1 = dotdict({'numMCTSSims': 50, 'cpuct':1.0, 'maxNodes': 200000})
 mcts1 = MCTS(g, n1, args1)
 n1p = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
 
@@ -35,3 +35,4 @@ n1p = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
 
 arena = Arena.Arena(n1p, hp, g, display=display)
 print(arena.playGames(2, verbose=True))
+print(mcts1.store.stats())
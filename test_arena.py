@@ -0,0 +1,103 @@
+"""
+To run tests:
+pytest-3 test_arena.py
+"""
+
+import os
+import sys
+import types
+import numpy as np
+
+from Arena import Arena, MCTSPlayer
+from NeuralNet import NeuralNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import dotdict
+
+
+class RandomPlayer():
+    """Plays a random valid move and records the process it played in."""
+
+    def __init__(self, game):
+        self.game = game
+        self.pids = set()
+
+    def __call__(self, board):
+        self.pids.add(os.getpid())
+        return np.random.choice(np.flatnonzero(self.game.getValidMoves(board, 1)))
+
+
+class SeededNet(NeuralNet):
+    """A network whose outputs are drawn from the seed saved in its checkpoint."""
+
+    def __init__(self, game):
+        self.actionSize = game.getActionSize()
+        self.seed = None
+
+    def save_checkpoint(self, folder, filename):
+        np.save(os.path.join(folder, filename), self.seed)
+
+    def load_checkpoint(self, folder, filename):
+        self.seed = int(np.load(os.path.join(folder, filename + '.npy')))
+
+    def predict(self, board):
+        rng = np.random.RandomState(self.seed + int(np.abs(board).sum()))
+        pi = rng.rand(self.actionSize)
+        return pi/pi.sum(), np.array([rng.uniform(-1, 1)])
+
+
+def play(numWorkers, picklable=True):
+    game = TicTacToeGame(3)
+    player1, player2 = RandomPlayer(game), RandomPlayer(game)
+    if picklable:
+        arena = Arena(player1, player2, game)
+    else:
+        arena = Arena(lambda x: player1(x), lambda x: player2(x), game)
+    results = arena.playGames(8, numWorkers=numWorkers)
+    return results, arena.moveCounts, player1.pids | player2.pids
+
+
+def test_parallel_games():
+    (oneWon, twoWon, draws), moveCounts, pids = play(2)
+    assert oneWon + twoWon + draws == 8
+    assert len(moveCounts) == 8 and all(5 <= m <= 9 for m in moveCounts)
+    # the players of the parent are copied into the workers, not called here
+    assert pids == set()
+
+
+def test_no_fork_with_tensorflow(monkeypatch):
+    """Tests games of players that cannot be pickled are played in this process when TensorFlow is loaded."""
+    monkeypatch.setitem(sys.modules, 'tensorflow', types.ModuleType('tensorflow'))
+    (oneWon, twoWon, draws), moveCounts, pids = play(2, picklable=False)
+    assert oneWon + twoWon + draws == 8
+    assert pids == {os.getpid()}
+
+
+def test_spawn_with_tensorflow(monkeypatch):
+    """Tests games of picklable players are played in spawned workers when TensorFlow is loaded."""
+    monkeypatch.setitem(sys.modules, 'tensorflow', types.ModuleType('tensorflow'))
+    (oneWon, twoWon, draws), moveCounts, pids = play(2)
+    assert oneWon + twoWon + draws == 8
+    assert len(moveCounts) == 8 and all(5 <= m <= 9 for m in moveCounts)
+    assert pids == set()
+
+
+def test_mcts_players_load_their_checkpoints(tmp_path, monkeypatch):
+    """Tests MCTSPlayers build their networks from their checkpoints in spawned workers."""
+    monkeypatch.setitem(sys.modules, 'tensorflow', types.ModuleType('tensorflow'))
+    game = TicTacToeGame(3)
+    args = dotdict({'numMCTSSims': 10, 'cpuct': 1})
+    for seed, filename in [(1, 'temp.pth.tar'), (2, 'new.pth.tar')]:
+        nnet = SeededNet(game)
+        nnet.seed = seed
+        nnet.save_checkpoint(str(tmp_path), filename)
+    player1 = MCTSPlayer(game, SeededNet, str(tmp_path), 'temp.pth.tar', args)
+    player2 = MCTSPlayer(game, SeededNet, str(tmp_path), 'new.pth.tar', args)
+    arena = Arena(player1, player2, game)
+    oneWon, twoWon, draws = arena.playGames(8, numWorkers=2)
+    assert oneWon + twoWon + draws == 8
+    assert len(arena.moveCounts) == 8 and all(5 <= m <= 9 for m in arena.moveCounts)
+    # built in the workers only
+    assert player1.mcts is None and player2.mcts is None
+
+    player2(game.getInitBoard())
+    assert player2.mcts.nnet.seed == 2
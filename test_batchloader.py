@@ -0,0 +1,49 @@
+"""
+To run tests:
+pytest-3 test_batchloader.py
+"""
+
+import numpy as np
+
+from BatchLoader import BatchLoader, exampleColumns, epochBatches, randomSymmetries
+from MCTS import MCTS
+from SelfPlay import executeEpisode
+from connect4.Connect4Game import Connect4Game
+from gobang.GobangGame import GobangGame
+from othello.OthelloGame import OthelloGame
+from test_mcts import HashNet, make_args
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import dtypes
+
+
+def canonical_examples(game, numEps):
+    """Examples of self-play episodes stored without their symmetries, as with storeSymmetries False."""
+    args = make_args(numMCTSSims=5, storeSymmetries=False)
+    nnet = HashNet(game)
+    examples = []
+    for _ in range(numEps):
+        examples += executeEpisode(game, MCTS(game, nnet, args), args)
+    return examples
+
+
+def test_augmented_batches_keep_dtypes():
+    """Tests random symmetries keep the storage dtypes and the batches come out in dtypes.input."""
+    np.random.seed(0)
+    for game in [TicTacToeGame(3), OthelloGame(6), GobangGame(7, 4), Connect4Game()]:
+        columns = exampleColumns(canonical_examples(game, 3))
+        transform = randomSymmetries(game)
+        boards, pis = transform(columns[0], columns[1])
+        assert boards.dtype == dtypes.board and pis.dtype == dtypes.pi
+        assert boards.shape == columns[0].shape and pis.shape == columns[1].shape
+        if game.getNumSymmetries() == 8:
+            # every example is one of the symmetries of the original
+            for board, pi, newBoard, newPi in zip(columns[0], columns[1], boards, pis):
+                assert any(np.array_equal(newBoard, b) and np.allclose(newPi, p)
+                           for b, p in game.getSymmetries(board, pi))
+
+        loader = BatchLoader(columns, epochBatches(len(columns[2]), 8), transform=transform, numWorkers=2)
+        numExamples = 0
+        for boards, pis, vs in loader:
+            assert boards.dtype == pis.dtype == vs.dtype == dtypes.input
+            numExamples += len(vs)
+        assert numExamples == len(columns[2])
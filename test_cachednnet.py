@@ -0,0 +1,139 @@
+"""
+To run tests:
+pytest-3 test_cachednnet.py
+"""
+
+import numpy as np
+import pytest
+
+from CachedNNet import CachedNNet
+from test_mcts import HashNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+
+
+class TrainableNet(HashNet):
+    """A HashNet whose outputs change with every train or load_checkpoint."""
+
+    def __init__(self, game):
+        HashNet.__init__(self, game)
+        self.weights = 0
+        self.trained = []
+
+    def predict(self, board):
+        pi, v = HashNet.predict(self, board)
+        return pi, v + self.weights
+
+    def train(self, examples, augment=False):
+        self.trained.append(augment)
+        self.weights += 1
+        if examples is None:
+            raise ValueError("no examples")
+
+
+def test_train_passes_augment_and_invalidates():
+    game = TicTacToeGame(3)
+    nnet = TrainableNet(game)
+    cached = CachedNNet(game, nnet, 10)
+    board = game.getInitBoard()
+    for augment in [False, True]:
+        v = cached.predict(board)[1]
+        cached.train([], augment=augment)
+        assert nnet.trained[-1] == augment
+        assert cached.predict(board)[1] == v + 1
+    # the cache is emptied even if training fails halfway
+    v = cached.predict(board)[1]
+    with pytest.raises(ValueError):
+        cached.train(None)
+    assert cached.predict(board)[1] == v + 1
+
+
+class CountingNet(TrainableNet):
+    """Records the boards it is asked to evaluate."""
+
+    def __init__(self, game):
+        TrainableNet.__init__(self, game)
+        self.evaluated = []
+
+    def predict(self, board):
+        self.evaluated.append(game_key(board))
+        return TrainableNet.predict(self, board)
+
+    def predict_batch(self, boards):
+        self.evaluated.append([game_key(board) for board in boards])
+        pis, vs = zip(*[TrainableNet.predict(self, board) for board in boards])
+        return np.array(pis), np.concatenate(vs)
+
+    def load_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
+        self.weights += 10
+
+
+def game_key(board):
+    return tuple(np.asarray(board).ravel())
+
+
+def positions(game, num):
+    """num different boards, one stone each."""
+    boards = []
+    for action in range(num):
+        board, _ = game.getNextState(game.getInitBoard(), 1, action)
+        boards.append(board)
+    return boards
+
+
+def test_lru_eviction_order_and_stats():
+    game = TicTacToeGame(3)
+    nnet = CountingNet(game)
+    cached = CachedNNet(game, nnet, 3)
+    a, b, c, d = positions(game, 4)
+    for board in [a, b, c]:
+        cached.predict(board)
+    cached.predict(a)               # b is now the least recently used
+    cached.predict(d)               # evicts b
+    assert nnet.evaluated == [game_key(x) for x in [a, b, c, d]]
+    cached.predict(c)
+    cached.predict(a)
+    cached.predict(b)               # evaluated again, evicts d
+    cached.predict(d)               # evaluated again, evicts c
+    assert nnet.evaluated[4:] == [game_key(b), game_key(d)]
+    assert cached.stats() == {'version': 0, 'size': 3, 'hits': 3, 'misses': 6, 'hitRate': 1/3}
+    # predictions are returned as the network made them
+    pi, v = cached.predict(a)
+    ePi, eV = TrainableNet.predict(nnet, a)
+    assert np.array_equal(pi, ePi) and np.array_equal(v, eV)
+
+
+def test_predict_batch_evaluates_only_missing_boards():
+    game = TicTacToeGame(3)
+    nnet = CountingNet(game)
+    cached = CachedNNet(game, nnet, 10)
+    a, b, c = positions(game, 3)
+    cached.predict(b)
+    pis, vs = cached.predict_batch(np.array([a, b, c, a]))
+    # a is missing twice in the batch, both rows are sent once each
+    assert nnet.evaluated[1] == [game_key(a), game_key(c), game_key(a)]
+    for board, pi, v in zip([a, b, c, a], pis, vs):
+        ePi, eV = TrainableNet.predict(nnet, board)
+        assert np.array_equal(pi, ePi) and v == eV[0]
+    assert cached.hits == 1 and cached.misses == 4
+    cached.predict_batch(np.array([c, b]))
+    assert len(nnet.evaluated) == 2 and cached.hits == 3
+
+
+def test_weight_changes_invalidate():
+    """Tests train and load_checkpoint drop the cached predictions of the old weights."""
+    game = TicTacToeGame(3)
+    nnet = CountingNet(game)
+    cached = CachedNNet(game, nnet, 10)
+    a, b = positions(game, 2)
+    v = cached.predict(a)[1]
+    cached.predict_batch(np.array([b]))
+
+    cached.load_checkpoint(folder='unused', filename='unused')
+    assert cached.stats()['version'] == 1 and cached.stats()['size'] == 0
+    assert cached.predict(a)[1] == v + 10
+    assert cached.predict_batch(np.array([a, b]))[1][0] == v + 10
+
+    cached.train([])
+    assert cached.stats()['version'] == 2 and cached.stats()['size'] == 0
+    assert cached.predict(a)[1] == v + 11
+    assert len(nnet.evaluated) == 5
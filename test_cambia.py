@@ -0,0 +1,114 @@
+"""
+To run tests:
+pytest-3 test_cambia.py
+"""
+
+import types
+import numpy as np
+import pytest
+
+import CambiaGame as cambia
+from CambiaGame import CambiaGame
+
+
+def original_board(board):
+    """The 56 channel board the game used to keep, built from a compact one."""
+    full = np.zeros((4, 10, 56))
+    for i in range(4):
+        for j in range(10):
+            if board['cards'][i][j] >= 0:
+                full[i][j][board['cards'][i][j]] = 1.
+            full[i][j][54:] = board['known'][i][j]
+    full[2][0][0] = board['turn']
+    full[3][0][0] = max(int(board['turn']) - 1, 0)
+    return full
+
+
+def original_canonical_form(board):
+    newArr = np.zeros(shape=(4, 10, 56))
+    for i in range(4):
+        for j in range(5):
+            newArr[i][j + 5] = board[i][j]
+            newArr[i][j] = board[i][j + 5]
+    newArr[:, :, [54, 55]] = newArr[:, :, [55, 54]]
+    return newArr
+
+
+def original_unknownize(board, player):
+    """The network input of the original 56 channel boards, slot by slot."""
+    index = 55
+    if player == -1:
+        index = 54
+    newBoard = np.delete(board, index, axis=2)
+    for i in range(newBoard.shape[0]):
+        for j in range(newBoard[i].shape[0]):
+            s = np.where(np.isin(board[i][j], [1.]))
+            if s[0].size > 0:
+                newBoard[i][j][min(s[0][0], 54)] = 0.
+    return newBoard
+
+
+def test_unknownize_matches_original_encoding():
+    """Tests the network input of canonical boards is the one checkpoints were trained on."""
+    game = CambiaGame()
+    rng = np.random.RandomState(0)
+    boards, players = [], []
+    for _ in range(20):
+        board, player = game.getInitBoard(), 1
+        while game.getGameEnded(board, player) == 0:
+            canonical = game.getCanonicalForm(board, player)
+            assert game.getPlayers(canonical) == player
+            for p in [1, -1]:
+                expected = original_unknownize(original_canonical_form(original_board(board)), p)
+                assert (game.unknownize(canonical, p) == expected).all()
+            boards.append(canonical)
+            players.append(player)
+            action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)))
+            board, player = game.getNextState(board, player, action)
+
+    # a batch with the player of every board, as CambiaNet trains
+    batch = game.unknownizeBatch(boards, game.getPlayers(np.asarray(boards)))
+    for board, player, unknownized in zip(boards, players, batch):
+        assert (unknownized == game.unknownize(board, player)).all()
+
+
+def test_collision_check(monkeypatch):
+    """Tests the debug mode raises when two different states get one key, and only then."""
+    # every state hashes to the key 0
+    monkeypatch.setattr(cambia, 'hashlib', types.SimpleNamespace(
+        blake2b=lambda data, digest_size: types.SimpleNamespace(digest=lambda: bytes(digest_size))))
+    board = CambiaGame().getInitBoard()
+    other, _ = CambiaGame().getNextState(board, 1, 4)
+
+    game = CambiaGame(checkCollisions=True)
+    assert game.stringRepresentation(board) == 0
+    # the same state again, from another array
+    assert game.stringRepresentation(board.copy()) == 0
+    with pytest.raises(RuntimeError, match="collision"):
+        game.stringRepresentation(other)
+
+    game = CambiaGame()
+    assert game.stringRepresentation(board) == game.stringRepresentation(other) == 0
+
+
+def test_getCanonicalForms_matches_getCanonicalForm():
+    """Tests the canonical forms of a stack of boards from real games are those of every board."""
+    game = CambiaGame()
+    rng = np.random.RandomState(1)
+    boards = []
+    for _ in range(10):
+        board, player = game.getInitBoard(), 1
+        while game.getGameEnded(board, player) == 0:
+            boards.append(board)
+            action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)))
+            board, player = game.getNextState(board, player, action)
+    boards = np.stack(boards)
+    original = boards.copy()
+
+    canonical = game.getCanonicalForms(boards)
+    assert canonical.shape == boards.shape and canonical.dtype == boards.dtype
+    for board, form in zip(boards, canonical):
+        for player in [1, -1]:
+            assert form.tobytes() == game.getCanonicalForm(board, player).tobytes()
+    # the stack itself is left as it was
+    assert boards.tobytes() == original.tobytes()
@@ -0,0 +1,141 @@
+"""
+To run tests:
+pytest-3 test_coach.py
+"""
+
+import importlib
+import sys
+import types
+from collections import deque
+from pickle import Pickler
+import numpy as np
+
+from CambiaGame import CambiaGame
+from Coach import Coach
+from NeuralNet import NeuralNet
+from test_cambia import original_board, original_canonical_form, original_unknownize
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import dotdict, dtypes
+
+
+class UniformNet(NeuralNet):
+    def __init__(self, game):
+        self.actionSize = game.getActionSize()
+
+    def predict(self, board):
+        return np.full(self.actionSize, 1./self.actionSize), np.array([0.])
+
+
+class RecordingModel():
+    """Stands in for the Keras model of CambiaNet, records the batches it is trained on."""
+
+    def __init__(self):
+        self.batches = []
+
+    def train_on_batch(self, x, y):
+        self.batches.append((x, y))
+
+
+def cambia_wrapper(monkeypatch):
+    """Imports CambiaNet.NNetWrapper with a RecordingModel in place of the Keras model."""
+    resnet = types.ModuleType('resnet')
+    resnet.get_model = RecordingModel
+    monkeypatch.setitem(sys.modules, 'resnet', resnet)
+    monkeypatch.setitem(sys.modules, 'CambiaNet', None)
+    del sys.modules['CambiaNet']
+    return importlib.import_module('CambiaNet').NNetWrapper
+
+
+def make_args(checkpoint, load_model):
+    return dotdict({'numMCTSSims': 2, 'cpuct': 1, 'checkpoint': str(checkpoint),
+                    'load_model': load_model, 'load_folder_file': (str(checkpoint), 'best.pth.tar'),
+                    'numItersForTrainExamplesHistory': 20})
+
+
+def example(game):
+    board = game.getInitBoard()
+    return board, np.full(game.getActionSize(), 1./game.getActionSize()), 1.
+
+
+def test_new_run_starts_with_empty_replay_buffer(tmp_path):
+    """Tests a run that does not load a model ignores the shards left in its checkpoint folder."""
+    game = TicTacToeGame(3)
+    old = Coach(game, UniformNet(game), make_args(tmp_path, False))
+    old.replayBuffer.add([example(game)])
+    old.replayBuffer.add([example(game)])
+    assert len(old.replayBuffer) == 2
+
+    coach = Coach(game, UniformNet(game), make_args(tmp_path, False))
+    assert len(coach.replayBuffer) == 0
+
+
+def test_loaded_run_keeps_its_replay_buffer(tmp_path):
+    """Tests the examples of the loaded model are used, and only them."""
+    game = TicTacToeGame(3)
+    Coach(game, UniformNet(game), make_args(tmp_path, False)).replayBuffer.add([example(game)])
+
+    coach = Coach(game, UniformNet(game), make_args(tmp_path, True))
+    coach.loadTrainExamplesA()
+    assert len(coach.replayBuffer) == 1
+    assert coach.skipFirstSelfPlay
+
+    # loaded from another folder, the stale shards of the checkpoint folder are dropped
+    stale = Coach(game, UniformNet(game), make_args(tmp_path/'other', False))
+    stale.replayBuffer.add([example(game)])
+    stale.replayBuffer.add([example(game)])
+    args = make_args(tmp_path/'other', True)
+    args.load_folder_file = (str(tmp_path), 'best.pth.tar')
+    coach = Coach(game, UniformNet(game), args)
+    coach.loadTrainExamplesA()
+    assert len(coach.replayBuffer) == 1
+
+
+def test_legacy_cambia_examples_are_trained_on(tmp_path, monkeypatch):
+    """
+    Tests the pickled Cambia history of older versions, which holds network
+    inputs instead of states, is trained on as it is, alone and next to the
+    states of a new iteration.
+    """
+    NNetWrapper = cambia_wrapper(monkeypatch)
+    game = CambiaGame()
+    np.random.seed(0)
+    positions = []
+    while len(positions) < 200:
+        board, player = game.getInitBoard(), 1
+        while game.getGameEnded(board, player) == 0:
+            positions.append((board, player))
+            board, player = game.getNextState(board, player, np.random.choice(np.flatnonzero(game.getValidMoves(board, player))))
+    pi = np.full(game.getActionSize(), 1./game.getActionSize())
+    # v tells the examples apart
+    legacy = [(original_unknownize(original_canonical_form(original_board(board)), player), pi, i/1000.)
+              for i, (board, player) in enumerate(positions[:150])]
+    with open(str(tmp_path/'best.pth.tar.examples'), 'wb') as f:
+        Pickler(f).dump([deque(legacy[:100]), deque(legacy[100:])])
+
+    coach = Coach(game, NNetWrapper(game), make_args(tmp_path, True))
+    coach.loadTrainExamplesA()
+    assert len(coach.replayBuffer) == 2
+    model = coach.nnet.nnet
+    coach.nnet.train(coach.replayBuffer.load().shuffled())
+    inputs = np.concatenate([x for x, _ in model.batches])
+    vs = np.concatenate([y[1] for _, y in model.batches])
+    assert inputs.dtype == dtypes.input and len(vs) == len(legacy)
+    for board, v in zip(inputs, vs):
+        assert np.array_equal(board, legacy[int(round(v*1000))][0])
+
+    # a new iteration stores states, which are unknownized for the player to move
+    states = [(game.getCanonicalForm(board, player), pi, (150 + i)/1000.)
+              for i, (board, player) in enumerate(positions[150:200])]
+    coach.replayBuffer.add(states)
+    model.batches = []
+    coach.nnet.train(coach.replayBuffer.load().shuffled())
+    inputs = np.concatenate([x for x, _ in model.batches])
+    vs = np.concatenate([y[1] for _, y in model.batches])
+    assert len(vs) == len(legacy) + len(states)
+    for board, v in zip(inputs, vs):
+        i = int(round(v*1000))
+        if i < len(legacy):
+            assert np.array_equal(board, legacy[i][0])
+        else:
+            state = states[i - len(legacy)][0]
+            assert np.array_equal(board, game.unknownize(state, game.getPlayers(state)))
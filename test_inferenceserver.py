@@ -0,0 +1,134 @@
+"""
+To run tests:
+pytest-3 test_inferenceserver.py
+"""
+
+import os
+import signal
+import sys
+import numpy as np
+import pytest
+
+from InferenceServer import InferenceServer
+from NeuralNet import NeuralNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import dotdict, spawnContext
+
+
+class FailingNet(NeuralNet):
+    """Raises on boards holding a 2, a uniform policy otherwise."""
+
+    def __init__(self, game):
+        self.actionSize = game.getActionSize()
+
+    def load_checkpoint(self, folder, filename):
+        pass
+
+    def predict_batch(self, boards):
+        if (boards == 2).any():
+            raise ValueError("bad board")
+        return np.full((len(boards), self.actionSize), 1./self.actionSize), np.zeros(len(boards))
+
+
+class SumNet(FailingNet):
+    """A uniform policy and the sum of the board as value, so replies tell boards apart."""
+
+    def predict_batch(self, boards):
+        vs = boards.reshape(len(boards), -1).sum(axis=1).astype(float)
+        return np.full((len(boards), self.actionSize), 1./self.actionSize), vs
+
+
+class KilledOnRecv():
+    """A connection whose process is killed while it waits for a reply."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def send(self, obj):
+        self.conn.send(obj)
+
+    def recv(self):
+        os.kill(os.getpid(), signal.SIGKILL)
+
+
+def killedInFlight(client, board):
+    client.conn = KilledOnRecv(client.conn)
+    client.predict(board)
+
+
+def predictInto(client, board, results):
+    results.put(client.predict(board))
+
+
+# set by the test process only, a forked server would inherit it
+parentState = None
+
+
+class ParentStateNet(FailingNet):
+    """Raises if its process inherited the state of the test process."""
+
+    def __init__(self, game):
+        if parentState is not None:
+            raise RuntimeError("forked from the test process")
+        FailingNet.__init__(self, game)
+
+
+def test_errors_are_raised_by_the_client():
+    """Tests a failing predict_batch is raised in the client, and the server keeps serving."""
+    game = TicTacToeGame(3)
+    server = InferenceServer(game, FailingNet, dotdict({'inferenceMaxWait': 0.}), 1)
+    server.start('unused', 'unused')
+    try:
+        client = server.clients[0]
+        board = game.getInitBoard()
+        with pytest.raises(RuntimeError, match="bad board"):
+            client.predict(np.full_like(board, 2))
+        pi, v = client.predict(board)
+        assert np.allclose(pi, 1./game.getActionSize()) and v[0] == 0
+        assert server.process.is_alive()
+    finally:
+        server.close()
+
+
+def test_server_is_spawned(monkeypatch):
+    """Tests the server builds its network in a fresh interpreter, not a fork of a parent holding one."""
+    monkeypatch.setattr(sys.modules[__name__], 'parentState', ParentStateNet(TicTacToeGame(3)))
+    game = TicTacToeGame(3)
+    server = InferenceServer(game, ParentStateNet, dotdict({'inferenceMaxWait': 0.}), 2)
+    server.start('unused', 'unused')
+    try:
+        for client in server.clients:
+            pis, vs = client.predict_batch(np.array([game.getInitBoard()]*3))
+            assert pis.shape == (3, game.getActionSize()) and len(vs) == 3
+        server.reload('unused', 'unused')
+        assert server.process.is_alive()
+    finally:
+        server.close()
+
+
+def test_reply_to_a_killed_worker_is_dropped():
+    """Tests the client of a worker killed mid-request gets the answers to its own requests in the next worker."""
+    game = TicTacToeGame(3)
+    server = InferenceServer(game, SumNet, dotdict({'inferenceMaxWait': 0.}), 1)
+    server.start('unused', 'unused')
+    try:
+        client = server.clients[0]
+        board = game.getInitBoard()
+        ctx = spawnContext()
+        worker = ctx.Process(target=killedInFlight, args=(client, np.ones_like(board)))
+        worker.start()
+        worker.join()
+        assert worker.exitcode == -signal.SIGKILL
+        # the reply to the killed worker waits in the pipe of the client
+        assert client.conn.poll(10)
+
+        results = ctx.Queue()
+        worker = ctx.Process(target=predictInto, args=(client, board, results))
+        worker.start()
+        pi, v = results.get(timeout=30)
+        worker.join()
+        assert v[0] == 0
+        pi, v = client.predict(np.full_like(board, -1))
+        assert v[0] == -board.size
+    finally:
+        server.close()
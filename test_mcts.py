@@ -0,0 +1,382 @@
+"""
+To run tests:
+pytest-3 test_mcts.py
+"""
+
+import asyncio
+import math
+import zlib
+import numpy as np
+import pytest
+
+from AsyncMCTS import AsyncMCTS, BatchingEvaluator, executeEpisodesAsync
+from MCTS import MCTS, EPS
+from NeuralNet import NeuralNet
+from SelfPlay import executeEpisode
+from connect4.Connect4Game import Connect4Game
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import dotdict
+
+
+class HashNet(NeuralNet):
+    """A network whose outputs are a deterministic function of the board."""
+
+    def __init__(self, game):
+        self.actionSize = game.getActionSize()
+
+    def predict(self, board):
+        rng = np.random.RandomState(zlib.crc32(np.asarray(board).tobytes()))
+        pi = rng.rand(self.actionSize)
+        return pi/pi.sum(), np.array([rng.uniform(-1, 1)])
+
+    def predict_batch(self, boards):
+        pis, vs = zip(*[self.predict(board) for board in boards])
+        return np.array(pis), np.concatenate(vs)
+
+
+class RecursiveMCTS(MCTS):
+    """MCTS with the recursive search the iterative one replaced."""
+
+    def search(self, canonicalBoard):
+        s = self.game.stringRepresentation(canonicalBoard)
+
+        node = self.store.lookup(s)
+        if node is None:
+            node = self.store.add(s, self.game.getGameEnded(canonicalBoard, 1))
+        if self.store.ended(node)!=0:
+            return -self.store.ended(node)
+
+        if not self.store.isExpanded(node):
+            ps, v = self.nnet.predict(canonicalBoard)
+            self.expand(node, canonicalBoard, ps)
+            return -np.asarray(v).item()
+
+        a = self.select(node)
+        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
+        next_s = self.game.getCanonicalForm(next_s, next_player)
+
+        self.store.pin(node)
+        v = self.search(next_s)
+
+        self.store.update(node, a, v)
+        self.store.unpin(node)
+        return -v
+
+
+def loop_select(mcts, node):
+    """The action the per-action loop MCTS.select replaced picks at node."""
+    store = mcts.store
+    Ps, Qsa, Nsa, Ns, valids = store.priors(node), store.q(node), store.n(node), store.visits(node), store.valids(node)
+    cur_best = -float('inf')
+    best_act = -1
+    for a in range(len(Ps)):
+        if valids[a]:
+            if Nsa[a] > 0:
+                u = Qsa[a] + mcts.args.cpuct*Ps[a]*math.sqrt(Ns)/(1+Nsa[a])
+            else:
+                u = mcts.args.cpuct*Ps[a]*math.sqrt(Ns + EPS)     # Q = 0 ?
+            if u > cur_best:
+                cur_best = u
+                best_act = a
+    return best_act
+
+
+def make_args(**kwargs):
+    args = dotdict({'numMCTSSims': 50, 'cpuct': 1, 'tempThreshold': 15})
+    args.update(kwargs)
+    return args
+
+
+def random_positions(game, numPositions, seed):
+    rng = np.random.RandomState(seed)
+    positions = []
+    while len(positions) < numPositions:
+        board, player = game.getInitBoard(), 1
+        while game.getGameEnded(board, player) == 0 and len(positions) < numPositions:
+            positions.append(game.getCanonicalForm(board, player))
+            action = rng.choice(np.flatnonzero(game.getValidMoves(board, player)))
+            board, player = game.getNextState(board, player, action)
+    return positions
+
+
+def expanded_nodes(game, mcts, root):
+    """Returns the (key, board) of every expanded node reachable from root."""
+    nodes = {}
+    stack = [root]
+    while stack:
+        board = stack.pop()
+        s = game.stringRepresentation(board)
+        node = mcts.store.find(s)
+        if s in nodes or node is None or not mcts.store.isExpanded(node):
+            continue
+        nodes[s] = board
+        for a in np.flatnonzero(mcts.store.valids(node)):
+            next_s, next_player = game.getNextState(board, 1, a)
+            stack.append(game.getCanonicalForm(next_s, next_player))
+    return nodes
+
+
+def check_tree(game, mcts, root):
+    """
+    Checks the visit counts of the tree under root add up: a node's visits
+    are the visits of its edges, and every non-root node was reached through
+    its incoming edges at least once more than it was left, by its expansion.
+    """
+    store = mcts.store
+    nodes = expanded_nodes(game, mcts, root)
+    inflow = {s: 0 for s in nodes}
+    for s, board in nodes.items():
+        node = store.find(s)
+        assert store.visits(node) == store.n(node).sum()
+        for a in np.flatnonzero(store.n(node)):
+            next_s, next_player = game.getNextState(board, 1, a)
+            child = game.stringRepresentation(game.getCanonicalForm(next_s, next_player))
+            if child in inflow:
+                inflow[child] += store.n(node)[a]
+    rootKey = game.stringRepresentation(root)
+    for s in nodes:
+        if s != rootKey:
+            assert inflow[s] >= store.visits(store.find(s)) + 1
+    assert not store.pinned
+
+
+def test_iterative_search_matches_recursive():
+    """Tests the iterative search, with a path longer than its buffer, gives the recursive results."""
+    for game in [TicTacToeGame(3), Connect4Game()]:
+        nnet = HashNet(game)
+        for board in random_positions(game, 6, seed=1):
+            args = make_args(numMCTSSims=200)
+            mcts = MCTS(game, nnet, args)
+            mcts.pathNodes, mcts.pathActions = [None], [0]
+            reference = RecursiveMCTS(game, nnet, args)
+            for temp in [1, 0]:
+                assert mcts.getActionProb(board, temp) == reference.getActionProb(board, temp)
+            assert len(mcts.pathNodes) > 1
+            node = mcts.store.find(game.stringRepresentation(board))
+            ref = reference.store.find(game.stringRepresentation(board))
+            assert np.array_equal(mcts.store.q(node), reference.store.q(ref))
+            check_tree(game, mcts, board)
+
+
+def test_interleaved_async_searches():
+    """Tests searches of one AsyncMCTS awaiting their leaves together back up their own paths and share the evaluations."""
+    game = TicTacToeGame(3)
+    nnet = HashNet(game)
+    board = game.getCanonicalForm(game.getInitBoard(), 1)
+    evaluator = BatchingEvaluator(nnet, maxBatchSize=8)
+    mcts = AsyncMCTS(game, nnet, make_args(), evaluator)
+
+    async def play():
+        for _ in range(40):
+            await asyncio.gather(mcts.search(board), mcts.search(board), mcts.search(board))
+            check_tree(game, mcts, board)
+
+    asyncio.run(play())
+    # the searches reaching the same leaf awaited one evaluation
+    assert evaluator.stats()['evaluations'] == len(expanded_nodes(game, mcts, board))
+
+
+class ManualEvaluator():
+    """An evaluator whose requests are answered when the test says so."""
+
+    def __init__(self, nnet):
+        self.nnet = nnet
+        self.requests = []
+
+    def evaluate(self, board):
+        future = asyncio.get_running_loop().create_future()
+        self.requests.append((board, future))
+        return future
+
+    def answer(self, i):
+        board, future = self.requests.pop(i)
+        pi, v = self.nnet.predict(board)
+        future.set_result((pi, v))
+
+
+def test_concurrent_async_searches_expand_once():
+    """
+    Tests searches of one tree whose leaves are answered out of order, so
+    some pass through a node while another still waits for it, expand every
+    node once and give the same tree with both stores.
+    """
+    game = TicTacToeGame(3)
+    nnet = HashNet(game)
+    for seed in range(5):
+        trees = []
+        for nodeStore in ['dict', 'array']:
+            rng = np.random.RandomState(seed)
+            evaluator = ManualEvaluator(nnet)
+            mcts = AsyncMCTS(game, nnet, make_args(nodeStore=nodeStore), evaluator)
+            board = random_positions(game, 1, seed=seed)[0]
+            expansions = []
+            expand = mcts.store.expand
+            mcts.store.expand = lambda node, ps, valids: (expansions.append(node), expand(node, ps, valids))
+
+            async def play():
+                searches = []
+                while len(searches) < 60 or not all(search.done() for search in searches):
+                    if len(searches) < 60:
+                        searches.append(asyncio.ensure_future(mcts.search(board)))
+                    for _ in range(3):
+                        await asyncio.sleep(0)
+                    if evaluator.requests and rng.rand() < 0.5:
+                        evaluator.answer(rng.randint(len(evaluator.requests)))
+                for search in searches:
+                    search.result()
+
+            asyncio.run(play())
+            assert len(expansions) == len(set(expansions))
+            assert not mcts.pending
+            check_tree(game, mcts, board)
+            trees.append((mcts, board))
+        (dictMcts, board), (arrayMcts, _) = trees
+        assert dictMcts.actionProb(board) == arrayMcts.actionProb(board)
+        s = game.stringRepresentation(board)
+        assert np.array_equal(dictMcts.store.q(dictMcts.store.find(s)), arrayMcts.store.q(arrayMcts.store.find(s)))
+
+
+def test_async_episode_matches_executeEpisode():
+    """Tests an AsyncMCTS episode with batches of 1 plays the same game as executeEpisode."""
+    for game in [TicTacToeGame(3), Connect4Game()]:
+        nnet = HashNet(game)
+        args = make_args(numMCTSSims=25, tempThreshold=6)
+        for seed in range(3):
+            np.random.seed(seed)
+            expected = executeEpisode(game, MCTS(game, nnet, args), args)
+            np.random.seed(seed)
+            (examples,), stats = executeEpisodesAsync(game, nnet, args, 1)
+            assert stats['meanBatchSize'] == 1
+            assert len(examples) == len(expected)
+            for (board, pi, v), (eBoard, ePi, eV) in zip(examples, expected):
+                assert np.array_equal(board, eBoard)
+                assert np.array_equal(pi, ePi)
+                assert v == eV
+
+
+def test_evaluator_flushes_partial_batch():
+    """Tests a batch smaller than maxBatchSize is sent once every search is waiting."""
+    game = TicTacToeGame(3)
+    batches = []
+
+    class RecordingNet(HashNet):
+        def predict_batch(self, boards):
+            batches.append(len(boards))
+            return HashNet.predict_batch(self, boards)
+
+    nnet = RecordingNet(game)
+    evaluator = BatchingEvaluator(nnet, maxBatchSize=4)
+    boards = random_positions(game, 3, seed=0)
+
+    async def evaluate(board):
+        return await evaluator.evaluate(board)
+
+    async def play():
+        return await asyncio.gather(*[evaluate(board) for board in boards])
+
+    results = asyncio.run(play())
+    assert batches == [3]
+    assert evaluator.stats() == {'batches': 1, 'evaluations': 3, 'meanBatchSize': 3.}
+    for board, (pi, v) in zip(boards, results):
+        ePi, eV = nnet.predict(board)
+        assert np.array_equal(pi, ePi) and v == eV[0]
+
+
+def test_searchBatch_of_one_matches_search():
+    """Tests rounds of one leaf give the same tree as search."""
+    for game in [TicTacToeGame(3), Connect4Game()]:
+        nnet = HashNet(game)
+        for board in random_positions(game, 4, seed=3):
+            mcts = MCTS(game, nnet, make_args())
+            reference = MCTS(game, nnet, make_args())
+            for _ in range(100):
+                mcts.searchBatch(board, 1)
+                reference.search(board)
+            assert mcts.actionProb(board) == reference.actionProb(board)
+            node = mcts.store.find(game.stringRepresentation(board))
+            ref = reference.store.find(game.stringRepresentation(board))
+            assert np.array_equal(mcts.store.q(node), reference.store.q(ref))
+
+
+def test_searchBatch_virtual_loss():
+    """
+    Tests every round of searchBatch removes its virtual losses and pins and
+    leaves consistent visit counts, including rounds that stop at a leaf
+    already waiting to be evaluated and simulations that end at terminal
+    states, and that only the simulations run are counted.
+    """
+    game = TicTacToeGame(3)
+    nnet = HashNet(game)
+    short = terminals = 0
+    for board in random_positions(game, 12, seed=4):
+        mcts = MCTS(game, nnet, make_args(searchBatchSize=8))
+        total = 0
+        for _ in range(10):
+            leaves, sims = mcts.gatherLeaves(board, 8)
+            assert 1 <= sims <= 8 and len(leaves) <= sims
+            assert len(set(node for node, _, _ in leaves)) == len(leaves)
+            short += sims < 8
+            terminals += sims - len(leaves)
+            if any(len(path) for _, _, path in leaves):
+                assert mcts.virtualLoss
+            if leaves:
+                pis, vs = nnet.predict_batch(np.array([b for _, b, _ in leaves]))
+                mcts.expandLeaves(leaves, pis, vs)
+            assert not mcts.virtualLoss
+            check_tree(game, mcts, board)
+            total += sims
+        # every simulation but the one expanding the root visits one of its edges
+        assert mcts.store.visits(mcts.store.find(game.stringRepresentation(board))) == total - 1
+    assert short > 0 and terminals > 0
+
+
+def test_getActionProb_batched_runs_numMCTSSims():
+    """Tests batched rounds run exactly numMCTSSims simulations from a fresh root, as search does."""
+    for game in [TicTacToeGame(3), Connect4Game()]:
+        nnet = HashNet(game)
+        for board in random_positions(game, 4, seed=5):
+            mcts = MCTS(game, nnet, make_args(numMCTSSims=25, searchBatchSize=8))
+            mcts.getActionProb(board)
+            node = mcts.store.find(game.stringRepresentation(board))
+            assert mcts.store.visits(node) == 25 - 1
+            check_tree(game, mcts, board)
+
+
+def test_select_matches_loop():
+    """
+    Tests the vectorized PUCT picks the action of the original loop over the
+    actions, the first of tied actions and never an invalid one, on random
+    nodes drawn from a few values so that ties are frequent.
+    """
+    game = TicTacToeGame(3)
+    actionSize = game.getActionSize()
+    rng = np.random.RandomState(7)
+    ties = 0
+    for nodeStore in ['dict', 'array']:
+        for i in range(500):
+            mcts = MCTS(game, HashNet(game), make_args(cpuct=rng.choice([0.5, 1, 4]), nodeStore=nodeStore))
+            valids = (rng.rand(actionSize) < 0.6).astype(int)
+            valids[rng.randint(actionSize)] = 1
+            ps = rng.choice([0., 0.1, 0.2], size=actionSize)*valids
+            node = mcts.store.add(i, 0)
+            mcts.store.expand(node, ps, valids)
+            # the visits of an edge, each with a value drawn from a few
+            for a in np.flatnonzero(valids):
+                for _ in range(rng.choice([0, 0, 1, 2])):
+                    mcts.store.update(node, a, rng.choice([-1., 0., 1.]))
+            a = mcts.select(node)
+            assert valids[a] == 1
+            assert a == loop_select(mcts, node)
+
+            # a later valid action with the same Q, N and P ties with the best one
+            bound = lambda b: (mcts.store.q(node)[b], mcts.store.n(node)[b], ps[b])
+            ties += any(bound(b) == bound(a) for b in np.flatnonzero(valids) if b > a)
+    assert ties > 100
+
+
+def test_async_rejects_searchBatchSize():
+    """Tests AsyncMCTS refuses the virtual loss batches of MCTS rather than ignoring them."""
+    game = TicTacToeGame(3)
+    with pytest.raises(ValueError, match="searchBatchSize"):
+        AsyncMCTS(game, HashNet(game), make_args(searchBatchSize=4))
+    AsyncMCTS(game, HashNet(game), make_args(searchBatchSize=1))
@@ -0,0 +1,149 @@
+"""
+To run tests:
+pytest-3 test_nodestore.py
+"""
+
+import numpy as np
+import pytest
+
+from MCTS import MCTS
+from NodeStore import DictNodeStore, ArrayNodeStore
+from test_mcts import HashNet, expanded_nodes, make_args, random_positions
+from tictactoe.TicTacToeGame import TicTacToeGame
+
+
+def make_stores(actionSize, **kwargs):
+    return [DictNodeStore(actionSize, **kwargs), ArrayNodeStore(actionSize, capacity=4, **kwargs)]
+
+
+def visited(store, s):
+    """Adds an expanded node for s with one visit."""
+    node = store.add(s, 0)
+    store.expand(node, np.ones(3)/3, np.ones(3))
+    store.update(node, 0, 1.)
+    return node
+
+
+def bounded(store):
+    """Makes every add of store check the store stays within maxNodes, unless all its nodes are pinned."""
+    add = store.add
+
+    def checkedAdd(s, ended):
+        node = add(s, ended)
+        assert len(store) <= store.maxNodes or len(store.pinned) >= store.maxNodes
+        return node
+
+    store.add = checkedAdd
+    return store
+
+
+def test_stores_select_the_same_actions():
+    """Tests both stores hold the same tree, in float64, and select the same action at every node of it."""
+    game = TicTacToeGame(3)
+    nnet = HashNet(game)
+    for board in random_positions(game, 5, seed=6):
+        trees = []
+        for nodeStore in ['dict', 'array']:
+            mcts = MCTS(game, nnet, make_args(numMCTSSims=200, nodeStore=nodeStore, nodeStoreCapacity=8))
+            mcts.getActionProb(board)
+            trees.append((mcts, expanded_nodes(game, mcts, board)))
+        (dictMcts, dictNodes), (arrayMcts, arrayNodes) = trees
+        assert dictNodes.keys() == arrayNodes.keys()
+        for s in dictNodes:
+            dictNode, arrayNode = dictMcts.store.find(s), arrayMcts.store.find(s)
+            for mcts, node in [(dictMcts, dictNode), (arrayMcts, arrayNode)]:
+                assert mcts.store.priors(node).dtype == mcts.store.q(node).dtype == np.float64
+            assert np.array_equal(dictMcts.store.priors(dictNode), arrayMcts.store.priors(arrayNode))
+            assert np.array_equal(dictMcts.store.q(dictNode), arrayMcts.store.q(arrayNode))
+            assert np.array_equal(dictMcts.store.n(dictNode), arrayMcts.store.n(arrayNode))
+            assert dictMcts.select(dictNode) == arrayMcts.select(arrayNode)
+
+
+@pytest.mark.parametrize('evictionPolicy', ['lru', 'leastVisited'])
+def test_stores_play_the_same_moves(evictionPolicy):
+    """Tests both stores give the same policies with a bounded tree, one leaf or a batch at a time."""
+    game = TicTacToeGame(3)
+    nnet = HashNet(game)
+    for searchBatchSize in [1, 4]:
+        args = make_args(numMCTSSims=60, searchBatchSize=searchBatchSize, maxNodes=40,
+                         evictionPolicy=evictionPolicy, nodeStoreCapacity=8)
+        for board in random_positions(game, 5, seed=2):
+            searches = []
+            for nodeStore in ['dict', 'array']:
+                args.nodeStore = nodeStore
+                mcts = MCTS(game, nnet, args)
+                bounded(mcts.store)
+                probs = [mcts.getActionProb(board, temp=1) for _ in range(3)]
+                searches.append((probs, mcts.store.stats()))
+                assert not mcts.store.pinned and not mcts.virtualLoss
+            (dictProbs, dictStats), (arrayProbs, arrayStats) = searches
+            assert np.allclose(dictProbs, arrayProbs, atol=0)
+            assert dictStats == arrayStats
+            if not np.asarray(board).any():
+                # the tree of the empty board is larger than maxNodes
+                assert dictStats['evictions'] > 0
+
+
+def test_pinned_nodes_are_never_evicted():
+    for evictionPolicy in ['lru', 'leastVisited']:
+        for store in make_stores(3, maxNodes=5, evictionPolicy=evictionPolicy):
+            pinned = []
+            for i in range(5):
+                node = store.add('s{}'.format(i), 0)
+                store.expand(node, np.ones(3)/3, np.ones(3))
+                if i < 3:
+                    store.pin(node)
+                    pinned.append(('s{}'.format(i), node))
+            # the pinned nodes are the least recently used and the least visited
+            for i in range(5, 20):
+                visited(store, 's{}'.format(i))
+                assert len(store) <= 5
+                for s, node in pinned:
+                    assert store.find(s) == node
+            # pinned twice, a node is evictable after two unpins only
+            s, node = pinned[0]
+            store.pin(node)
+            store.unpin(node)
+            visited(store, 't0')
+            assert store.find(s) == node
+            store.unpin(node)
+            for i in range(1, 6):
+                visited(store, 't{}'.format(i))
+            assert store.find(s) is None
+            assert all(store.find(s) == node for s, node in pinned[1:])
+
+
+def test_every_node_pinned_grows_past_maxNodes():
+    for store in make_stores(3, maxNodes=2):
+        for i in range(4):
+            store.pin(store.add('s{}'.format(i), 0))
+        assert len(store) == 4 and store.evictions == 0
+
+
+def test_lru_order_and_counters():
+    for store in make_stores(3, maxNodes=3):
+        for s in ['a', 'b', 'c']:
+            assert store.lookup(s) is None
+            store.add(s, 0)
+        assert store.lookup('a') is not None   # b is now the least recently used
+        store.add('d', 0)
+        assert store.find('b') is None
+        assert all(store.find(s) is not None for s in ['a', 'c', 'd'])
+        assert store.lookup('b') is None
+        store.add('b', 0)                      # evicts c
+        assert store.find('c') is None
+        assert store.stats() == {'nodes': 3, 'hits': 1, 'misses': 4, 'hitRate': 0.2, 'evictions': 2}
+
+
+def test_least_visited_evicts_a_tenth():
+    for store in make_stores(3, maxNodes=20, evictionPolicy='leastVisited'):
+        for i in range(20):
+            node = store.add(i, 0)
+            store.expand(node, np.ones(3)/3, np.ones(3))
+            for _ in range(i % 10 + (i >= 10)):
+                store.update(node, i % 3, 1.)
+        store.add('new', 0)
+        # the two nodes with the fewest visits: 0, and 1 or 10 which have one visit each
+        assert store.find(0) is None
+        assert (store.find(1) is None) != (store.find(10) is None)
+        assert len(store) == 19 and store.evictions == 2
@@ -0,0 +1,116 @@
+"""
+To run tests:
+pytest-3 test_selfplay.py
+"""
+
+import os
+import signal
+import sys
+import numpy as np
+import pytest
+
+from MCTS import MCTS
+from NeuralNet import NeuralNet
+from SelfPlay import SelfPlayWorkers, executeEpisode, executeEpisodes
+from connect4.Connect4Game import Connect4Game
+from test_mcts import HashNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import dotdict
+
+
+class UniformNet(NeuralNet):
+    def __init__(self, game):
+        self.actionSize = game.getActionSize()
+
+    def load_checkpoint(self, folder, filename):
+        pass
+
+    def predict(self, board):
+        return np.full(self.actionSize, 1./self.actionSize), np.array([0.])
+
+
+# set by the test process only, a forked worker would inherit it
+parentState = None
+
+
+class ParentStateNet(UniformNet):
+    """Raises if its process inherited the state of the test process."""
+
+    def predict(self, board):
+        if parentState is not None:
+            raise RuntimeError("forked from the test process")
+        return UniformNet.predict(self, board)
+
+
+class KilledNet(UniformNet):
+    """Kills its process at the first prediction, without a traceback."""
+
+    def predict(self, board):
+        os.kill(os.getpid(), signal.SIGKILL)
+
+
+def make_args():
+    return dotdict({'numMCTSSims': 5, 'cpuct': 1, 'tempThreshold': 15, 'numSelfPlayWorkers': 2})
+
+
+def test_workers_play_every_episode():
+    game = TicTacToeGame(3)
+    episodes = list(SelfPlayWorkers(game, UniformNet, make_args()).play(3, 'unused', 'unused'))
+    assert len(episodes) == 3 and all(len(examples) > 0 for examples in episodes)
+
+
+def test_killed_worker_is_raised():
+    """Tests play raises instead of waiting forever for the episodes of a killed worker."""
+    game = TicTacToeGame(3)
+    with pytest.raises(RuntimeError, match="exited with code"):
+        list(SelfPlayWorkers(game, KilledNet, make_args()).play(3, 'unused', 'unused'))
+
+
+def test_workers_are_spawned(monkeypatch):
+    """Tests the workers start from a fresh interpreter, not a fork of a parent holding a network."""
+    monkeypatch.setattr(sys.modules[__name__], 'parentState', 'network')
+    game = TicTacToeGame(3)
+    episodes = list(SelfPlayWorkers(game, ParentStateNet, make_args()).play(2, 'unused', 'unused'))
+    assert len(episodes) == 2
+
+
+def test_single_lockstep_game_matches_executeEpisode():
+    """Tests executeEpisodes with one game at a time plays the games of executeEpisode."""
+    for game in [TicTacToeGame(3), Connect4Game()]:
+        nnet = HashNet(game)
+        args = dotdict({'numMCTSSims': 25, 'cpuct': 1, 'tempThreshold': 6, 'numParallelGames': 1})
+        for seed in range(3):
+            np.random.seed(seed)
+            expected = [executeEpisode(game, MCTS(game, nnet, args), args) for _ in range(2)]
+            np.random.seed(seed)
+            episodes = list(executeEpisodes(game, nnet, args, 2))
+            assert len(episodes) == 2
+            for examples, eExamples in zip(episodes, expected):
+                assert len(examples) == len(eExamples)
+                for (board, pi, v), (eBoard, ePi, eV) in zip(examples, eExamples):
+                    assert np.array_equal(board, eBoard)
+                    assert np.array_equal(pi, ePi)
+                    assert v == eV
+
+
+def test_lockstep_games_play_numEps_episodes():
+    """Tests finished games are replaced until exactly numEps episodes, not a multiple of the games, are played."""
+    game = TicTacToeGame(3)
+    batches = []
+
+    class RecordingNet(HashNet):
+        def predict_batch(self, boards):
+            batches.append(len(boards))
+            return HashNet.predict_batch(self, boards)
+
+    args = dotdict({'numMCTSSims': 10, 'cpuct': 1, 'tempThreshold': 15, 'numParallelGames': 3,
+                    'searchBatchSize': 4})
+    np.random.seed(0)
+    episodes = list(executeEpisodes(game, RecordingNet(game), args, 7))
+    assert len(episodes) == 7
+    for examples in episodes:
+        assert len(examples) >= 5*8     # at least 5 moves, 8 symmetries each
+        # the values of a whole episode come from one result
+        assert len(set(abs(v) for _, _, v in examples)) == 1
+    # the leaves of several games share a network call
+    assert max(batches) > args.searchBatchSize
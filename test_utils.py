@@ -0,0 +1,55 @@
+"""
+To run tests:
+pytest-3 test_utils.py
+"""
+
+import numpy as np
+import pytest
+
+from ReplayBuffer import ReplayBuffer
+from utils import dtypes, storageBoards, checkDtype
+
+
+def test_integer_boards_are_stored_in_board_dtype():
+    boards = storageBoards([np.array([[1, -1], [0, 1]]), np.array([[0, 0], [-1, 1]])])
+    assert boards.dtype == dtypes.board
+    assert np.array_equal(boards, [[[1, -1], [0, 1]], [[0, 0], [-1, 1]]])
+    # already stored boards are not copied
+    assert storageBoards(boards) is boards
+
+
+def test_integer_boards_that_do_not_fit():
+    with pytest.raises(ValueError, match=r'values from -1 to 300.*utils\.dtypes\.board'):
+        storageBoards(np.array([[300, -1]]))
+
+
+def test_float_boards_are_stored_in_input_dtype():
+    planes = np.array([[0.5, 0.25], [1., 0.]])
+    boards = storageBoards([planes, planes*2])
+    assert boards.dtype == dtypes.input
+    assert np.array_equal(boards, [planes, planes*2])
+    # floats that are small integers, as Connect4 boards, fit in the board dtype
+    assert storageBoards(np.ones((2, 2))).dtype == dtypes.board
+
+
+def test_structured_boards_are_kept():
+    boards = np.zeros(3, dtype=[('cards', np.int8, (2,)), ('turn', np.int8)])
+    assert storageBoards(boards) is boards
+
+
+def test_checkDtype():
+    checkDtype(np.zeros(2, dtype=dtypes.input), dtypes.input, 'prepare')
+    with pytest.raises(TypeError, match='prepare returned float64 data, expected float32'):
+        checkDtype(np.zeros(2), dtypes.input, 'prepare')
+
+
+def test_replay_buffer_of_float_boards(tmp_path):
+    buffer = ReplayBuffer(str(tmp_path), 5)
+    pi = np.array([0.5, 0.5])
+    buffer.add([(np.array([[0.5, 1.]]), pi, 1.)])
+    # a shard that happens to hold integers only is stored as dtypes.board
+    buffer.add([(np.array([[2., 1.]]), pi, -1.)])
+    boards, pis, vs = buffer.load().columns()
+    assert boards.dtype == dtypes.input
+    assert np.array_equal(boards, [[[0.5, 1.]], [[2., 1.]]])
+    assert np.array_equal(vs, [1., -1.])
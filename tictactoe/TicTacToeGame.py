@@ -2,6 +2,8 @@ from __future__ import print_function
 import sys
 sys.path.append('..')
 from Game import Game
+from Zobrist import Zobrist
+from utils import dihedralSymmetries
 from .TicTacToeLogic import Board
 import numpy as np
 
@@ -17,11 +19,12 @@ Based on the OthelloGame by Surag Nair.
 class TicTacToeGame(Game):
     def __init__(self, n=3):
         self.n = n
+        self.zobrist = Zobrist((n, n))
 
     def getInitBoard(self):
         # return initial board (numpy board)
         b = Board(self.n)
-        return np.array(b.pieces)
+        return self.zobrist.attach(np.array(b.pieces))
 
     def getBoardSize(self):
         # (a,b) tuple
@@ -36,11 +39,8 @@ class TicTacToeGame(Game):
         # action must be a valid move
         if action == self.n*self.n:
             return (board, -player)
-        b = Board(self.n)
-        b.pieces = np.copy(board)
-        move = (int(action/self.n), action%self.n)
-        b.execute_move(move, player)
-        return (b.pieces, -player)
+        assert board[action//self.n][action%self.n] == 0
+        return (self.zobrist.place(board, action, player), -player)
 
     def getValidMoves(self, board, player):
         # return a fixed size binary vector
@@ -72,7 +72,7 @@ class TicTacToeGame(Game):
 
     def getCanonicalForm(self, board, player):
         # return state if player==1, else return -state if player==-1
-        return player*board
+        return self.zobrist.canonicalForm(board, player)
 
     def getSymmetries(self, board, pi):
         # mirror, rotational
@@ -90,9 +90,16 @@ class TicTacToeGame(Game):
                 l += [(newB, list(newPi.ravel()) + [pi[-1]])]
         return l
 
+    def getNumSymmetries(self):
+        return 8
+
+    def applySymmetries(self, boards, pis, symmetries):
+        # rotations and mirrors, vectorized over the batch
+        return dihedralSymmetries(boards, pis, symmetries)
+
     def stringRepresentation(self, board):
-        # 8x8 numpy array (canonical board)
-        return board.tostring()
+        # 64-bit Zobrist key of the 8x8 numpy array (canonical board)
+        return self.zobrist.key(board)
 
 def display(board):
     n = board.shape[0]
@@ -1,3 +1,98 @@
+import multiprocessing as mp
+import numpy as np
+
+
 class dotdict(dict):
     def __getattr__(self, name):
         return self[name]
+
+
+# dtypes of the training examples, from self-play to the network input
+dtypes = dotdict({
+    'board': np.int8,       # stored boards, which hold small integers
+    'pi': np.float32,       # stored policies, np.float16 halves them again
+    'v': np.float32,        # stored values
+    'input': np.float32,    # network inputs and training targets
+})
+
+
+def storageBoards(boards):
+    """
+    Input:
+        boards: a board or a batch of boards
+
+    Returns:
+        boards: the boards as an array of dtypes.board, Connect4's float
+                boards of integers included. Boards of floats that do not
+                fit in it, such as the float planes of a custom game, are
+                stored as dtypes.input instead, and structured boards, such as
+                CambiaGame states, are returned as they are.
+    """
+    boards = np.asarray(boards)
+    if boards.dtype.fields is not None or boards.dtype == dtypes.board:
+        return boards
+    with np.errstate(invalid='ignore'):
+        stored = boards.astype(dtypes.board)
+    if np.array_equal(stored, boards):
+        return stored
+    if boards.dtype.kind == 'f':
+        return boards.astype(dtypes.input, copy=False)
+    raise ValueError('boards hold values from {} to {}, which do not fit in utils.dtypes.board ({}); '
+                     'set dtypes.board to a wider integer type'.format(boards.min(), boards.max(),
+                                                                      np.dtype(dtypes.board)))
+
+
+def spawnContext():
+    """
+    Returns:
+        context: the multiprocessing context of the self-play workers, the
+                 inference server and the arena workers. They are spawned,
+                 not forked: the parent usually holds a network, and a
+                 TensorFlow session (the tensorflow and keras wrappers) or an
+                 initialized CUDA context does not survive a fork. Whatever
+                 is passed to them is pickled.
+    """
+    return mp.get_context('spawn')
+
+
+def checkDtype(array, dtype, stage):
+    """
+    Raises a TypeError if array does not have the given dtype, so a stage of
+    the example pipeline cannot silently upcast its data, to float64 in
+    particular.
+    """
+    if np.asarray(array).dtype != np.dtype(dtype):
+        raise TypeError('{} returned {} data, expected {}'.format(stage, np.asarray(array).dtype, np.dtype(dtype)))
+
+
+def dihedralSymmetries(boards, pis, symmetries):
+    """
+    Applies one of the 8 rotations and reflections of square boards to every
+    example of a batch: symmetry s rotates by s%4 quarter turns, then mirrors
+    the board left/right if s >= 4. 0 is the identity.
+
+    Input:
+        boards: a batch of n x n boards
+        pis: their policy vectors, n*n board actions followed by the pass action
+        symmetries: the symmetry of every example
+
+    Returns:
+        (boards, pis): the transformed batch
+    """
+    boards = np.asarray(boards)
+    pis = np.asarray(pis)
+    n = boards.shape[1]
+    newBoards = np.empty_like(boards)
+    newPis = np.array(pis)
+    for s in range(8):
+        rows = symmetries == s
+        if not rows.any():
+            continue
+        b = np.rot90(boards[rows], s % 4, axes=(1, 2))
+        p = np.rot90(pis[rows, :n*n].reshape(-1, n, n), s % 4, axes=(1, 2))
+        if s >= 4:
+            b = b[:, :, ::-1]
+            p = p[:, :, ::-1]
+        newBoards[rows] = b
+        newPis[rows, :n*n] = p.reshape(-1, n*n)
+    return newBoards, newPis